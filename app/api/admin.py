@@ -0,0 +1,66 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from ..deps import get_current_user
+from ..models import User
+from ..schemas import ProfileStart
+from ..metrics import TimedRoute
+from .. import profiling
+
+api = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    route_class=TimedRoute
+)
+
+
+def require_admin(user: User = Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(403, "Not allowed")
+    return user
+
+
+def current_or_last():
+    session = profiling.session or profiling.last
+    if session is None:
+        raise HTTPException(404, "No profiling session")
+    return session
+
+
+@api.post("/profile")
+async def start_profile(
+    options: ProfileStart,
+    user: User = Depends(require_admin)
+):
+    session = profiling.start(
+        asyncio.get_running_loop(), **options.model_dump()
+    )
+    if session is None:
+        raise HTTPException(409, "A profiling session is already running")
+    return session.summary()
+
+
+@api.get("/profile")
+async def profile_status(user: User = Depends(require_admin)):
+    return current_or_last().summary()
+
+
+@api.get("/profile/collapsed", response_class=PlainTextResponse)
+async def profile_collapsed(user: User = Depends(require_admin)):
+    # формат за flamegraph.pl / speedscope: "a;b;c <брой>" на ред
+    session = current_or_last()
+    if session.mode != "sample":
+        raise HTTPException(400, "Collapsed stacks need mode=sample")
+    if session.state != "done":
+        raise HTTPException(409, "Profiling session still running")
+    return session.collapsed()
+
+
+@api.delete("/profile")
+async def stop_profile(user: User = Depends(require_admin)):
+    session = current_or_last()
+    # shield: прекъсната заявка не спира събирането на резултата
+    await asyncio.shield(session.finish())
+    return session.summary()
@@ -1,31 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-
-from ..deps import get_db
-from ..models import User
-from ..auth import create_access_token
-
-api = APIRouter(tags=["auth"])
-
-@api.post("/login")
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
-):
-    user = db.query(User).filter(
-        User.username == form_data.username
-    ).first()
-
-    if not user or not user.verify_password(form_data.password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    token = create_access_token({
-        "sub": str(user.id),
-        "role": user.role
-    })
-
-    return {
-        "access_token": token,
-        "token_type": "bearer"
-    }
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db
+from ..models import User
+from ..auth import create_access_token
+from ..passwords import verify_password
+from ..metrics import TimedRoute
+
+api = APIRouter(tags=["auth"], route_class=TimedRoute)
+
+@api.post("/login")
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db)
+):
+    user = (await db.execute(
+        select(User.id, User.username, User.role, User.password_hash)
+        .where(User.username == form_data.username)
+    )).first()
+
+    # затваряме транзакцията → връзката се връща в pool-а, докато bcrypt работи
+    await db.rollback()
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    valid, new_hash = await verify_password(
+        form_data.password, user.password_hash
+    )
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    if new_hash:
+        await db.execute(
+            update(User).where(User.id == user.id)
+            .values(password_hash=new_hash)
+        )
+        await db.commit()
+
+    token = create_access_token({
+        "sub": str(user.id),
+        "username": user.username,
+        "role": user.role
+    })
+
+    return {
+        "access_token": token,
+        "token_type": "bearer"
+    }
@@ -1,69 +1,146 @@
-# app/api/books.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-#Оправи книгите да не могат да се дублират
-
-from ..deps import get_db, get_current_user
-from ..models import Book, Genre, User, Review
-from ..schemas import BookCreate, BookOut
-
-api = APIRouter(
-    prefix="/books",
-    tags=["Books"]
-)
-
-@api.post("/", response_model=BookOut)
-def create_book(
-    data: BookCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    if user.role not in ["author", "admin"]:
-        raise HTTPException(403, "Only authors can add books")
-
-    genres = db.query(Genre).filter(Genre.id.in_(data.genre_ids)).all()
-
-    if len(genres) != len(data.genre_ids):
-        raise HTTPException(400, "Invalid genre id")
-
-    book = Book(
-        title=data.title,
-        description=data.description,
-        author_id=user.id,
-        genres=genres
-    )
-
-    db.add(book)
-    db.commit()
-    db.refresh(book)
-    return book
-
-@api.get("/{book_id}", response_model=BookOut)
-def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.get(Book, book_id)
-    if not book:
-        raise HTTPException(404, "Book not found")
-    return book
-
-@api.get("/", response_model=List[BookOut])
-def search_books(
-    title: str = "",
-    db: Session = Depends(get_db)
-):
-    return db.query(Book).filter(Book.title.contains(title)).all()
-
-@api.get("/by-genre/{genre_id}", response_model=List[BookOut])
-def books_by_genre(
-    genre_id: int,
-    db: Session = Depends(get_db)
-):
-    genre = db.get(Genre, genre_id)
-    if not genre:
-        raise HTTPException(404, "Genre not found")
-    return genre.books
-
-def calculate_avg_rating(book: Book):
-    if not book.reviews:
-        return None
-    return sum(r.rating for r in book.reviews) / len(book.reviews)
+# app/api/books.py
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+#Оправи книгите да не могат да се дублират
+
+from ..deps import get_db, get_read_db, get_current_user
+from ..models import Book, Genre, User, Review, book_genres
+from ..schemas import BookCreate, BookOut, BookSuggestion, Page
+from ..pagination import PageParams, make_page, paginate
+from ..loading import BOOK_OUT
+from .. import fastjson, search, title_index, versions
+from ..response_cache import cached, invalidate
+from ..metrics import TimedRoute
+
+api = APIRouter(
+    prefix="/books",
+    tags=["Books"],
+    route_class=TimedRoute
+)
+
+@api.post("/", response_model=BookOut)
+async def create_book(
+    data: BookCreate,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    if user.role not in ["author", "admin"]:
+        raise HTTPException(403, "Only authors can add books")
+
+    genres = (await db.scalars(
+        select(Genre).where(Genre.id.in_(data.genre_ids))
+    )).all()
+
+    if len(genres) != len(data.genre_ids):
+        raise HTTPException(400, "Invalid genre id")
+
+    book = Book(
+        title=data.title,
+        description=data.description,
+        author_id=user.id,
+        genres=genres
+    )
+
+    db.add(book)
+    await db.flush()
+    await db.run_sync(versions.bump, versions.BOOK, [book.id])
+    await db.commit()
+    invalidate(*(f"genre:{genre.id}" for genre in genres))
+    title_index.index.add(book.id, book.title)
+    return await db.get(
+        Book, book.id, options=BOOK_OUT, populate_existing=True
+    )
+
+@api.get("/autocomplete", response_model=List[BookSuggestion])
+async def autocomplete_books(
+    prefix: str = Query(min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=title_index.MAX_LIMIT)
+):
+    # от паметта, без SQL; преди "/{book_id}", иначе "autocomplete" е 422
+    hits = title_index.index.complete(prefix, limit)
+    if hits is None:
+        raise HTTPException(
+            503, "Title index is loading", headers={"Retry-After": "1"}
+        )
+    return [
+        {"id": book_id, "title": title, "review_count": count}
+        for book_id, title, count in hits
+    ]
+
+@api.get("/{book_id}", response_model=BookOut)
+@cached(BookOut, tags=lambda params, payload: [f"book:{params['book_id']}"])
+async def get_book(
+    book_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
+):
+    cached = await versions.not_modified(
+        db, request, response, versions.BOOK, book_id
+    )
+    if cached:
+        return cached
+
+    book = await db.get(Book, book_id, options=BOOK_OUT)
+    if not book:
+        raise HTTPException(404, "Book not found")
+    return book
+
+@api.get("/", response_model=Page[BookOut])
+async def search_books(
+    title: str = "",
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
+):
+    after = page.after
+    if after is not None:
+        if len(after) != 2:
+            raise HTTPException(400, "Invalid cursor")
+        after = tuple(after)
+
+    if fastjson.ENABLED:
+        hits = await db.run_sync(
+            search.search_book_ids, title, page.limit + 1, after
+        )
+        result = make_page(hits, page, lambda hit: list(hit))
+        result["items"] = await fastjson.books(
+            db, [book_id for _, book_id in result["items"]]
+        )
+        return fastjson.json_response(result)
+
+    hits = await db.run_sync(search.search_books, title, page.limit + 1, after)
+    result = make_page(hits, page, lambda hit: [hit[0], hit[1].id])
+    result["items"] = [book for _, book in result["items"]]
+    return result
+
+@api.get("/by-genre/{genre_id}", response_model=Page[BookOut])
+@cached(Page[BookOut], tags=lambda params, payload: [
+    f"genre:{params['genre_id']}",
+    # avg_rating на всяка книга в страницата
+    *(f"book:{book['id']}" for book in payload["items"]),
+])
+async def books_by_genre(
+    genre_id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
+):
+    genre = await db.get(Genre, genre_id)
+    if not genre:
+        raise HTTPException(404, "Genre not found")
+
+    if fastjson.ENABLED:
+        return await fastjson.books_by_genre(db, genre_id, page)
+
+    stmt = select(Book).options(*BOOK_OUT).join(book_genres).where(
+        book_genres.c.genre_id == genre_id
+    )
+    return await paginate(db, stmt, page, Book.id)
+
+def calculate_avg_rating(book: Book):
+    if not book.reviews:
+        return None
+    return sum(r.rating for r in book.reviews) / len(book.reviews)
@@ -1,105 +1,187 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from ..deps import get_db, get_current_user
-from ..models import Collection, Book, User
-from ..schemas import CollectionOut, CollectionCreate
-
-api = APIRouter(
-    prefix="/collections",
-    tags=["Collections"]
-)
-
-@api.get("/", response_model=List[CollectionOut])
-def get_my_collections(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    return db.query(Collection).filter(
-        Collection.user_id == user.id
-    ).all()
-
-@api.post("/", response_model=CollectionOut)
-def create_collection(
-    data: CollectionCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    collection = Collection(
-        name=data.name,
-        is_default=False,
-        user_id=user.id
-    )
-
-    db.add(collection)
-    db.commit()
-    db.refresh(collection)
-    return collection
-
-@api.delete("/{collection_id}")
-def delete_collection(
-    collection_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    collection = db.get(Collection, collection_id)
-
-    if not collection or collection.user_id != user.id:
-        raise HTTPException(404, "Collection not found")
-
-    if collection.is_default:
-        raise HTTPException(400, "Default collections cannot be deleted")
-
-    db.delete(collection)
-    db.commit()
-    return {"msg": "Collection deleted"}
-
-@api.post("/{collection_id}/books/{book_id}")
-def add_book_to_collection(
-    collection_id: int,
-    book_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    collection = db.get(Collection, collection_id)
-    book = db.get(Book, book_id)
-
-    if not collection or not book or collection.user_id != user.id:
-        raise HTTPException(404, "Not found")
-
-    # ако е default → махаме от другите default
-    if collection.is_default:
-        defaults = db.query(Collection).filter(
-            Collection.user_id == user.id,
-            Collection.is_default == True
-        ).all()
-
-        for c in defaults:
-            if book in c.books:
-                c.books.remove(book)
-
-    if book not in collection.books:
-        collection.books.append(book)
-
-    db.commit()
-    return {"msg": "Book added to collection"}
-
-@api.delete("/{collection_id}/books/{book_id}")
-def remove_book_from_collection(
-    collection_id: int,
-    book_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    collection = db.get(Collection, collection_id)
-    book = db.get(Book, book_id)
-
-    if not collection or not book or collection.user_id != user.id:
-        raise HTTPException(404, "Not found")
-
-    if book in collection.books:
-        collection.books.remove(book)
-        db.commit()
-
-    return {"msg": "Book removed"}
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, get_read_db, get_current_user
+from ..models import Collection, Book, User, collection_books
+from ..schemas import CollectionOut, CollectionCreate, BookIdsBatch, BatchResult, Page
+from ..pagination import PageParams, paginate
+from ..loading import COLLECTION_OUT
+from ..recommender import invalidate_results
+from ..metrics import TimedRoute
+from .. import fastjson, write_queue
+
+api = APIRouter(
+    prefix="/collections",
+    tags=["Collections"],
+    route_class=TimedRoute
+)
+
+@api.get("/", response_model=Page[CollectionOut])
+async def get_my_collections(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    if fastjson.ENABLED:
+        return await fastjson.collections_of(db, user.id, page)
+
+    stmt = select(Collection).options(*COLLECTION_OUT).where(
+        Collection.user_id == user.id
+    )
+    return await paginate(db, stmt, page, Collection.id)
+
+@api.post("/", response_model=CollectionOut)
+async def create_collection(
+    data: CollectionCreate,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    collection = Collection(
+        name=data.name,
+        is_default=False,
+        user_id=user.id,
+        books=[]
+    )
+
+    db.add(collection)
+    await db.commit()
+    return collection
+
+@api.delete("/{collection_id}")
+async def delete_collection(
+    collection_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    collection = await db.get(Collection, collection_id)
+
+    if not collection or collection.user_id != user.id:
+        raise HTTPException(404, "Collection not found")
+
+    if collection.is_default:
+        raise HTTPException(400, "Default collections cannot be deleted")
+
+    await db.delete(collection)
+    await db.commit()
+    return {"msg": "Collection deleted"}
+
+# преди /{collection_id}/books/{book_id}, иначе "batch" се пробва като book_id
+@api.post("/{collection_id}/books/batch", response_model=BatchResult)
+async def add_books_to_collection(
+    collection_id: int,
+    data: BookIdsBatch,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    collection = await db.get(Collection, collection_id)
+    if not collection or collection.user_id != user.id:
+        raise HTTPException(404, "Collection not found")
+
+    ids = set(data.book_ids)
+    found = set(await db.scalars(select(Book.id).where(Book.id.in_(ids))))
+    present = set(await db.scalars(
+        select(collection_books.c.book_id).where(
+            collection_books.c.collection_id == collection_id,
+            collection_books.c.book_id.in_(found)
+        )
+    ))
+
+    results = []
+    new = []
+    seen = set()
+    for book_id in data.book_ids:
+        if book_id in seen:
+            status = "duplicate"
+        elif book_id not in found:
+            status = "not_found"
+        elif book_id in present:
+            status = "already_present"
+        else:
+            status = "added"
+            new.append(book_id)
+        seen.add(book_id)
+        results.append({"book_id": book_id, "status": status})
+
+    if new:
+        if collection.is_default:
+            defaults = select(Collection.id).where(
+                Collection.user_id == user.id,
+                Collection.is_default == True,
+                Collection.id != collection_id
+            )
+            await db.execute(delete(collection_books).where(
+                collection_books.c.book_id.in_(new),
+                collection_books.c.collection_id.in_(defaults)
+            ))
+
+        await db.execute(
+            insert(collection_books).on_conflict_do_nothing(),
+            [{"collection_id": collection_id, "book_id": b} for b in new]
+        )
+        await db.commit()
+        await db.run_sync(invalidate_results, user.id)
+
+    return {"results": results}
+
+def _add_book_to_collection(db, user_id: int, collection_id: int, book_id: int):
+    collection = db.get(Collection, collection_id)
+    book = db.get(Book, book_id)
+
+    if not collection or not book or collection.user_id != user_id:
+        raise HTTPException(404, "Not found")
+
+    # ако е default → махаме от другите default
+    if collection.is_default:
+        defaults = select(Collection.id).where(
+            Collection.user_id == user_id,
+            Collection.is_default == True
+        )
+        db.execute(delete(collection_books).where(
+            collection_books.c.book_id == book_id,
+            collection_books.c.collection_id.in_(defaults)
+        ))
+
+    db.execute(
+        insert(collection_books)
+        .values(collection_id=collection_id, book_id=book_id)
+        .on_conflict_do_nothing()
+    )
+
+@api.post("/{collection_id}/books/{book_id}")
+async def add_book_to_collection(
+    collection_id: int,
+    book_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    await write_queue.run(
+        db, lambda db: _add_book_to_collection(db, user.id, collection_id, book_id)
+    )
+    await db.run_sync(invalidate_results, user.id)
+    return {"msg": "Book added to collection"}
+
+@api.delete("/{collection_id}/books/{book_id}")
+async def remove_book_from_collection(
+    collection_id: int,
+    book_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    collection = await db.get(Collection, collection_id)
+    book = await db.get(Book, book_id)
+
+    if not collection or not book or collection.user_id != user.id:
+        raise HTTPException(404, "Not found")
+
+    removed = await db.execute(delete(collection_books).where(
+        collection_books.c.collection_id == collection_id,
+        collection_books.c.book_id == book_id
+    ))
+
+    if removed.rowcount:
+        await db.commit()
+        await db.run_sync(invalidate_results, user.id)
+
+    return {"msg": "Book removed"}
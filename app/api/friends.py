@@ -1,124 +1,164 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from ..deps import get_db, get_current_user
-from ..models import User, FriendRequest, FriendStatus
-from ..schemas import FriendRequestOut
-
-api = APIRouter(
-    prefix="/friends",
-    tags=["Friends"]
-)
-
-@api.post("/{user_id}", response_model=FriendRequestOut)
-def send_friend_request(
-    user_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    if user_id == user.id:
-        raise HTTPException(400, "Cannot add yourself")
-
-    target = db.get(User, user_id)
-    if not target:
-        raise HTTPException(404, "User not found")
-
-    existing = db.query(FriendRequest).filter(
-        ((FriendRequest.sender_id == user.id) &
-         (FriendRequest.receiver_id == user_id)) |
-        ((FriendRequest.sender_id == user_id) &
-         (FriendRequest.receiver_id == user.id))
-    ).first()
-
-    if existing:
-        raise HTTPException(400, "Request already exists")
-
-    fr = FriendRequest(
-        sender_id=user.id,
-        receiver_id=user_id
-    )
-
-    db.add(fr)
-    db.commit()
-    db.refresh(fr)
-    return fr
-
-@api.get("/requests", response_model=List[FriendRequestOut])
-def incoming_requests(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    return db.query(FriendRequest).filter(
-        FriendRequest.receiver_id == user.id,
-        FriendRequest.status == FriendStatus.pending
-    ).all()
-
-@api.post("/requests/{request_id}/accept")
-def accept_request(
-    request_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    fr = db.get(FriendRequest, request_id)
-
-    if not fr or fr.receiver_id != user.id:
-        raise HTTPException(404, "Request not found")
-
-    fr.status = FriendStatus.accepted
-    db.commit()
-    return {"msg": "Friend request accepted"}
-
-@api.post("/requests/{request_id}/reject")
-def reject_request(
-    request_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    fr = db.get(FriendRequest, request_id)
-
-    if not fr or fr.receiver_id != user.id:
-        raise HTTPException(404, "Request not found")
-
-    fr.status = FriendStatus.rejected
-    db.commit()
-    return {"msg": "Friend request rejected"}
-
-@api.get("/")
-def list_friends(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    accepted = db.query(FriendRequest).filter(
-        FriendRequest.status == FriendStatus.accepted,
-        ((FriendRequest.sender_id == user.id) |
-         (FriendRequest.receiver_id == user.id))
-    ).all()
-
-    friends = []
-    for fr in accepted:
-        friend_id = fr.receiver_id if fr.sender_id == user.id else fr.sender_id
-        friends.append(db.get(User, friend_id))
-
-    return friends
-
-@api.delete("/{user_id}")
-def remove_friend(
-    user_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    fr = db.query(FriendRequest).filter(
-        FriendRequest.status == FriendStatus.accepted,
-        ((FriendRequest.sender_id == user.id) &
-         (FriendRequest.receiver_id == user_id)) |
-        ((FriendRequest.sender_id == user_id) &
-         (FriendRequest.receiver_id == user.id))
-    ).first()
-
-    if not fr:
-        raise HTTPException(404, "Friend not found")
-
-    db.delete(fr)
-    db.commit()
-    return {"msg": "Friend removed"}
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, get_read_db, get_current_user
+from ..models import User, FriendRequest, FriendStatus, friendships
+from ..schemas import FriendRequestOut, FriendOut, Page
+from ..pagination import PageParams, DEFAULT_LIMIT, MAX_LIMIT, paginate
+from .. import friend_graph, write_queue
+from ..recommender import invalidate_results
+from ..metrics import TimedRoute
+
+api = APIRouter(
+    prefix="/friends",
+    tags=["Friends"],
+    route_class=TimedRoute
+)
+
+@api.post("/{user_id}", response_model=FriendRequestOut)
+async def send_friend_request(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    if user_id == user.id:
+        raise HTTPException(400, "Cannot add yourself")
+
+    target = await db.get(User, user_id)
+    if not target:
+        raise HTTPException(404, "User not found")
+
+    existing = await db.scalar(select(FriendRequest).where(
+        ((FriendRequest.sender_id == user.id) &
+         (FriendRequest.receiver_id == user_id)) |
+        ((FriendRequest.sender_id == user_id) &
+         (FriendRequest.receiver_id == user.id))
+    ))
+
+    if existing:
+        raise HTTPException(400, "Request already exists")
+
+    fr = FriendRequest(
+        sender_id=user.id,
+        receiver_id=user_id
+    )
+
+    db.add(fr)
+    await db.commit()
+    await db.refresh(fr)
+    return fr
+
+@api.get("/requests", response_model=Page[FriendRequestOut])
+async def incoming_requests(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    stmt = select(FriendRequest).where(
+        FriendRequest.receiver_id == user.id,
+        FriendRequest.status == FriendStatus.pending
+    )
+    return await paginate(db, stmt, page, FriendRequest.id)
+
+def _accept_request(db, user_id: int, request_id: int):
+    fr = db.get(FriendRequest, request_id)
+
+    if not fr or fr.receiver_id != user_id:
+        raise HTTPException(404, "Request not found")
+
+    fr.status = FriendStatus.accepted
+    friend_graph.add_friendship(db, fr.sender_id, fr.receiver_id)
+    return fr.sender_id, fr.receiver_id
+
+@api.post("/requests/{request_id}/accept")
+async def accept_request(
+    request_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    sender_id, receiver_id = await write_queue.run(
+        db, lambda db: _accept_request(db, user.id, request_id)
+    )
+    await db.run_sync(invalidate_results, sender_id, receiver_id)
+    return {"msg": "Friend request accepted"}
+
+@api.post("/requests/{request_id}/reject")
+async def reject_request(
+    request_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    fr = await db.get(FriendRequest, request_id)
+
+    if not fr or fr.receiver_id != user.id:
+        raise HTTPException(404, "Request not found")
+
+    fr.status = FriendStatus.rejected
+    await db.commit()
+    return {"msg": "Friend request rejected"}
+
+async def with_mutual_counts(db: AsyncSession, counts: dict[int, int]):
+    users = (await db.scalars(
+        select(User).where(User.id.in_(list(counts)))
+    )).all()
+    by_id = {u.id: u for u in users}
+    return [
+        FriendOut(
+            id=u.id,
+            username=u.username,
+            role=u.role,
+            mutual_friends=counts[u.id]
+        )
+        for u in (by_id[i] for i in counts if i in by_id)
+    ]
+
+@api.get("/", response_model=Page[FriendOut])
+async def list_friends(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    stmt = select(friendships.c.friend_id).where(
+        friendships.c.user_id == user.id
+    )
+    result = await paginate(db, stmt, page, friendships.c.friend_id)
+
+    friend_ids = result["items"]
+    mutual = await db.run_sync(friend_graph.mutual_counts, user.id, friend_ids)
+    result["items"] = await with_mutual_counts(
+        db, {i: mutual.get(i, 0) for i in friend_ids}
+    )
+    return result
+
+@api.get("/suggestions", response_model=list[FriendOut])
+async def people_you_may_know(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    ranked = await db.run_sync(friend_graph.suggestions, user.id, limit)
+    return await with_mutual_counts(db, dict(ranked))
+
+@api.delete("/{user_id}")
+async def remove_friend(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    fr = await db.scalar(select(FriendRequest).where(
+        FriendRequest.status == FriendStatus.accepted,
+        ((FriendRequest.sender_id == user.id) &
+         (FriendRequest.receiver_id == user_id)) |
+        ((FriendRequest.sender_id == user_id) &
+         (FriendRequest.receiver_id == user.id))
+    ))
+
+    if not fr:
+        raise HTTPException(404, "Friend not found")
+
+    await db.delete(fr)
+    await db.run_sync(friend_graph.remove_friendship, user.id, user_id)
+    await db.commit()
+    await db.run_sync(invalidate_results, user.id, user_id)
+    return {"msg": "Friend removed"}
@@ -1,45 +1,78 @@
-# app/api/genres.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-#ОПРАВИ СИ ЖАНРОВЕТЕ ДА НЕ СЕ СЪЗДАВА КНИГА БЕЗ ЖАНР
-
-from ..deps import get_db, get_current_user
-from ..models import Genre, User
-from ..schemas import GenreOut
-
-api = APIRouter(
-    prefix="/genres",
-    tags=["Genres"]
-)
-
-@api.post("/", response_model=GenreOut)
-def create_genre(
-    name: str,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    if user.role not in ["admin", "author"]:
-        raise HTTPException(403, "Not allowed")
-
-    existing = db.query(Genre).filter(Genre.name == name).first()
-    if existing:
-        raise HTTPException(400, "Genre already exists")
-
-    genre = Genre(name=name)
-    db.add(genre)
-    db.commit()
-    db.refresh(genre)
-    return genre
-
-
-@api.get("/", response_model=list[GenreOut])
-def list_genres(db: Session = Depends(get_db)):
-    return db.query(Genre).all()
-
-
-@api.get("/{genre_id}", response_model=GenreOut)
-def get_genre(genre_id: int, db: Session = Depends(get_db)):
-    genre = db.get(Genre, genre_id)
-    if not genre:
-        raise HTTPException(404, "Genre not found")
-    return genre
+# app/api/genres.py
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+#ОПРАВИ СИ ЖАНРОВЕТЕ ДА НЕ СЕ СЪЗДАВА КНИГА БЕЗ ЖАНР
+
+from ..deps import get_db, get_read_db, get_current_user
+from ..models import Genre, User
+from ..schemas import GenreOut, Page
+from ..pagination import PageParams, paginate
+from .. import versions
+from ..response_cache import cached, invalidate
+from ..metrics import TimedRoute
+
+api = APIRouter(
+    prefix="/genres",
+    tags=["Genres"],
+    route_class=TimedRoute
+)
+
+@api.post("/", response_model=GenreOut)
+async def create_genre(
+    name: str,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    if user.role not in ["admin", "author"]:
+        raise HTTPException(403, "Not allowed")
+
+    existing = await db.scalar(select(Genre).where(Genre.name == name))
+    if existing:
+        raise HTTPException(400, "Genre already exists")
+
+    genre = Genre(name=name)
+    db.add(genre)
+    await db.flush()
+    await db.run_sync(versions.bump, versions.GENRE, [genre.id])
+    await db.run_sync(versions.bump, versions.GENRES, [0])
+    await db.commit()
+    invalidate("genres", f"genre:{genre.id}")
+    return genre
+
+
+@api.get("/", response_model=Page[GenreOut])
+@cached(Page[GenreOut], tags=lambda params, payload: ["genres"])
+async def list_genres(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
+):
+    cached = await versions.not_modified(
+        db, request, response, versions.GENRES
+    )
+    if cached:
+        return cached
+
+    return await paginate(db, select(Genre), page, Genre.id)
+
+
+@api.get("/{genre_id}", response_model=GenreOut)
+@cached(GenreOut, tags=lambda params, payload: [f"genre:{params['genre_id']}"])
+async def get_genre(
+    genre_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
+):
+    cached = await versions.not_modified(
+        db, request, response, versions.GENRE, genre_id
+    )
+    if cached:
+        return cached
+
+    genre = await db.get(Genre, genre_id)
+    if not genre:
+        raise HTTPException(404, "Genre not found")
+    return genre
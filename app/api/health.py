@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Response
+
+from ..metrics import TimedRoute
+from ..recommender import recommender
+from .. import readiness, title_index
+
+api = APIRouter(
+    prefix="/health",
+    tags=["Health"],
+    route_class=TimedRoute
+)
+
+
+@api.get("/live")
+async def live():
+    # процесът е стартирал и схемата е проверена
+    return {"status": "started", "started_at": readiness.started_at}
+
+
+@api.get("/ready")
+async def ready(response: Response):
+    status = readiness.status()
+    # индексът за препоръки не е условие: без него има fallback
+    status["recommender_index"] = recommender.index is not None
+    # без него /books/autocomplete отговаря 503
+    status["title_index"] = title_index.index.ready
+    if not status["warm"]:
+        response.status_code = 503
+    return status
@@ -1,109 +1,164 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-
-from ..deps import get_db, get_current_user
-from ..models import Book, Review, Collection, FriendRequest, FriendStatus, User
-
-api = APIRouter(
-    prefix="/recommendations",
-    tags=["Recommendations"]
-)
-
-def get_excluded_book_ids(db: Session, user: User):
-    excluded = set()
-
-    collections = db.query(Collection).filter(
-        Collection.user_id == user.id,
-        Collection.is_default == True
-    ).all()
-
-    for c in collections:
-        if c.name in ["Reading", "Read"]:
-            for book in c.books:
-                excluded.add(book.id)
-
-    return excluded
-
-
-def get_genre_preferences(db: Session, user: User):
-    genre_scores = {}
-
-    reviews = db.query(Review).filter(
-        Review.user_id == user.id
-    ).all()
-
-    for r in reviews:
-        for g in r.book.genres:
-            genre_scores.setdefault(g.id, []).append(r.rating)
-
-    avg = {gid: sum(v) / len(v) for gid, v in genre_scores.items()}
-
-    liked = {gid for gid, score in avg.items() if score >= 4}
-    disliked = {gid for gid, score in avg.items() if score <= 2}
-
-    return liked, disliked
-
-
-def books_liked_by_friends(db: Session, user: User):
-    friend_ids = []
-
-    friendships = db.query(FriendRequest).filter(
-        FriendRequest.status == FriendStatus.accepted,
-        ((FriendRequest.sender_id == user.id) |
-         (FriendRequest.receiver_id == user.id))
-    ).all()
-
-    for fr in friendships:
-        friend_ids.append(
-            fr.receiver_id if fr.sender_id == user.id else fr.sender_id
-        )
-
-    return db.query(Book).join(Review).filter(
-        Review.user_id.in_(friend_ids),
-        Review.rating >= 4
-    ).all()
-
-
-@api.get("/")
-def recommend_books(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    excluded = get_excluded_book_ids(db, user)
-    liked_genres, disliked_genres = get_genre_preferences(db, user)
-
-    candidates = db.query(Book).filter(
-        Book.id.notin_(excluded)
-    ).all()
-
-    scored = []
-
-    for book in candidates:
-        score = 0
-
-        if book.avg_rating:
-            score += book.avg_rating
-
-        genre_ids = {g.id for g in book.genres}
-
-        if genre_ids & liked_genres:
-            score += 2
-
-        if genre_ids & disliked_genres:
-            score -= 2
-
-        scored.append((score, book))
-
-    friend_books = books_liked_by_friends(db, user)
-    for b in friend_books:
-        scored.append((5, b))
-
-    unique = {b.id: (s, b) for s, b in scored}
-
-    result = sorted(
-        unique.values(),
-        key=lambda x: x[0],
-        reverse=True
-    )
-
-    return [b for _, b in result[:5]]
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from ..deps import get_read_db, get_current_user
+from ..models import Book, BookStats, Review, Collection, User, collection_books
+from ..friend_graph import friends_of
+from ..loading import BOOK_OUT, REVIEW_BOOK_GENRES
+from ..schemas import BookOut
+from ..recommender import recommender, results
+from ..metrics import TimedRoute
+
+api = APIRouter(
+    prefix="/recommendations",
+    tags=["Recommendations"],
+    route_class=TimedRoute
+)
+
+# upper bound on books scored per request (per candidate source)
+CANDIDATES = 200
+# item-item scores are in [-2, 2]; this puts them on par with genre signals
+SIMILARITY_WEIGHT = 1.0
+
+async def get_excluded_book_ids(db: AsyncSession, user: User):
+    rows = await db.scalars(
+        select(collection_books.c.book_id).join(Collection).where(
+            Collection.user_id == user.id,
+            Collection.is_default == True,
+            Collection.name.in_(["Reading", "Read"])
+        )
+    )
+
+    return set(rows)
+
+
+async def get_user_reviews(db: AsyncSession, user: User):
+    result = await db.scalars(
+        select(Review).options(*REVIEW_BOOK_GENRES).where(
+            Review.user_id == user.id
+        )
+    )
+    return result.all()
+
+
+def get_genre_preferences(reviews):
+    genre_scores = {}
+
+    for r in reviews:
+        for g in r.book.genres:
+            genre_scores.setdefault(g.id, []).append(r.rating)
+
+    avg = {gid: sum(v) / len(v) for gid, v in genre_scores.items()}
+
+    liked = {gid for gid, score in avg.items() if score >= 4}
+    disliked = {gid for gid, score in avg.items() if score <= 2}
+
+    return liked, disliked
+
+
+async def books_liked_by_friends(db: AsyncSession, user: User):
+    rows = await db.scalars(
+        select(Review.book_id).where(
+            Review.user_id.in_(friends_of(user.id)),
+            Review.rating >= 4
+        ).distinct().limit(CANDIDATES)
+    )
+
+    return set(rows)
+
+
+async def popular_book_ids(db: AsyncSession):
+    rows = await db.scalars(
+        select(BookStats.book_id).order_by(
+            BookStats.review_count.desc()
+        ).limit(CANDIDATES)
+    )
+
+    return set(rows)
+
+
+@api.get("/", response_model=List[BookOut])
+async def recommend_books(
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    cached = results.get(user.id)
+    if cached is not None:
+        return cached
+    # write, който мине след четенето, не бива да остави стария списък в кеша
+    generation = results.generation(user.id)
+
+    excluded = await get_excluded_book_ids(db, user)
+    reviews = await get_user_reviews(db, user)
+    liked_genres, disliked_genres = get_genre_preferences(reviews)
+
+    similar = {}
+    index = recommender.index
+    if index is not None and reviews:
+        similar = index.score(
+            {r.book_id: r.rating for r in reviews}, CANDIDATES
+        )
+
+    friend_books = await books_liked_by_friends(db, user)
+    candidate_ids = (
+        similar.keys() | friend_books | await popular_book_ids(db)
+    ) - excluded
+
+    candidates = (await db.scalars(
+        select(Book).options(*BOOK_OUT).where(Book.id.in_(candidate_ids))
+    )).all()
+
+    scored = []
+
+    for book in candidates:
+        score = 0
+
+        if book.avg_rating:
+            score += book.avg_rating
+
+        genre_ids = {g.id for g in book.genres}
+
+        if genre_ids & liked_genres:
+            score += 2
+
+        if genre_ids & disliked_genres:
+            score -= 2
+
+        score += SIMILARITY_WEIGHT * similar.get(book.id, 0)
+
+        if book.id in friend_books:
+            score = max(score, 5)
+
+        scored.append((score, book))
+
+    result = sorted(
+        scored,
+        key=lambda x: x[0],
+        reverse=True
+    )
+
+    ranked = [
+        BookOut.model_validate(b, from_attributes=True)
+        for _, b in result[:5]
+    ]
+    results.set(user.id, ranked, generation=generation)
+    return ranked
+
+
+@api.post("/rebuild")
+async def rebuild_index(user: User = Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(403, "Not allowed")
+
+    recommender.rebuild_in_background()
+    return {"msg": "Recommendation index rebuild started"}
+
+
+@api.get("/cache-stats")
+async def cache_stats(user: User = Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(403, "Not allowed")
+
+    return results.stats()
@@ -1,95 +1,195 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from ..deps import get_db, get_current_user
-from ..models import Review, Book, User
-from ..schemas import ReviewCreate, ReviewOut
-#validation of rating 1-5
-
-api = APIRouter(
-    prefix="/reviews",
-    tags=["Reviews"]
-)
-
-@api.post("/books/{book_id}", response_model=ReviewOut)
-def add_review(
-    book_id: int,
-    data: ReviewCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    book = db.get(Book, book_id)
-    if not book:
-        raise HTTPException(404, "Book not found")
-
-    existing = db.query(Review).filter(
-        Review.book_id == book_id,
-        Review.user_id == user.id
-    ).first()
-
-    if existing:
-        raise HTTPException(400, "You already reviewed this book")
-
-    review = Review(
-        rating=data.rating,
-        comment=data.comment,
-        user_id=user.id,
-        book_id=book_id
-    )
-
-    db.add(review)
-    db.commit()
-    db.refresh(review)
-    return review
-
-@api.put("/{review_id}", response_model=ReviewOut)
-def edit_review(
-    review_id: int,
-    data: ReviewCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    review = db.get(Review, review_id)
-    if not review:
-        raise HTTPException(404, "Review not found")
-
-    if review.user_id != user.id:
-        raise HTTPException(403, "Not your review")
-
-    review.rating = data.rating
-    review.comment = data.comment
-    db.commit()
-    return review
-
-@api.delete("/{review_id}")
-def delete_review(
-    review_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    review = db.get(Review, review_id)
-    if not review:
-        raise HTTPException(404, "Review not found")
-
-    book = db.get(Book, review.book_id)
-
-    if (
-        user.id != review.user_id
-        and user.id != book.author_id
-        and user.role != "admin"
-    ):
-        raise HTTPException(403, "Not allowed")
-
-    db.delete(review)
-    db.commit()
-    return {"msg": "Review deleted"}
-
-@api.get("/books/{book_id}", response_model=List[ReviewOut])
-def get_book_reviews(
-    book_id: int,
-    db: Session = Depends(get_db)
-):
-    return db.query(Review).filter(
-        Review.book_id == book_id
-    ).all()
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_db, get_read_db, get_current_user
+from ..models import Review, Book, User
+from ..schemas import ReviewCreate, ReviewOut, ReviewBatch, BatchResult, Page
+from ..pagination import PageParams, paginate
+from ..ratings import add_ratings, apply_rating
+from ..recommender import invalidate_results
+from .. import fastjson, versions, write_queue
+from ..response_cache import cached, invalidate
+from ..metrics import TimedRoute
+
+api = APIRouter(
+    prefix="/reviews",
+    tags=["Reviews"],
+    route_class=TimedRoute
+)
+
+def _add_review(db, user_id: int, book_id: int, data: ReviewCreate):
+    book = db.get(Book, book_id)
+    if not book:
+        raise HTTPException(404, "Book not found")
+
+    existing = db.scalar(select(Review).where(
+        Review.book_id == book_id,
+        Review.user_id == user_id
+    ))
+
+    if existing:
+        raise HTTPException(400, "You already reviewed this book")
+
+    review = Review(
+        rating=data.rating,
+        comment=data.comment,
+        user_id=user_id,
+        book_id=book_id
+    )
+
+    db.add(review)
+    apply_rating(db, book_id, None, data.rating)
+    versions.bump(db, versions.BOOK, [book_id])
+    return review
+
+@api.post("/books/{book_id}", response_model=ReviewOut)
+async def add_review(
+    book_id: int,
+    data: ReviewCreate,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    review = await write_queue.run(
+        db, lambda db: _add_review(db, user.id, book_id, data)
+    )
+    invalidate(f"book:{book_id}")
+    await db.run_sync(invalidate_results, user.id, with_friends=True)
+    return review
+
+@api.post("/batch", response_model=BatchResult)
+async def add_reviews(
+    data: ReviewBatch,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    book_ids = {item.book_id for item in data.items}
+    found = set(await db.scalars(select(Book.id).where(Book.id.in_(book_ids))))
+    reviewed = set(await db.scalars(
+        select(Review.book_id).where(
+            Review.user_id == user.id,
+            Review.book_id.in_(found)
+        )
+    ))
+
+    results = []
+    new = []
+    seen = set()
+    for item in data.items:
+        if item.book_id in seen:
+            status = "duplicate"
+        elif item.book_id not in found:
+            status = "not_found"
+        elif item.book_id in reviewed:
+            status = "already_reviewed"
+        else:
+            status = "created"
+            new.append(len(results))
+        seen.add(item.book_id)
+        results.append({"book_id": item.book_id, "status": status})
+
+    if new:
+        items = [data.items[i] for i in new]
+        # едно ревю на книга → book_id свързва върнатите id-та с елементите
+        rows = await db.execute(
+            insert(Review.__table__).returning(Review.id, Review.book_id),
+            [
+                {"rating": item.rating, "comment": item.comment,
+                 "user_id": user.id, "book_id": item.book_id}
+                for item in items
+            ]
+        )
+        ids = {book_id: review_id for review_id, book_id in rows}
+        for i in new:
+            results[i]["id"] = ids[data.items[i].book_id]
+        await db.run_sync(
+            add_ratings, [(item.book_id, item.rating) for item in items]
+        )
+        await db.run_sync(
+            versions.bump, versions.BOOK, [item.book_id for item in items]
+        )
+        await db.commit()
+        invalidate(*{f"book:{item.book_id}" for item in items})
+        await db.run_sync(invalidate_results, user.id, with_friends=True)
+
+    return {"results": results}
+
+@api.put("/{review_id}", response_model=ReviewOut)
+async def edit_review(
+    review_id: int,
+    data: ReviewCreate,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    review = await db.get(Review, review_id)
+    if not review:
+        raise HTTPException(404, "Review not found")
+
+    if review.user_id != user.id:
+        raise HTTPException(403, "Not your review")
+
+    await db.run_sync(apply_rating, review.book_id, review.rating, data.rating)
+    await db.run_sync(versions.bump, versions.BOOK, [review.book_id])
+    review.rating = data.rating
+    review.comment = data.comment
+    await db.commit()
+    invalidate(f"book:{review.book_id}")
+    await db.run_sync(invalidate_results, user.id, with_friends=True)
+    return review
+
+@api.delete("/{review_id}")
+async def delete_review(
+    review_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    review = await db.get(Review, review_id)
+    if not review:
+        raise HTTPException(404, "Review not found")
+
+    book = await db.get(Book, review.book_id)
+
+    if (
+        user.id != review.user_id
+        and user.id != book.author_id
+        and user.role != "admin"
+    ):
+        raise HTTPException(403, "Not allowed")
+
+    await db.run_sync(apply_rating, review.book_id, review.rating, None)
+    await db.run_sync(versions.bump, versions.BOOK, [review.book_id])
+    reviewer_id = review.user_id
+    book_id = review.book_id
+    await db.delete(review)
+    await db.commit()
+    invalidate(f"book:{book_id}")
+    await db.run_sync(invalidate_results, reviewer_id, with_friends=True)
+    return {"msg": "Review deleted"}
+
+@api.get("/books/{book_id}", response_model=Page[ReviewOut])
+@cached(Page[ReviewOut], tags=lambda params, payload: [f"book:{params['book_id']}"])
+async def get_book_reviews(
+    book_id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db)
+):
+    cached = await versions.not_modified(
+        db, request, response, versions.BOOK, book_id
+    )
+    if cached:
+        return cached
+
+    if fastjson.ENABLED:
+        fast = await fastjson.book_reviews(db, book_id, page)
+        # ETag / Last-Modified от not_modified; FastAPI не ги слива в
+        # върнат директно Response
+        fast.headers.update(response.headers)
+        return fast
+
+    stmt = select(Review).where(
+        Review.book_id == book_id
+    )
+    return await paginate(db, stmt, page, Review.id)
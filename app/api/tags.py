@@ -1,82 +1,216 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from ..deps import get_db, get_current_user
-from ..models import Tag, Book, User
-from ..schemas import TagCreate, TagOut
-
-api = APIRouter(
-    prefix="/tags",
-    tags=["Tags"]
-)
-
-@api.post("/books/{book_id}", response_model=TagOut)
-def add_tag(
-    book_id: int,
-    data: TagCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    book = db.get(Book, book_id)
-    if not book:
-        raise HTTPException(404, "Book not found")
-
-    existing = db.query(Tag).filter(
-        Tag.book_id == book_id,
-        Tag.user_id == user.id,
-        Tag.name == data.name
-    ).first()
-
-    if existing:
-        raise HTTPException(400, "Tag already exists")
-
-    tag = Tag(
-        name=data.name,
-        user_id=user.id,
-        book_id=book_id
-    )
-
-    db.add(tag)
-    db.commit()
-    db.refresh(tag)
-    return tag
-
-@api.delete("/{tag_id}")
-def delete_tag(
-    tag_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    tag = db.get(Tag, tag_id)
-
-    if not tag or tag.user_id != user.id:
-        raise HTTPException(404, "Tag not found")
-
-    db.delete(tag)
-    db.commit()
-    return {"msg": "Tag deleted"}
-
-@api.get("/{tag_name}/books", response_model=List)
-def books_by_tag(
-    tag_name: str,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    tags = db.query(Tag).filter(
-        Tag.name == tag_name,
-        Tag.user_id == user.id
-    ).all()
-
-    return [tag.book for tag in tags]
-
-@api.get("/books/{book_id}", response_model=List[TagOut])
-def get_my_tags_for_book(
-    book_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
-):
-    return db.query(Tag).filter(
-        Tag.book_id == book_id,
-        Tag.user_id == user.id
-    ).all()
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal
+
+from ..deps import get_db, get_read_db, get_current_user
+from ..models import Tag, TagName, Book, User, user_tag_counts
+from ..schemas import TagCreate, TagOut, TagCount, TagBatch, BatchResult, BookOut, Page
+from ..pagination import PageParams, keyset, make_page
+from ..loading import BOOK_OUT
+from ..metrics import TimedRoute
+from .. import tag_vocab, write_queue
+
+MAX_CLOUD_SIZE = 200
+
+api = APIRouter(
+    prefix="/tags",
+    tags=["Tags"],
+    route_class=TimedRoute
+)
+
+def _add_tag(db, user_id: int, book_id: int, name: str):
+    book = db.get(Book, book_id)
+    if not book:
+        raise HTTPException(404, "Book not found")
+
+    tag_id = tag_vocab.resolve_ids(db, [name])[name]
+    existing = db.scalar(select(Tag.id).where(
+        Tag.book_id == book_id,
+        Tag.user_id == user_id,
+        Tag.tag_id == tag_id
+    ))
+
+    if existing:
+        raise HTTPException(400, "Tag already exists")
+
+    tag = Tag(
+        tag_id=tag_id,
+        user_id=user_id,
+        book_id=book_id
+    )
+
+    db.add(tag)
+    tag_vocab.add_uses(db, user_id, {tag_id: 1})
+    db.flush()
+    return {"id": tag.id, "name": name, "book_id": book_id}
+
+@api.post("/books/{book_id}", response_model=TagOut)
+async def add_tag(
+    book_id: int,
+    data: TagCreate,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    name = tag_vocab.normalize(data.name)
+    if not name:
+        raise HTTPException(400, "Tag name is empty")
+
+    tag = await write_queue.run(
+        db, lambda db: _add_tag(db, user.id, book_id, name)
+    )
+    tag_vocab.index.update({name: 1})
+    return tag
+
+@api.post("/batch", response_model=BatchResult)
+async def add_tags(
+    data: TagBatch,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    book_ids = {item.book_id for item in data.items}
+    found = set(await db.scalars(select(Book.id).where(Book.id.in_(book_ids))))
+    existing = set((await db.execute(
+        select(Tag.book_id, TagName.name)
+        .join(TagName, TagName.id == Tag.tag_id)
+        .where(
+            Tag.user_id == user.id,
+            Tag.book_id.in_(found)
+        )
+    )).all())
+
+    results = []
+    new = []
+    seen = set()
+    for item in data.items:
+        key = (item.book_id, tag_vocab.normalize(item.name))
+        if not key[1]:
+            status = "invalid"
+        elif key in seen:
+            status = "duplicate"
+        elif item.book_id not in found:
+            status = "not_found"
+        elif key in existing:
+            status = "exists"
+        else:
+            status = "created"
+            new.append((len(results), key))
+        seen.add(key)
+        results.append({"book_id": item.book_id, "status": status})
+
+    if new:
+        names = await db.run_sync(
+            tag_vocab.resolve_ids, {name for _, (_, name) in new}
+        )
+        # без sort_by_parameter_order SQLite праща един INSERT за всички;
+        # (book_id, tag_id) е уникален в партидата, по него връщаме id-тата
+        rows = await db.execute(
+            insert(Tag.__table__).returning(Tag.id, Tag.book_id, Tag.tag_id),
+            [
+                {"tag_id": names[name], "user_id": user.id, "book_id": book_id}
+                for _, (book_id, name) in new
+            ]
+        )
+        ids = {(book_id, tag_id): id_ for id_, book_id, tag_id in rows}
+        uses = {}
+        for i, (book_id, name) in new:
+            results[i]["id"] = ids[(book_id, names[name])]
+            uses[name] = uses.get(name, 0) + 1
+        await db.run_sync(
+            tag_vocab.add_uses, user.id,
+            {names[name]: count for name, count in uses.items()}
+        )
+        await db.commit()
+        tag_vocab.index.update(uses)
+
+    return {"results": results}
+
+@api.delete("/{tag_id}")
+async def delete_tag(
+    tag_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    tag = await db.get(Tag, tag_id)
+
+    if not tag or tag.user_id != user.id:
+        raise HTTPException(404, "Tag not found")
+
+    name = tag.name
+    await db.run_sync(tag_vocab.add_uses, user.id, {tag.tag_id: -1})
+    await db.delete(tag)
+    await db.commit()
+    tag_vocab.index.update({name: -1})
+    return {"msg": "Tag deleted"}
+
+@api.get("/cloud", response_model=List[TagCount])
+async def tag_cloud(
+    scope: Literal["mine", "all"] = "mine",
+    limit: int = Query(50, ge=1, le=MAX_CLOUD_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    if scope == "all":
+        # ix_tag_names_uses отзад напред
+        stmt = (
+            select(TagName.name, TagName.uses)
+            .where(TagName.uses > 0)
+            .order_by(TagName.uses.desc())
+        )
+    else:
+        stmt = (
+            select(TagName.name, user_tag_counts.c.uses)
+            .join(TagName, TagName.id == user_tag_counts.c.tag_id)
+            .where(user_tag_counts.c.user_id == user.id,
+                   user_tag_counts.c.uses > 0)
+            .order_by(user_tag_counts.c.uses.desc(), TagName.name)
+        )
+    rows = await db.execute(stmt.limit(limit))
+    return [{"name": name, "count": count} for name, count in rows]
+
+@api.get("/autocomplete", response_model=List[TagCount])
+async def autocomplete_tags(
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=tag_vocab.POPULAR_SIZE),
+    user: User = Depends(get_current_user)
+):
+    # от паметта, без SQL; класиране по употреба от всички потребители
+    return [
+        {"name": name, "count": count}
+        for name, count in tag_vocab.index.complete(prefix, limit)
+    ]
+
+@api.get("/{tag_name}/books", response_model=Page[BookOut])
+async def books_by_tag(
+    tag_name: str,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    # един join по ix_tags_user_id_tag_id, подреден по Tag.id
+    tag_id = select(TagName.id).where(
+        TagName.name == tag_vocab.normalize(tag_name)
+    ).scalar_subquery()
+    stmt = keyset(
+        select(Book, Tag.id.label("tag_row_id")).options(*BOOK_OUT)
+        .join(Tag, Tag.book_id == Book.id)
+        .where(Tag.user_id == user.id, Tag.tag_id == tag_id),
+        page, Tag.id
+    )
+    rows = (await db.execute(stmt)).all()
+    result = make_page(rows, page, lambda row: [row.tag_row_id])
+    result["items"] = [row.Book for row in result["items"]]
+    return result
+
+@api.get("/books/{book_id}", response_model=List[TagOut])
+async def get_my_tags_for_book(
+    book_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user)
+):
+    result = await db.scalars(select(Tag).where(
+        Tag.book_id == book_id,
+        Tag.user_id == user.id
+    ))
+    return result.all()
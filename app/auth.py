@@ -1,15 +1,31 @@
-from datetime import datetime, timedelta
-from jose import jwt, JWTError
-
-SECRET_KEY = "super-secret-key"  # ⚠️ по принцип в env var
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-def decode_token(token: str):
-    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+from datetime import datetime, timedelta
+
+SECRET_KEY = "super-secret-key"  # ⚠️ по принцип в env var
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def load_jwt():
+    # jose дърпа криптографските backend-и (~45 ms); зарежда се при
+    # първия токен или от readiness.warm_up, не при import на app.main
+    from jose import jwt
+    return jwt
+
+def create_access_token(data: dict):
+    to_encode = data.copy()
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
+    return load_jwt().encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_token(token: str):
+    from jose import JWTError
+
+    try:
+        return load_jwt().decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as exc:
+        raise InvalidToken(str(exc)) from exc
@@ -0,0 +1,116 @@
+"""Small thread-safe LRU cache with a per-entry TTL and usage counters.
+
+A reader that computes a value from the database and then stores it can
+race with a write that commits and invalidates the key in between. It
+takes `generation(key)` before reading and passes it to `set`, which
+drops the value if the key was invalidated since.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        # key -> номер на последното invalidate, от най-стария към най-новия
+        self._generations = {}
+        self._counter = 0
+        # generation на ключовете без запис: най-големият забравен номер
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            if entry[0] <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, self._floor)
+
+    def set(self, key, value, ttl: float | None = None, generation=None) -> bool:
+        """Stores `value`; with `generation`, only if `key` was not
+        invalidated after that generation was taken."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and (
+                generation != self._generations.get(key, self._floor)
+            ):
+                return False
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def _bump(self, key):
+        self._counter += 1
+        self._generations.pop(key, None)
+        self._generations[key] = self._counter
+        extra = len(self._generations) - self.max_entries
+        if extra > 0:
+            for old in list(itertools.islice(self._generations, extra)):
+                self._floor = self._generations.pop(old)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._bump(key)
+                if self._data.pop(key, _MISSING) is not _MISSING:
+                    self.invalidations += 1
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                self._bump(key)
+                del self._data[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counter += 1
+            self._generations.clear()
+            self._floor = self._counter
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -1,12 +1,91 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-
-DATABASE_URL = "sqlite:///./goodreads.db"
-
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-Base = declarative_base()
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from .metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./goodreads.db")
+ASYNC_DATABASE_URL = make_url(DATABASE_URL).set(drivername="sqlite+aiosqlite")
+
+# профил на SQLite; всяка стойност може да се смени през средата
+JOURNAL_MODE = os.environ.get("DB_JOURNAL_MODE", "WAL")
+# NORMAL е безопасно с WAL: губи се най-много последният commit при спиране на тока
+SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+CACHE_SIZE_KIB = int(os.environ.get("DB_CACHE_SIZE_KIB", 64 * 1024))
+MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+
+# SQLite има един писач: малко write връзки, повече за четене
+WRITE_POOL_SIZE = int(os.environ.get("DB_WRITE_POOL_SIZE", 4))
+WRITE_MAX_OVERFLOW = int(os.environ.get("DB_WRITE_MAX_OVERFLOW", 4))
+READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", 16))
+READ_MAX_OVERFLOW = int(os.environ.get("DB_READ_MAX_OVERFLOW", 16))
+POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", 30))
+
+
+def set_sqlite_pragmas(dbapi_connection, read_only: bool = False):
+    cursor = dbapi_connection.cursor()
+    # journal_mode се пази във файла; за :memory: SQLite просто връща "memory"
+    cursor.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={-CACHE_SIZE_KIB}")
+    cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def configure(engine, read_only: bool = False):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        set_sqlite_pragmas(dbapi_connection, read_only)
+
+    return engine
+
+
+# синхронният engine остава за init_db, CLI командите и фоновите задачи
+engine = configure(create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=TimedQueuePool,
+))
+instrument_engine(engine, "sync")
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# API-то работи през async engine-ите: един за писане, един само за четене
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=WRITE_POOL_SIZE,
+    max_overflow=WRITE_MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT_SECONDS,
+    poolclass=TimedAsyncQueuePool,
+)
+configure(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine, "write")
+
+# GET заявките четат от WAL snapshot и не чакат писачите
+async_read_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=READ_POOL_SIZE,
+    max_overflow=READ_MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT_SECONDS,
+    poolclass=TimedAsyncQueuePool,
+)
+configure(async_read_engine.sync_engine, read_only=True)
+instrument_engine(async_read_engine.sync_engine, "read")
+
+# expire_on_commit=False: след commit обектите не се презареждат мързеливо,
+# което в async контекст би гръмнало
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, autoflush=False, expire_on_commit=False
+)
+
+Base = declarative_base()
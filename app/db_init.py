@@ -1,5 +1,24 @@
-from .database import Base, engine
-from . import models  # важно: импортва всички модели
-
-def init_db():
-    Base.metadata.create_all(bind=engine)
+from sqlalchemy import inspect
+
+from .database import Base, engine, SessionLocal
+from . import models  # важно: импортва всички модели
+from . import friend_graph, migrations, ratings, search
+
+def init_db() -> list[int]:
+    """Creates missing tables, runs migrations and backfills; returns the
+    migration versions applied (see `python -m app.migrations upgrade`)."""
+    inspector = inspect(engine)
+    new_stats = not inspector.has_table("book_stats")
+    new_friendships = not inspector.has_table("friendships")
+    Base.metadata.create_all(bind=engine)
+    applied = migrations.upgrade(engine)
+
+    # първо пускане след добавянето на таблиците → попълваме ги
+    with SessionLocal() as db:
+        if new_stats:
+            ratings.rebuild(db)
+        if new_friendships:
+            friend_graph.rebuild(db)
+
+    search.init_index(engine)
+    return applied
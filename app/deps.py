@@ -1,33 +1,78 @@
-from fastapi import Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from jose import JWTError
-
-from .database import SessionLocal
-from .models import User
-from .auth import decode_token
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    try:
-        payload = decode_token(token)
-        user_id = int(payload["sub"])
-    except (JWTError, KeyError):
-        raise HTTPException(401, "Invalid token")
-
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(401, "User not found")
-
-    return user
+import os
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import TTLCache
+from .database import AsyncReadSessionLocal, AsyncSessionLocal
+from .models import User
+from .auth import InvalidToken, decode_token
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10_000))
+# горна граница за това колко дълго друг worker може да вижда стара роля
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", 60))
+# "1" → вярваме на подписания `role` claim и не четем users изобщо
+# (изтрит потребител остава валиден до изтичане на токена)
+TRUST_TOKEN_CLAIMS = os.environ.get("TRUST_TOKEN_CLAIMS", "0") == "1"
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    username: str
+    role: str
+
+
+# (user id, token iat) -> CurrentUser
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: int):
+    user_cache.invalidate_where(lambda key: key[0] == user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    # query_only връзки за GET заявките
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        payload = decode_token(token)
+        user_id = int(payload["sub"])
+    except (InvalidToken, KeyError, ValueError):
+        raise HTTPException(401, "Invalid token")
+
+    if TRUST_TOKEN_CLAIMS and "role" in payload and "username" in payload:
+        return CurrentUser(user_id, payload["username"], payload["role"])
+
+    key = (user_id, payload.get("iat"))
+    user = user_cache.get(key)
+    if user is not None:
+        return user
+
+    row = await db.get(User, user_id)
+    if not row:
+        raise HTTPException(401, "User not found")
+
+    user = CurrentUser(row.id, row.username, row.role)
+    user_cache.set(key, user)
+    return user
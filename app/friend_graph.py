@@ -0,0 +1,104 @@
+"""Friend graph backed by the symmetric `friendships` table.
+
+Every accepted friendship is stored twice, (a, b) and (b, a), so "friends
+of X" is a primary-key range scan on `user_id` instead of an OR over
+`friend_requests`. accept/remove keep it in sync in the same transaction.
+"""
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, aliased
+
+from .models import FriendRequest, FriendStatus, friendships
+
+# friends-of-friends search expands at most this many friends per user
+MAX_FRONTIER = 1000
+
+
+def add_friendship(db: Session, a: int, b: int):
+    db.execute(
+        insert(friendships).on_conflict_do_nothing(),
+        [{"user_id": a, "friend_id": b}, {"user_id": b, "friend_id": a}]
+    )
+
+
+def remove_friendship(db: Session, a: int, b: int):
+    db.execute(delete(friendships).where(
+        ((friendships.c.user_id == a) & (friendships.c.friend_id == b)) |
+        ((friendships.c.user_id == b) & (friendships.c.friend_id == a))
+    ))
+
+
+def friends_of(user_id: int):
+    """Selectable of the user's friend ids, for use in IN / joins."""
+    return select(friendships.c.friend_id).where(
+        friendships.c.user_id == user_id
+    )
+
+
+def mutual_counts(db: Session, user_id: int, other_ids) -> dict[int, int]:
+    """Number of friends `user_id` shares with each of `other_ids`."""
+    if not other_ids:
+        return {}
+    mine = aliased(friendships)
+    theirs = aliased(friendships)
+    rows = db.execute(
+        select(theirs.c.user_id, func.count())
+        .join(mine, mine.c.friend_id == theirs.c.friend_id)
+        .where(mine.c.user_id == user_id,
+               theirs.c.user_id.in_(list(other_ids)))
+        .group_by(theirs.c.user_id)
+    )
+    return dict(rows.all())
+
+
+def suggestions(db: Session, user_id: int, limit: int):
+    """People you may know: a two-hop BFS ranked by mutual friends.
+
+    The first hop is capped at MAX_FRONTIER friends so users with huge
+    friend lists stay bounded. Current friends and anyone with a pending
+    request either way are skipped. Returns (user_id, mutual) pairs.
+    """
+    frontier = friends_of(user_id).limit(MAX_FRONTIER).subquery()
+    second = aliased(friendships)
+
+    pending = select(FriendRequest.receiver_id).where(
+        FriendRequest.sender_id == user_id,
+        FriendRequest.status == FriendStatus.pending
+    ).union(select(FriendRequest.sender_id).where(
+        FriendRequest.receiver_id == user_id,
+        FriendRequest.status == FriendStatus.pending
+    ))
+
+    mutual = func.count().label("mutual")
+    rows = db.execute(
+        select(second.c.friend_id, mutual)
+        .join(frontier, second.c.user_id == frontier.c.friend_id)
+        .where(
+            second.c.friend_id != user_id,
+            second.c.friend_id.notin_(friends_of(user_id)),
+            second.c.friend_id.notin_(pending),
+        )
+        .group_by(second.c.friend_id)
+        .order_by(mutual.desc(), second.c.friend_id)
+        .limit(limit)
+    )
+    return rows.all()
+
+
+def rebuild(db: Session) -> int:
+    """Recomputes `friendships` from accepted friend requests."""
+    rows = db.execute(
+        select(FriendRequest.sender_id, FriendRequest.receiver_id).where(
+            FriendRequest.status == FriendStatus.accepted
+        )
+    ).all()
+    db.execute(delete(friendships))
+    if rows:
+        db.execute(insert(friendships).on_conflict_do_nothing(), [
+            pair
+            for a, b in rows
+            for pair in ({"user_id": a, "friend_id": b},
+                         {"user_id": b, "friend_id": a})
+        ])
+    db.commit()
+    return len(rows)
@@ -0,0 +1,517 @@
+"""Streaming bulk import of Goodreads library/catalog exports.
+
+    python -m app.importer goodreads_library_export.csv --owner admin
+    python -m app.importer reviews.ndjson --owner admin --batch-size 20000
+
+Records flow through generators (read → parse → batch) and every batch is
+written in its own transaction with executemany inserts, so memory stays
+bounded by the batch size whatever the file size. Only the genre name → id
+map is kept in memory; books, users and shelves are resolved per batch.
+
+Books are deduplicated through `book_sources` (Goodreads id, else ISBN13,
+else title + author). Each batch also stores how many input rows are done
+in `import_checkpoints`, so rerunning the same command after an
+interruption continues where the last committed batch ended. Replaying
+rows (--restart, or the same export a second time) is harmless: a user
+keeps one review per book (the last row for it wins, whatever the batch
+size; an existing review gets its rating and text) and a book sits on at
+most one of the user's default shelves, which the shelf names "to-read",
+"currently-reading" and "read" always refer to.
+
+Columns (CSV headers or NDJSON keys, Goodreads names first):
+    Book Id, Title, Author, ISBN13, Description, Genres, My Rating,
+    My Review, Exclusive Shelf, Bookshelves, and User Id / Username for
+    multi-user dumps (otherwise rows belong to --user).
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import secrets
+import sys
+import time
+
+from sqlalchemy import bindparam, delete, func, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import (
+    Book, Collection, Genre, Review, User,
+    book_genres, book_sources, collection_books, import_checkpoints
+)
+from .ratings import STARS, add_ratings, apply_rating
+from . import versions
+
+BATCH_SIZE = 5000
+# под лимита на SQLite за параметри в една заявка
+IN_CHUNK = 500
+
+DEFAULT_SHELVES = {
+    "to-read": "To Read",
+    "currently-reading": "Reading",
+    "read": "Read",
+}
+
+FIELDS = {
+    "goodreads_id": ("Book Id", "book_id"),
+    "title": ("Title", "title"),
+    "author": ("Author", "author"),
+    "isbn13": ("ISBN13", "isbn13"),
+    "description": ("Description", "description"),
+    "genres": ("Genres", "genres"),
+    "rating": ("My Rating", "rating"),
+    "review": ("My Review", "review_text", "review"),
+    "exclusive_shelf": ("Exclusive Shelf", "exclusive_shelf"),
+    "shelves": ("Bookshelves", "shelves"),
+    "user": ("Username", "User Id", "username", "user_id"),
+}
+
+
+# --- pipeline ---------------------------------------------------------------
+
+def read_records(path: str, fmt: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _field(raw: dict, name: str):
+    for column in FIELDS[name]:
+        value = raw.get(column)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _names(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def _clean_isbn(value) -> str | None:
+    # Goodreads пише ISBN-ите като ="9780..." заради Excel
+    if value is None:
+        return None
+    value = "".join(c for c in str(value) if c.isalnum())
+    return value or None
+
+
+def book_key(record: dict) -> str:
+    if record["goodreads_id"]:
+        return f"goodreads:{record['goodreads_id']}"
+    if record["isbn13"]:
+        return f"isbn13:{record['isbn13']}"
+    author = (record["author"] or "").strip().lower()
+    return f"title:{record['title'].strip().lower()}|{author}"
+
+
+def _rating(value) -> int:
+    return int(float(value)) if value is not None else 0
+
+
+def parse_records(raw_records):
+    """Normalizes raw rows; rows without a title or with a rating that is
+    not a number are yielded as None."""
+    for raw in raw_records:
+        title = _field(raw, "title")
+        if not title:
+            yield None
+            continue
+
+        try:
+            rating = _rating(_field(raw, "rating"))
+        except (TypeError, ValueError, OverflowError):
+            yield None
+            continue
+        record = {
+            "goodreads_id": _field(raw, "goodreads_id"),
+            "title": str(title).strip(),
+            "author": _field(raw, "author"),
+            "isbn13": _clean_isbn(_field(raw, "isbn13")),
+            "description": _field(raw, "description"),
+            "genres": _names(_field(raw, "genres")),
+            # 0 = без оценка в Goodreads
+            "rating": rating if rating in STARS else None,
+            "review": _field(raw, "review"),
+            "exclusive_shelf": _field(raw, "exclusive_shelf"),
+            "shelves": _names(_field(raw, "shelves")),
+            "user": _field(raw, "user"),
+        }
+        record["key"] = book_key(record)
+        yield record
+
+
+def batched(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK):
+        yield values[start:start + IN_CHUNK]
+
+
+# --- importer ---------------------------------------------------------------
+
+class Importer:
+    def __init__(self, conn, owner_id: int, default_user: str):
+        self.conn = conn
+        self.owner_id = owner_id
+        self.default_user = default_user
+        self.genres = dict(conn.execute(select(Genre.name, Genre.id)).all())
+        self._password_hash = None
+        self.counts = dict.fromkeys(
+            ["rows", "skipped", "books", "users", "reviews", "updated",
+             "shelved"], 0
+        )
+
+    @property
+    def password_hash(self) -> str:
+        # един случаен hash за всички внесени потребители: login е невъзможен,
+        # докато не им се зададе парола
+        if self._password_hash is None:
+            from .passwords import pwd_context
+            self._password_hash = pwd_context.hash(secrets.token_urlsafe(32))
+        return self._password_hash
+
+    def resolve_genres(self, names):
+        missing = sorted({n for n in names if n not in self.genres})
+        if missing:
+            stmt = insert(Genre.__table__)
+            # no-op update, за да върне id и на вече съществуващите
+            rows = self.conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Genre.name],
+                    set_={"name": stmt.excluded.name}
+                ).returning(Genre.name, Genre.id),
+                [{"name": name} for name in missing]
+            ).all()
+            self.genres.update(rows)
+            versions.bump(self.conn, versions.GENRE, [g for _, g in rows])
+            versions.bump(self.conn, versions.GENRES, [0])
+
+    def resolve_users(self, names) -> dict[str, int]:
+        names = set(names)
+        users = {}
+        for chunk in _chunks(names):
+            users.update(self.conn.execute(
+                select(User.username, User.id).where(User.username.in_(chunk))
+            ).all())
+
+        missing = sorted(names - users.keys())
+        if missing:
+            # без RETURNING: иначе SQLAlchemy праща по един INSERT на ред
+            self.conn.execute(insert(User.__table__), [
+                {"username": name, "password_hash": self.password_hash,
+                 "role": "user"}
+                for name in missing
+            ])
+            rows = []
+            for chunk in _chunks(missing):
+                rows += self.conn.execute(
+                    select(User.username, User.id)
+                    .where(User.username.in_(chunk))
+                ).all()
+            users.update(rows)
+            # същите рафтове като при POST /users/
+            self.conn.execute(insert(Collection.__table__), [
+                {"name": shelf, "is_default": True, "user_id": user_id}
+                for _, user_id in rows
+                for shelf in DEFAULT_SHELVES.values()
+            ])
+            self.counts["users"] += len(rows)
+        return users
+
+    def resolve_books(self, records) -> dict[str, int]:
+        first = {}
+        for record in records:
+            first.setdefault(record["key"], record)
+
+        books = {}
+        for chunk in _chunks(first):
+            books.update(self.conn.execute(
+                select(book_sources.c.key, book_sources.c.book_id)
+                .where(book_sources.c.key.in_(chunk))
+            ).all())
+
+        new = [first[key] for key in first if key not in books]
+        if not new:
+            return books
+
+        # един executemany без RETURNING; транзакцията държи заключването за
+        # писане, така че новите id-та са последните len(new) в таблицата
+        self.conn.execute(insert(Book.__table__), [
+            {"title": r["title"], "description": r["description"],
+             "author_id": self.owner_id}
+            for r in new
+        ])
+        last = self.conn.scalar(select(func.max(Book.id)))
+        rows = self.conn.execute(
+            select(Book.id, Book.title)
+            .where(Book.id > last - len(new)).order_by(Book.id)
+        ).all()
+        if [title for _, title in rows] != [r["title"] for r in new]:
+            raise RuntimeError("New book ids do not match the inserted titles")
+        ids = [book_id for book_id, _ in rows]
+        books.update((r["key"], book_id) for r, book_id in zip(new, ids))
+        versions.bump(self.conn, versions.BOOK, ids)
+        self.conn.execute(insert(book_sources), [
+            {"key": r["key"], "book_id": book_id}
+            for r, book_id in zip(new, ids)
+        ])
+
+        self.resolve_genres(name for r in new for name in r["genres"])
+        links = [
+            {"book_id": book_id, "genre_id": self.genres[name]}
+            for r, book_id in zip(new, ids)
+            for name in set(r["genres"])
+        ]
+        if links:
+            self.conn.execute(
+                insert(book_genres).on_conflict_do_nothing(), links
+            )
+        self.counts["books"] += len(new)
+        return books
+
+    def resolve_shelves(self, wanted) -> dict[tuple[int, str], int]:
+        """(user id, shelf name) → collection id, creating missing shelves.
+
+        The DEFAULT_SHELVES names always mean the user's default
+        collections, never a custom shelf that happens to share the name.
+        """
+        wanted = set(wanted)
+        defaults = set(DEFAULT_SHELVES.values())
+        shelves = {}
+
+        def load(user_ids):
+            for chunk in _chunks(user_ids):
+                rows = self.conn.execute(
+                    select(Collection.user_id, Collection.name, Collection.id,
+                           Collection.is_default)
+                    .where(Collection.user_id.in_(chunk))
+                ).all()
+                for u, n, c, is_default in rows:
+                    if (u, n) not in shelves and (is_default or n not in defaults):
+                        shelves[(u, n)] = c
+
+        load({user_id for user_id, _ in wanted})
+        missing = sorted(wanted - shelves.keys())
+        if missing:
+            self.conn.execute(insert(Collection.__table__), [
+                {"name": name, "is_default": name in defaults, "user_id": user_id}
+                for user_id, name in missing
+            ])
+            load({user_id for user_id, _ in missing})
+        return shelves
+
+    def existing_reviews(self, pairs) -> dict[tuple[int, int], tuple]:
+        """(user id, book id) → (review id, rating, comment) of stored reviews."""
+        existing = {}
+        for chunk in _chunks(pairs):
+            rows = self.conn.execute(
+                select(Review.user_id, Review.book_id, Review.id,
+                       Review.rating, Review.comment)
+                .where(tuple_(Review.user_id, Review.book_id).in_(chunk))
+            ).all()
+            existing.update(((u, b), (i, r, c)) for u, b, i, r, c in rows)
+        return existing
+
+    def write_reviews(self, reviews):
+        if not reviews:
+            return
+        existing = self.existing_reviews(reviews)
+        new = [r for key, r in reviews.items() if key not in existing]
+        changed = []
+        for key, r in reviews.items():
+            if key not in existing:
+                continue
+            review_id, rating, comment = existing[key]
+            if (rating, comment) != (r["rating"], r["comment"]):
+                changed.append((review_id, rating, r))
+
+        if new:
+            self.conn.execute(insert(Review.__table__), new)
+            add_ratings(self.conn, ((r["book_id"], r["rating"]) for r in new))
+        if changed:
+            table = Review.__table__
+            self.conn.execute(
+                update(table).where(table.c.id == bindparam("review_id"))
+                .values(rating=bindparam("new_rating"),
+                        comment=bindparam("new_comment")),
+                [
+                    {"review_id": review_id, "new_rating": r["rating"],
+                     "new_comment": r["comment"]}
+                    for review_id, _, r in changed
+                ]
+            )
+            for _, old, r in changed:
+                apply_rating(self.conn, r["book_id"], old, r["rating"])
+        touched = new + [r for _, _, r in changed]
+        versions.bump(self.conn, versions.BOOK, (r["book_id"] for r in touched))
+        self.counts["reviews"] += len(new)
+        self.counts["updated"] += len(changed)
+
+    def place_books(self, placements):
+        """Puts (user id, shelf name, book id) placements on the shelves.
+
+        Like POST /collections/{id}/books/{id}: a book put on a default
+        shelf leaves the user's other default shelves; the last default
+        shelf named for a book wins.
+        """
+        shelves = self.resolve_shelves((u, n) for u, n, _ in placements)
+        defaults = set(DEFAULT_SHELVES.values())
+        rows = set()
+        on_default = {}
+        for u, n, b in placements:
+            if n in defaults:
+                on_default[(u, b)] = n
+            else:
+                rows.add((shelves[(u, n)], b))
+        rows.update((shelves[(u, n)], b) for (u, b), n in on_default.items())
+
+        leave = [
+            {"c": shelves[(u, other)], "b": b}
+            for (u, b), n in on_default.items()
+            for other in defaults - {n}
+            if (u, other) in shelves
+        ]
+        if leave:
+            self.conn.execute(
+                delete(collection_books).where(
+                    collection_books.c.collection_id == bindparam("c"),
+                    collection_books.c.book_id == bindparam("b")
+                ),
+                leave
+            )
+        self.conn.execute(
+            insert(collection_books).on_conflict_do_nothing(),
+            [{"collection_id": c, "book_id": b} for c, b in rows]
+        )
+        self.counts["shelved"] += len(rows)
+
+    def import_batch(self, batch):
+        records = [r for r in batch if r is not None]
+        self.counts["rows"] += len(batch)
+        self.counts["skipped"] += len(batch) - len(records)
+        if not records:
+            return
+
+        users = self.resolve_users(r["user"] or self.default_user for r in records)
+        books = self.resolve_books(records)
+
+        reviews = {}
+        placements = []
+        for r in records:
+            user_id = users[r["user"] or self.default_user]
+            book_id = books[r["key"]]
+            if r["rating"] is not None:
+                # едно ревю на книга, както в POST /reviews; последният ред
+                # печели и в партидата, и между партидите (write_reviews
+                # обновява вече записаните)
+                reviews[(user_id, book_id)] = {
+                    "rating": r["rating"], "comment": r["review"],
+                    "user_id": user_id, "book_id": book_id,
+                }
+            names = list(r["shelves"])
+            if r["exclusive_shelf"]:
+                names.append(r["exclusive_shelf"])
+            for name in names:
+                placements.append(
+                    (user_id, DEFAULT_SHELVES.get(name, name), book_id)
+                )
+
+        self.write_reviews(reviews)
+        if placements:
+            self.place_books(placements)
+
+
+def _checkpoint(conn, source: str) -> int:
+    done = conn.scalar(
+        select(import_checkpoints.c.rows_done)
+        .where(import_checkpoints.c.source == source)
+    )
+    return done or 0
+
+
+def _save_checkpoint(conn, source: str, rows_done: int):
+    stmt = insert(import_checkpoints).values(source=source, rows_done=rows_done)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[import_checkpoints.c.source],
+        set_={"rows_done": rows_done}
+    ))
+
+
+def run_import(engine, path: str, owner: str, user: str | None = None,
+               fmt: str | None = None, batch_size: int = BATCH_SIZE,
+               restart: bool = False, progress=None) -> dict:
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    source = os.path.realpath(path)
+
+    with engine.begin() as conn:
+        owner_id = conn.scalar(select(User.id).where(User.username == owner))
+        if owner_id is None:
+            raise SystemExit(f"Unknown --owner user {owner!r}")
+        done = 0 if restart else _checkpoint(conn, source)
+        importer = Importer(conn, owner_id, user or owner)
+
+    records = parse_records(itertools.islice(read_records(path, fmt), done, None))
+    for batch in batched(records, batch_size):
+        # една транзакция на batch; checkpoint-ът се записва в нея
+        with engine.begin() as conn:
+            importer.conn = conn
+            importer.import_batch(batch)
+            done += len(batch)
+            _save_checkpoint(conn, source, done)
+        if progress:
+            progress(done, importer.counts)
+
+    importer.counts["rows_done"] = done
+    return importer.counts
+
+
+def main(argv=None):
+    from .database import engine
+    from .db_init import init_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.importer")
+    parser.add_argument("path")
+    parser.add_argument("--owner", required=True,
+                        help="existing user recorded as author_id of new books")
+    parser.add_argument("--user",
+                        help="owner of rows without a user column "
+                             "(default: --owner)")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the checkpoint and start from row 0")
+    args = parser.parse_args(argv)
+
+    init_db()
+    started = time.perf_counter()
+
+    def progress(done, counts):
+        rate = done / (time.perf_counter() - started)
+        print(f"\r{done:,} rows ({rate:,.0f}/s), "
+              f"{counts['reviews']:,} reviews, {counts['books']:,} new books",
+              end="", file=sys.stderr, flush=True)
+
+    counts = run_import(
+        engine, args.path, args.owner, args.user, args.format,
+        args.batch_size, args.restart, progress
+    )
+    print(file=sys.stderr)
+    print(", ".join(f"{k}={v}" for k, v in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Eager-loading plans, one per response shape.
+
+Every router that returns these shapes loads through the matching plan so
+serialization never triggers a lazy load: the number of SQL statements
+per request stays fixed no matter how many rows come back.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from .models import Book, Collection, Review
+
+# BookOut: genres + avg_rating (book_stats)
+BOOK_OUT = (
+    joinedload(Book.stats),
+    selectinload(Book.genres),
+)
+
+# CollectionOut: books, each as BookOut
+COLLECTION_OUT = (
+    selectinload(Collection.books).options(*BOOK_OUT),
+)
+
+# Review → book genres (genre preferences in recommendations)
+REVIEW_BOOK_GENRES = (
+    selectinload(Review.book).selectinload(Book.genres),
+)
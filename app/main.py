@@ -1,52 +1,96 @@
-from fastapi import FastAPI
-
-from .database import Base, engine
-from .db_init import init_db
-
-from .api import (
-    auth,
-    users,
-    books,
-    genres,
-    reviews,
-    collections,
-    tags,
-    friends,
-    recommendations
-)
-
-# 👉 инициализация на базата
-init_db()
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="Goodreads for X",
-    version="1.0.0"
-)
-
-# 🔐 AUTH
-app.include_router(auth.api)
-
-# 👤 USERS
-app.include_router(users.api)
-
-# 📚 BOOKS
-app.include_router(books.api)
-
-# 🏷 GENRES
-app.include_router(genres.api)
-
-# 📝 REVIEWS
-app.include_router(reviews.api)
-
-# 📂 COLLECTIONS
-app.include_router(collections.api)
-
-# 🏷 TAGS
-app.include_router(tags.api)
-
-# 🤝 FRIENDS
-app.include_router(friends.api)
-
-# 🎯 RECOMMENDATIONS
-app.include_router(recommendations.api)
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from .database import async_engine, async_read_engine
+from . import metrics, readiness, tag_vocab, title_index, write_queue
+from .recommender import recommender
+
+from .api import (
+    auth,
+    users,
+    books,
+    genres,
+    reviews,
+    collections,
+    tags,
+    friends,
+    recommendations,
+    admin,
+    health
+)
+
+# 👉 схемата не се пипа при import: `python -m app.migrations upgrade`
+# се пуска отделно преди стартиране
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await readiness.check_schema()
+    readiness.mark_started()
+    # индексът за препоръки се строи на заден план и се подменя атомарно
+    recommender.start()
+    # речникът за autocomplete на таговете, пак на заден план
+    tag_vocab.index.start()
+    # заглавията за /books/autocomplete: от снимката, ако има
+    title_index.index.start()
+    warming = asyncio.create_task(readiness.warm_up())
+    yield
+    warming.cancel()
+    # опашката за group commit се изпразва, преди engine-ите да се затворят
+    await write_queue.writer.stop()
+    recommender.stop()
+    tag_vocab.index.stop()
+    title_index.index.stop()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+app = FastAPI(
+    title="Goodreads for X",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# 🔐 AUTH
+app.include_router(auth.api)
+
+# 👤 USERS
+app.include_router(users.api)
+
+# 📚 BOOKS
+app.include_router(books.api)
+
+# 🏷 GENRES
+app.include_router(genres.api)
+
+# 📝 REVIEWS
+app.include_router(reviews.api)
+
+# 📂 COLLECTIONS
+app.include_router(collections.api)
+
+# 🏷 TAGS
+app.include_router(tags.api)
+
+# 🤝 FRIENDS
+app.include_router(friends.api)
+
+# 🎯 RECOMMENDATIONS
+app.include_router(recommendations.api)
+
+# 🛠 ADMIN
+app.include_router(admin.api)
+
+# ❤️ HEALTH
+app.include_router(health.api)
+
+# 📈 METRICS
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
@@ -0,0 +1,342 @@
+"""In-process request metrics in Prometheus text format.
+
+Per route: latency and response size histograms, status counts, SQL
+statements and DB time. Per engine: statements, pool checkout wait and
+pool occupancy. Everything is a few counters under a lock, cheap enough
+to leave on; a per-request `Server-Timing` header shows where the time went.
+"""
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from . import profiling
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# маршрут за заявки, които не са стигнали до endpoint (404, 405)
+UNMATCHED = "unmatched"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "pool_seconds", "endpoint_done")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.pool_seconds = 0.0
+        self.endpoint_done = None
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Labelled counters and histograms; labels are plain tuples."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.help = {}
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_gauge(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def render(self, extra=()) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = {
+                key: (h.buckets, list(h.counts), h.sum)
+                for key, h in self.histograms.items()
+            }
+        # name -> [(label set, lines)]; подреждат се само наборите етикети,
+        # редовете на един хистограм остават в реда, в който са генерирани
+        samples = {}
+        for (name, labels), value in list(counters.items()) + list(gauges.items()):
+            samples.setdefault(name, []).append(
+                (labels, [f"{name}{_labels(labels)} {_number(value)}"])
+            )
+        for name, labels, value in extra:
+            samples.setdefault(name, []).append(
+                (labels, [f"{name}{_labels(labels)} {_number(value)}"])
+            )
+        for (name, labels), (buckets, counts, total) in histograms.items():
+            lines = []
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(
+                    f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}"
+                )
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+            samples.setdefault(name, []).append((labels, lines))
+
+        out = []
+        for name in sorted(samples):
+            kind, text = self.help.get(name, ("untyped", name))
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            for _, lines in sorted(samples[name], key=_label_key):
+                out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _label_key(sample):
+    return tuple((k, str(v)) for k, v in sample[0])
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+registry.describe("http_requests_total", "counter", "Requests by route and status.")
+registry.describe("http_requests_in_flight", "gauge", "Requests being handled.")
+registry.describe("http_request_duration_seconds", "histogram",
+                  "Time to the end of the response body.")
+registry.describe("http_response_size_bytes", "histogram", "Response body size.")
+registry.describe("http_request_sql_statements", "histogram",
+                  "SQL statements per request.")
+registry.describe("http_request_db_seconds_total", "counter",
+                  "Time spent in SQL statements, by route.")
+registry.describe("db_statements_total", "counter", "SQL statements by engine.")
+registry.describe("db_statement_seconds_total", "counter",
+                  "Time spent in SQL statements, by engine.")
+registry.describe("db_pool_checkout_seconds", "histogram",
+                  "Wait for a pooled connection, including opening a new one.")
+registry.describe("db_pool_checked_out", "gauge", "Connections in use.")
+registry.describe("db_pool_size", "gauge", "Configured pool size.")
+registry.describe("db_pool_overflow", "gauge", "Connections above pool size.")
+
+# name -> engine, за pool gauge-овете при /metrics
+_engines = {}
+
+
+# ---------- SQLAlchemy ----------
+
+def _timed_connect(connect):
+    @functools.wraps(connect)
+    def timed(self):
+        t0 = time.perf_counter()
+        try:
+            return connect(self)
+        finally:
+            elapsed = time.perf_counter() - t0
+            registry.observe("db_pool_checkout_seconds",
+                             (("engine", self.metrics_name),),
+                             elapsed, LATENCY_BUCKETS)
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_seconds += elapsed
+
+    return timed
+
+
+class TimedQueuePool(QueuePool):
+    metrics_name = "sync"
+    connect = _timed_connect(QueuePool.connect)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    metrics_name = "async"
+    connect = _timed_connect(AsyncAdaptedQueuePool.connect)
+
+
+def _name_pool(engine, name):
+    if isinstance(engine.pool, (TimedQueuePool, TimedAsyncQueuePool)):
+        engine.pool.metrics_name = name
+
+
+def instrument_engine(engine, name: str):
+    """Counts statements and DB time on a (sync) Engine under `name`."""
+    _engines[name] = engine
+    _name_pool(engine, name)
+    labels = (("engine", name),)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("metrics_t0")
+        registry.inc("db_statements_total", labels)
+        registry.inc("db_statement_seconds_total", labels, elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+
+    # dispose() сменя pool-а с нов обект от същия клас, без името
+    @event.listens_for(engine, "engine_disposed")
+    def disposed(engine):
+        _name_pool(engine, name)
+
+    return engine
+
+
+def pool_samples():
+    for name, engine in _engines.items():
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        labels = (("engine", name),)
+        yield "db_pool_checked_out", labels, pool.checkedout()
+        yield "db_pool_size", labels, pool.size()
+        yield "db_pool_overflow", labels, max(pool.overflow(), 0)
+
+
+def render() -> str:
+    return registry.render(pool_samples())
+
+
+# ---------- FastAPI ----------
+
+def _timed_endpoint(call, path):
+    @functools.wraps(call)
+    async def timed(*args, **kwargs):
+        # при изключено профилиране това е единствената цена
+        session = profiling.session
+        if session is not None and session.wants(path):
+            session.enter()
+        else:
+            session = None
+        try:
+            return await call(*args, **kwargs)
+        finally:
+            if session is not None:
+                session.exit()
+            stats = _current.get()
+            if stats is not None:
+                stats.endpoint_done = time.perf_counter()
+
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """Marks when the endpoint returns, so the middleware can tell the
+    handler apart from response validation and JSON encoding; also where
+    an on-demand profiling session picks up its requests."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        # всички endpoint-и са async; sync такъв FastAPI праща в threadpool
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _timed_endpoint(endpoint, path)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.2f}"
+
+
+class MetricsMiddleware:
+    """Pure ASGI, so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats()
+        token = _current.set(stats)
+        registry.add_gauge("http_requests_in_flight", ())
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = time.perf_counter()
+                total = now - start
+                serialize = now - stats.endpoint_done if stats.endpoint_done else 0.0
+                app_time = max(total - stats.db_seconds - serialize, 0.0)
+                timing = (
+                    f'db;dur={_ms(stats.db_seconds)};desc="{stats.statements} queries", '
+                    f"pool;dur={_ms(stats.pool_seconds)}, "
+                    f"app;dur={_ms(app_time)}, "
+                    f"serialize;dur={_ms(serialize)}, "
+                    f"total;dur={_ms(total)}"
+                )
+                message["headers"] = list(message.get("headers", ())) + [
+                    (b"server-timing", timing.encode())
+                ]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", UNMATCHED)
+            labels = (("method", method), ("route", path))
+            registry.add_gauge("http_requests_in_flight", (), -1)
+            registry.inc("http_requests_total", labels + (("status", str(status)),))
+            registry.observe("http_request_duration_seconds", labels, elapsed,
+                             LATENCY_BUCKETS)
+            registry.observe("http_response_size_bytes", labels, size, SIZE_BUCKETS)
+            registry.observe("http_request_sql_statements", labels,
+                             stats.statements, STATEMENT_BUCKETS)
+            registry.inc("http_request_db_seconds_total", labels, stats.db_seconds)
@@ -0,0 +1,140 @@
+"""Schema migrations for databases created by older versions.
+
+`create_all` only adds missing tables, so changes to existing tables
+(indexes, columns) go here. The schema version is SQLite's
+`PRAGMA user_version`; `upgrade` runs every migration above it, each in
+its own transaction together with the version bump.
+
+    python -m app.migrations upgrade
+    python -m app.migrations current
+
+`upgrade` is the setup step for a deploy: it also creates missing tables,
+backfills them and builds the search index (app.db_init). The app itself
+runs no DDL and refuses to start below len(MIGRATIONS).
+"""
+import argparse
+import sys
+
+from sqlalchemy import inspect, text
+
+from .database import Base
+from . import models  # важно: регистрира таблиците в Base.metadata
+from . import tag_vocab, versions
+from .models import entity_versions, user_tag_counts
+
+
+def _create_indexes(conn, names):
+    indexes = {
+        index.name: index
+        for table in Base.metadata.sorted_tables
+        for index in table.indexes
+    }
+    for name in names:
+        # индекси, махнати от по-късна миграция, вече не са в metadata
+        if name in indexes:
+            indexes[name].create(conn, checkfirst=True)
+
+
+def _secondary_indexes(conn):
+    _create_indexes(conn, [
+        "ix_reviews_book_id",
+        "ix_reviews_user_id_book_id",
+        "ix_tags_user_id_name",
+        "ix_tags_book_id_user_id",
+        "ix_friend_requests_sender_id_receiver_id",
+        "ix_friend_requests_receiver_id_status",
+        "ix_collections_user_id_is_default",
+        "ix_collection_books_book_id",
+        "ix_book_genres_genre_id",
+        "ix_book_stats_review_count",
+    ])
+
+
+def _entity_versions(conn):
+    # таблицата идва от create_all; съществуващите книги и жанрове
+    # получават version 1, за да имат Last-Modified от самото начало
+    entity_versions.create(conn, checkfirst=True)
+    versions.stamp_existing(conn)
+
+
+def _tag_vocabulary(conn):
+    # tags.name → tags.tag_id към tag_names; SQLite не сменя колони на
+    # място, затова таблицата се строи наново
+    models.TagName.__table__.create(conn, checkfirst=True)
+    user_tag_counts.create(conn, checkfirst=True)
+    columns = {c["name"] for c in inspect(conn).get_columns("tags")}
+    if "name" in columns:
+        names = {
+            raw: tag_vocab.normalize(raw)
+            for raw, in conn.execute(text("SELECT DISTINCT name FROM tags"))
+        }
+        names = {raw: name for raw, name in names.items() if name}
+        ids = tag_vocab.resolve_ids(conn, set(names.values()))
+        conn.execute(text("CREATE TEMP TABLE tag_map (raw TEXT PRIMARY KEY, tag_id INTEGER)"))
+        if names:
+            conn.execute(
+                text("INSERT INTO tag_map VALUES (:raw, :tag_id)"),
+                [{"raw": raw, "tag_id": ids[name]} for raw, name in names.items()]
+            )
+        for index in ("ix_tags_user_id_name", "ix_tags_book_id_user_id"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        conn.execute(text("ALTER TABLE tags RENAME TO tags_old"))
+        models.Tag.__table__.create(conn)
+        # "Fav" и "fav" на една книга стават един таг
+        conn.execute(text(
+            "INSERT INTO tags (id, tag_id, user_id, book_id) "
+            "SELECT min(o.id), m.tag_id, o.user_id, o.book_id "
+            "FROM tags_old o JOIN temp.tag_map m ON m.raw = o.name "
+            "GROUP BY m.tag_id, o.user_id, o.book_id ORDER BY 1"
+        ))
+        conn.execute(text("DROP TABLE tags_old"))
+        conn.execute(text("DROP TABLE temp.tag_map"))
+    tag_vocab.recount(conn)
+
+
+# version N is reached by running MIGRATIONS[N - 1]; only ever append
+MIGRATIONS = [
+    _secondary_indexes,
+    _entity_versions,
+    _tag_vocabulary,
+]
+
+
+def current_version(conn) -> int:
+    return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def upgrade(engine) -> list[int]:
+    """Brings the database up to len(MIGRATIONS); returns applied versions."""
+    applied = []
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        with engine.begin() as conn:
+            migration(conn)
+            # PRAGMA не приема bind параметри
+            conn.execute(text(f"PRAGMA user_version = {number:d}"))
+        applied.append(number)
+    return applied
+
+
+def main(argv=None):
+    from .database import engine
+
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["upgrade", "current"])
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        # db_init внася този модул
+        from .db_init import init_db
+
+        applied = init_db()
+        print(f"Applied {applied}" if applied else "Already up to date")
+    with engine.connect() as conn:
+        print(f"Schema version {current_version(conn)} of {len(MIGRATIONS)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
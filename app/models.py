@@ -1,155 +1,261 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table, CheckConstraint, select, Boolean, Enum
-from sqlalchemy.orm import relationship, column_property
-from sqlalchemy.sql import func
-from .database import Base
-import enum
-
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto"
-)
-
-book_genres = Table(
-    "book_genres",
-    Base.metadata,
-    Column("book_id", ForeignKey("books.id"), primary_key=True),
-    Column("genre_id", ForeignKey("genres.id"), primary_key=True),
-)
-
-class User(Base):
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True)
-    username = Column(String, unique=True, nullable=False)
-    password_hash = Column(String, nullable=False)
-    role = Column(String, default="user")
-
-    reviews = relationship(
-        "Review",
-        back_populates="user",
-        cascade="all, delete-orphan"
-    )
-
-    def set_password(self, password: str):
-        password = password.strip()
-
-        if len(password.encode("utf-8")) > 72:
-            raise ValueError("Password too long (max 72 bytes)")
-
-        self.password_hash = pwd_context.hash(password)
-
-    def verify_password(self, password: str) -> bool:
-        return pwd_context.verify(password, self.password_hash)
-
-class Review(Base):
-    __tablename__ = "reviews"
-
-    id = Column(Integer, primary_key=True)
-    rating = Column(Integer, nullable=False)
-    comment = Column(Text)
-
-    user_id = Column(Integer, ForeignKey("users.id"))
-    book_id = Column(Integer, ForeignKey("books.id"))
-
-    user = relationship("User", back_populates="reviews")
-    book = relationship("Book", back_populates="reviews")
-
-class Book(Base):
-    __tablename__ = "books"
-
-    id = Column(Integer, primary_key=True)
-    title = Column(String, nullable=False)
-    description = Column(Text)
-    cover_url = Column(String)
-
-    author_id = Column(Integer, ForeignKey("users.id"))
-    author = relationship("User")
-
-    genres = relationship("Genre", secondary=book_genres, back_populates="books")
-    reviews = relationship(
-        "Review",
-        back_populates="book",
-        cascade="all, delete-orphan"
-    )
-
-    avg_rating = column_property(
-        select(func.avg(Review.rating))
-        .where(Review.book_id == id)
-        .correlate_except(Review)
-        .scalar_subquery()
-    )
-
-    collections = relationship(
-        "Collection",
-        secondary="collection_books",
-        back_populates="books"
-    )
-
-
-class Genre(Base):
-    __tablename__ = "genres"
-
-    id = Column(Integer, primary_key=True)
-    name = Column(String, unique=True, nullable=False)
-
-    books = relationship("Book", secondary=book_genres, back_populates="genres")
-
-class Collection(Base):
-    __tablename__ = "collections"
-
-    id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
-    is_default = Column(Boolean, default=False)
-
-    user_id = Column(Integer, ForeignKey("users.id"))
-    user = relationship("User")
-
-    books = relationship(
-        "Book",
-        secondary="collection_books",
-        back_populates="collections"
-    )
-
-
-collection_books = Table(
-    "collection_books",
-    Base.metadata,
-    Column("collection_id", ForeignKey("collections.id"), primary_key=True),
-    Column("book_id", ForeignKey("books.id"), primary_key=True),
-)
-
-class Tag(Base):
-    __tablename__ = "tags"
-
-    id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
-
-    user_id = Column(Integer, ForeignKey("users.id"))
-    book_id = Column(Integer, ForeignKey("books.id"))
-
-    user = relationship("User")
-    book = relationship("Book")
-
-    __table_args__ = (
-        CheckConstraint("length(name) > 0"),
-    )
-
-class FriendStatus(enum.Enum):
-    pending = "pending"
-    accepted = "accepted"
-    rejected = "rejected"
-
-class FriendRequest(Base):
-    __tablename__ = "friend_requests"
-
-    id = Column(Integer, primary_key=True)
-
-    sender_id = Column(Integer, ForeignKey("users.id"))
-    receiver_id = Column(Integer, ForeignKey("users.id"))
-
-    status = Column(Enum(FriendStatus), default=FriendStatus.pending)
-
-    sender = relationship("User", foreign_keys=[sender_id])
-    receiver = relationship("User", foreign_keys=[receiver_id])
\ No newline at end of file
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table, CheckConstraint, Boolean, Enum, Index, select
+from sqlalchemy.orm import column_property, relationship
+from .database import Base
+import enum
+
+from . import passwords
+
+book_genres = Table(
+    "book_genres",
+    Base.metadata,
+    Column("book_id", ForeignKey("books.id"), primary_key=True),
+    Column("genre_id", ForeignKey("genres.id"), primary_key=True),
+    # PK-то покрива (book_id, ...); това е обратната посока
+    Index("ix_book_genres_genre_id", "genre_id", "book_id"),
+)
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String, unique=True, nullable=False)
+    password_hash = Column(String, nullable=False)
+    role = Column(String, default="user")
+
+    reviews = relationship(
+        "Review",
+        back_populates="user",
+        cascade="all, delete-orphan"
+    )
+
+    def set_password(self, password: str):
+        password = password.strip()
+
+        if len(password.encode("utf-8")) > 72:
+            raise ValueError("Password too long (max 72 bytes)")
+
+        self.password_hash = passwords.pwd_context.hash(password)
+
+    def verify_password(self, password: str) -> bool:
+        return passwords.pwd_context.verify(password, self.password_hash)
+
+class Review(Base):
+    __tablename__ = "reviews"
+
+    id = Column(Integer, primary_key=True)
+    rating = Column(Integer, nullable=False)
+    comment = Column(Text)
+
+    user_id = Column(Integer, ForeignKey("users.id"))
+    book_id = Column(Integer, ForeignKey("books.id"))
+
+    user = relationship("User", back_populates="reviews")
+    book = relationship("Book", back_populates="reviews")
+
+    __table_args__ = (
+        Index("ix_reviews_book_id", "book_id"),
+        Index("ix_reviews_user_id_book_id", "user_id", "book_id"),
+    )
+
+class Book(Base):
+    __tablename__ = "books"
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(Text)
+    cover_url = Column(String)
+
+    author_id = Column(Integer, ForeignKey("users.id"))
+    author = relationship("User")
+
+    genres = relationship("Genre", secondary=book_genres, back_populates="books")
+    reviews = relationship(
+        "Review",
+        back_populates="book",
+        cascade="all, delete-orphan"
+    )
+
+    stats = relationship(
+        "BookStats",
+        uselist=False,
+        lazy="joined",
+        back_populates="book",
+        cascade="all, delete-orphan"
+    )
+
+    @property
+    def avg_rating(self):
+        if not self.stats or not self.stats.review_count:
+            return None
+        return self.stats.rating_sum / self.stats.review_count
+
+    collections = relationship(
+        "Collection",
+        secondary="collection_books",
+        back_populates="books"
+    )
+
+
+class BookStats(Base):
+    __tablename__ = "book_stats"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    star_1 = Column(Integer, nullable=False, default=0)
+    star_2 = Column(Integer, nullable=False, default=0)
+    star_3 = Column(Integer, nullable=False, default=0)
+    star_4 = Column(Integer, nullable=False, default=0)
+    star_5 = Column(Integer, nullable=False, default=0)
+
+    book = relationship("Book", back_populates="stats")
+
+    __table_args__ = (
+        # популярните книги за /recommendations
+        Index("ix_book_stats_review_count", "review_count"),
+    )
+
+
+class Genre(Base):
+    __tablename__ = "genres"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+    books = relationship("Book", secondary=book_genres, back_populates="genres")
+
+class Collection(Base):
+    __tablename__ = "collections"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    is_default = Column(Boolean, default=False)
+
+    user_id = Column(Integer, ForeignKey("users.id"))
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_collections_user_id_is_default", "user_id", "is_default"),
+    )
+
+    books = relationship(
+        "Book",
+        secondary="collection_books",
+        back_populates="collections"
+    )
+
+
+collection_books = Table(
+    "collection_books",
+    Base.metadata,
+    Column("collection_id", ForeignKey("collections.id"), primary_key=True),
+    Column("book_id", ForeignKey("books.id"), primary_key=True),
+    Index("ix_collection_books_book_id", "book_id", "collection_id"),
+)
+
+class TagName(Base):
+    """Tag vocabulary: one row per normalized name (app.tag_vocab)."""
+    __tablename__ = "tag_names"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    # брой тагове с това име от всички потребители
+    uses = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint("length(name) > 0"),
+        # глобалният tag cloud
+        Index("ix_tag_names_uses", "uses"),
+    )
+
+
+# per-user брояч за tag cloud-а на потребителя
+user_tag_counts = Table(
+    "user_tag_counts",
+    Base.metadata,
+    Column("user_id", ForeignKey("users.id"), primary_key=True),
+    Column("tag_id", ForeignKey("tag_names.id"), primary_key=True),
+    Column("uses", Integer, nullable=False, default=0),
+)
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tag_names.id"), nullable=False)
+
+    user_id = Column(Integer, ForeignKey("users.id"))
+    book_id = Column(Integer, ForeignKey("books.id"))
+
+    # само за четене (TagOut); записите минават през tag_vocab.resolve_ids
+    name = column_property(
+        select(TagName.name).where(TagName.id == tag_id).scalar_subquery()
+    )
+
+    user = relationship("User")
+    book = relationship("Book")
+
+    __table_args__ = (
+        # rowid-то е последната колона → books_by_tag върви по Tag.id без сортиране
+        Index("ix_tags_user_id_tag_id", "user_id", "tag_id"),
+        Index("ix_tags_book_id_user_id_tag_id", "book_id", "user_id", "tag_id"),
+    )
+
+class FriendStatus(enum.Enum):
+    pending = "pending"
+    accepted = "accepted"
+    rejected = "rejected"
+
+class FriendRequest(Base):
+    __tablename__ = "friend_requests"
+
+    id = Column(Integer, primary_key=True)
+
+    sender_id = Column(Integer, ForeignKey("users.id"))
+    receiver_id = Column(Integer, ForeignKey("users.id"))
+
+    status = Column(Enum(FriendStatus), default=FriendStatus.pending)
+
+    sender = relationship("User", foreign_keys=[sender_id])
+    receiver = relationship("User", foreign_keys=[receiver_id])
+
+    __table_args__ = (
+        Index("ix_friend_requests_sender_id_receiver_id",
+              "sender_id", "receiver_id"),
+        Index("ix_friend_requests_receiver_id_status",
+              "receiver_id", "status"),
+    )
+
+friendships = Table(
+    "friendships",
+    Base.metadata,
+    Column("user_id", ForeignKey("users.id"), primary_key=True),
+    Column("friend_id", ForeignKey("users.id"), primary_key=True),
+)
+
+# откъде е дошла една книга при import (напр. "goodreads:123") → book id
+book_sources = Table(
+    "book_sources",
+    Base.metadata,
+    Column("key", String, primary_key=True),
+    Column("book_id", ForeignKey("books.id"), nullable=False),
+)
+
+# версия на всеки публично кеширан ресурс, вижте app/versions.py
+entity_versions = Table(
+    "entity_versions",
+    Base.metadata,
+    Column("entity", String, primary_key=True),
+    Column("entity_id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    # unix секунди, за Last-Modified
+    Column("updated_at", Integer, nullable=False),
+)
+
+# докъде е стигнал importer-ът за даден файл
+import_checkpoints = Table(
+    "import_checkpoints",
+    Base.metadata,
+    Column("source", String, primary_key=True),
+    Column("rows_done", Integer, nullable=False),
+)
@@ -0,0 +1,79 @@
+"""Keyset (cursor) pagination shared by every list endpoint.
+
+Pages are ordered by a unique key column and continue with
+`WHERE key > :last` instead of OFFSET, so every page is an index range
+scan. Cursors are opaque to clients (urlsafe base64 of the last key).
+"""
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException, Query
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> list | None:
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(values, list) or not values:
+        raise HTTPException(400, "Invalid cursor")
+    return values
+
+
+class PageParams:
+    def __init__(
+        self,
+        cursor: str | None = None,
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT)
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+    @property
+    def after(self) -> list | None:
+        return decode_cursor(self.cursor)
+
+
+def make_page(rows: list, params: PageParams, cursor_of) -> dict:
+    """Trims the extra look-ahead row and builds the response envelope.
+
+    Callers fetch `limit + 1` rows; the extra row only tells us whether
+    another page exists.
+    """
+    has_more = len(rows) > params.limit
+    rows = rows[:params.limit]
+    next_cursor = encode_cursor(cursor_of(rows[-1])) if has_more else None
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def keyset(stmt, params: PageParams, key):
+    """`stmt` continued after the cursor, ordered by `key`, limit + 1 rows."""
+    after = params.after
+    if after is not None:
+        if not isinstance(after[0], int):
+            raise HTTPException(400, "Invalid cursor")
+        stmt = stmt.where(key > after[0])
+    return stmt.order_by(key).limit(params.limit + 1)
+
+
+async def paginate(db, stmt, params: PageParams, key) -> dict:
+    """Pages a select() by a unique, indexed column (usually the id).
+
+    `stmt` selects either an entity or just the key column itself.
+    """
+    result = await db.scalars(keyset(stmt, params, key))
+    rows = result.all()
+    # entities expose the key as an attribute; bare key columns are the key
+    return make_page(rows, params, lambda row: [getattr(row, key.key, row)])
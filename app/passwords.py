@@ -0,0 +1,101 @@
+"""Password hashing on a bounded thread pool.
+
+bcrypt is deliberately slow, so login/registration storms must not pin
+the request workers. Hashes run on a dedicated pool (bcrypt releases the
+GIL, so threads give real parallelism) with at most
+MAX_CONCURRENT_HASHES running and MAX_QUEUED_HASHES waiting; anything
+beyond that is turned away with 503 instead of queueing without bound
+(counted in password_hashes_rejected_total).
+
+`pwd_context` is built on first use: passlib and the bcrypt backend are
+not needed to import the app, only to check a password (readiness.warm_up
+loads them before the worker reports ready).
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from .metrics import registry
+
+# промяна на cost-а → старите хешове се обновяват при следващ login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+MAX_CONCURRENT_HASHES = int(
+    os.environ.get("MAX_CONCURRENT_HASHES", os.cpu_count() or 2)
+)
+MAX_QUEUED_HASHES = int(os.environ.get("MAX_QUEUED_HASHES", 64))
+
+registry.describe("password_hashes_rejected_total", "counter",
+                  "Password hashes turned away with 503 (pool and queue full).")
+registry.inc("password_hashes_rejected_total", (), 0)  # 0 още преди първия отказ
+
+_pwd_context = None
+_context_lock = threading.Lock()
+
+
+def get_context():
+    global _pwd_context
+    if _pwd_context is None:
+        with _context_lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+
+                _pwd_context = CryptContext(
+                    schemes=["bcrypt"],
+                    deprecated="auto",
+                    bcrypt__rounds=BCRYPT_ROUNDS
+                )
+    return _pwd_context
+
+
+def __getattr__(name):
+    # `passwords.pwd_context` / `from .passwords import pwd_context`
+    if name == "pwd_context":
+        return get_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_backend():
+    """Imports passlib and picks the bcrypt backend (the slow part)."""
+    get_context().handler("bcrypt").get_backend()
+
+
+class HashingPool:
+    def __init__(self, workers: int, max_queued: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            registry.inc("password_hashes_rejected_total", ())
+            raise HTTPException(
+                503,
+                "Too many logins in progress, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+
+        future = self._executor.submit(fn, *args)
+        # the slot is freed when the hash really finishes, even if the
+        # client disconnects and this coroutine is cancelled
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+
+pool = HashingPool(MAX_CONCURRENT_HASHES, MAX_QUEUED_HASHES)
+
+
+async def hash_password(password: str) -> str:
+    return await pool.run(get_context().hash, password)
+
+
+async def verify_password(password: str, password_hash: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash
+    uses outdated settings (e.g. a lower BCRYPT_ROUNDS) and should be
+    replaced."""
+    return await pool.run(
+        get_context().verify_and_update, password, password_hash
+    )
@@ -0,0 +1,269 @@
+"""On-demand profiling of live requests.
+
+At most one session runs at a time, for a number of seconds or requests,
+optionally only on one route template. Modes:
+
+- "sample": every `interval_ms` a thread records, for each matching
+  request in flight, the event loop thread's stack if that request is
+  running, or else the chain of coroutines it is suspended in (waiting
+  for aiosqlite, a lock, ...). The result is collapsed stacks
+  (flamegraph.pl / speedscope input).
+- "cprofile": cProfile is on while a matching request is in flight.
+
+cProfile sees the whole event loop thread, so under concurrency other
+requests interleaved with the matching ones show up in it too. With
+`allocations`, tracemalloc runs for the session and the result lists the
+lines whose allocations grew the most.
+
+When no session is active the only cost is `session is None` per request.
+"""
+import asyncio
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+TOP_N = 30
+TRACEMALLOC_FRAMES = 10
+# да не трупаме безкрайно различни стекове при дълга сесия
+MAX_STACKS = 20_000
+# заявките към самия профилер не се профилират
+OWN_ROUTES = "/admin/profile"
+
+# активната сесия; None когато профилирането е изключено
+session = None
+# последната приключила, за да може резултатът да се прочете след това
+last = None
+
+_lock = threading.Lock()
+
+
+def _frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _await_chain(coro) -> str:
+    """Stack of a suspended coroutine, ending in what it waits on."""
+    names = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            names.append(f"<{type(coro).__name__}>")
+            break
+        names.append(_frame_name(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(names)
+
+
+class ProfileSession:
+    def __init__(self, mode: str, route, seconds: float, requests,
+                 interval_ms: float, allocations: bool):
+        self.mode = mode
+        self.route = route
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval_ms / 1000
+        self.allocations = allocations
+
+        self.state = "running"
+        self.started_at = time.time()
+        self.finished_at = None
+        self.claimed = 0
+        self.completed = 0
+        self.active = 0
+        self.tasks = set()
+        self.samples = 0
+        self.stacks = Counter()
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.stats = None
+        self.top_allocations = None
+
+        self._loop_thread = threading.get_ident()
+        self._timer = None
+        self._sampler = None
+        self._own_tracemalloc = False
+        self._snapshot = None
+        self._finishing = None
+
+    # ---------- lifecycle ----------
+
+    def start(self, loop):
+        if self.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._own_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.mode == "sample":
+            self._sampler = threading.Thread(
+                target=self._sample, name="profiler-sampler", daemon=True
+            )
+            self._sampler.start()
+        self._timer = loop.call_later(self.seconds, self.finish)
+
+    def finish(self):
+        """Stops collecting; idempotent, runs on the event loop thread.
+
+        Joining the sampler and the tracemalloc snapshot run on a worker
+        thread; the returned task finishes when the results are ready.
+        """
+        with _lock:
+            if self.state != "running":
+                return self._finishing
+            self.state = "finishing"
+        self.finished_at = time.time()
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.profile is not None and self.active:
+            self.profile.disable()
+        self._finishing = asyncio.ensure_future(self._collect())
+        return self._finishing
+
+    async def _collect(self):
+        global session, last
+        await asyncio.to_thread(self._results)
+        with _lock:
+            self.state = "done"
+            if session is self:
+                session = None
+            last = self
+
+    def _results(self):
+        if self._sampler is not None:
+            self._sampler.join()
+        if self.profile is not None:
+            self.stats = self._top_functions()
+        if self.allocations:
+            snapshot = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+            self.top_allocations = self._top_allocations(snapshot)
+            self._snapshot = None
+
+    # ---------- request hooks (event loop thread) ----------
+
+    def wants(self, path: str) -> bool:
+        return (
+            self.state == "running"
+            and (self.route == path
+                 or self.route is None and not path.startswith(OWN_ROUTES))
+            and (self.requests is None or self.claimed < self.requests)
+        )
+
+    def enter(self):
+        self.claimed += 1
+        self.active += 1
+        if self.mode == "sample":
+            self.tasks.add(asyncio.current_task())
+        if self.active == 1 and self.profile is not None:
+            self.profile.enable()
+
+    def exit(self):
+        self.active -= 1
+        self.completed += 1
+        self.tasks.discard(asyncio.current_task())
+        if self.state != "running":
+            return
+        if self.active == 0 and self.profile is not None:
+            self.profile.disable()
+        if self.requests is not None and self.completed >= self.requests:
+            self.finish()
+
+    # ---------- collection ----------
+
+    def _sample(self):
+        while self.state == "running":
+            time.sleep(self.interval)
+            tasks = list(self.tasks)
+            if not tasks:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            for task in tasks:
+                coro = task.get_coro()
+                if coro.cr_running and frame is not None:
+                    stack = _collapse(frame)
+                else:
+                    stack = _await_chain(coro)
+                if stack in self.stacks or len(self.stacks) < MAX_STACKS:
+                    self.stacks[stack] += 1
+                self.samples += 1
+
+    def _top_functions(self):
+        stats = pstats.Stats(self.profile)
+        rows = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in (
+            stats.stats.items()
+        ):
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            })
+        rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+        return rows[:TOP_N]
+
+    def _top_allocations(self, snapshot):
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        snapshot = snapshot.filter_traces(ignore)
+        before = self._snapshot.filter_traces(ignore)
+        rows = []
+        for diff in snapshot.compare_to(before, "lineno")[:TOP_N]:
+            frame = diff.traceback[0]
+            rows.append({
+                "site": f"{frame.filename}:{frame.lineno}",
+                "size_diff_bytes": diff.size_diff,
+                "count_diff": diff.count_diff,
+                "size_bytes": diff.size,
+            })
+        return rows
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def summary(self) -> dict:
+        out = {
+            "state": self.state,
+            "mode": self.mode,
+            "route": self.route,
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "completed_requests": self.completed,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.mode == "sample":
+            out["samples"] = self.samples
+            out["distinct_stacks"] = len(self.stacks)
+        if self.stats is not None:
+            out["top_functions"] = self.stats
+        if self.top_allocations is not None:
+            out["top_allocations"] = self.top_allocations
+        return out
+
+
+def start(loop, **options) -> ProfileSession:
+    """Starts a session; None if one is already running."""
+    global session
+    with _lock:
+        if session is not None:
+            return None
+        new = session = ProfileSession(**options)
+    new.start(loop)
+    return new
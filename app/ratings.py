@@ -0,0 +1,162 @@
+"""Per-book rating aggregates (count, sum, 1-5 star histogram).
+
+The review endpoints keep `book_stats` up to date in the same transaction
+as the review itself. `rebuild` / `verify` recompute everything from
+`reviews`:
+
+    python -m app.ratings rebuild
+    python -m app.ratings verify
+"""
+import argparse
+import sys
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .models import BookStats, Review
+
+STARS = range(1, 6)
+
+
+def _delta(rating: int, sign: int) -> dict:
+    delta = {"review_count": sign, "rating_sum": sign * rating}
+    if rating in STARS:
+        delta[f"star_{rating}"] = sign
+    return delta
+
+
+def apply_rating(db: Session, book_id: int, old: int | None, new: int | None):
+    """Adds `new` and/or removes `old` from the book's aggregates."""
+    delta = {}
+    for rating, sign in ((old, -1), (new, 1)):
+        if rating is None:
+            continue
+        for key, value in _delta(rating, sign).items():
+            delta[key] = delta.get(key, 0) + value
+
+    delta = {k: v for k, v in delta.items() if v}
+    if not delta:
+        return
+
+    table = BookStats.__table__
+    stmt = insert(table).values(
+        book_id=book_id,
+        **{k: max(v, 0) for k, v in delta.items()}
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.book_id],
+        set_={k: table.c[k] + v for k, v in delta.items()}
+    )
+    db.execute(stmt)
+
+
+def add_ratings(db: Session, ratings):
+    """Batch form of apply_rating for new reviews only.
+
+    `ratings` yields (book_id, rating) pairs; every touched book gets a
+    single upsert, all sent in one executemany.
+    """
+    totals = {}
+    for book_id, rating in ratings:
+        delta = totals.setdefault(book_id, dict.fromkeys(
+            ["review_count", "rating_sum"] + [f"star_{s}" for s in STARS], 0
+        ))
+        for key, value in _delta(rating, 1).items():
+            delta[key] += value
+    if not totals:
+        return
+
+    table = BookStats.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.book_id],
+        set_={
+            key: table.c[key] + stmt.excluded[key]
+            for key in next(iter(totals.values()))
+        }
+    )
+    db.execute(stmt, [
+        {"book_id": book_id, **delta} for book_id, delta in totals.items()
+    ])
+
+
+def _computed(db: Session) -> dict:
+    columns = [
+        Review.book_id,
+        func.count(Review.id),
+        func.coalesce(func.sum(Review.rating), 0),
+    ] + [
+        func.sum(case((Review.rating == star, 1), else_=0))
+        for star in STARS
+    ]
+    rows = db.execute(
+        select(*columns).where(Review.book_id.isnot(None))
+        .group_by(Review.book_id)
+    ).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def _stored(db: Session) -> dict:
+    table = BookStats.__table__
+    columns = [table.c.review_count, table.c.rating_sum] + [
+        table.c[f"star_{star}"] for star in STARS
+    ]
+    rows = db.execute(select(table.c.book_id, *columns)).all()
+    return {row[0]: tuple(row[1:]) for row in rows if row[1]}
+
+
+def rebuild(db: Session) -> int:
+    computed = _computed(db)
+    db.execute(delete(BookStats))
+    if computed:
+        db.execute(insert(BookStats.__table__), [
+            {
+                "book_id": book_id,
+                "review_count": values[0],
+                "rating_sum": values[1],
+                **{f"star_{star}": values[1 + star] for star in STARS},
+            }
+            for book_id, values in computed.items()
+        ])
+    db.commit()
+    return len(computed)
+
+
+def verify(db: Session) -> list[int]:
+    """Returns the ids of books whose stored aggregates are wrong."""
+    computed = _computed(db)
+    stored = _stored(db)
+    return sorted(
+        book_id for book_id in computed.keys() | stored.keys()
+        if computed.get(book_id) != stored.get(book_id)
+    )
+
+
+def main(argv=None):
+    from .database import SessionLocal
+    from .db_init import init_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.ratings")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt rating aggregates for {rebuild(db)} books")
+            return 0
+
+        mismatched = verify(db)
+        if mismatched:
+            print(f"{len(mismatched)} books out of sync: {mismatched[:20]}")
+            return 1
+        print("Rating aggregates OK")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
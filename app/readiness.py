@@ -0,0 +1,89 @@
+"""Started vs warm, for the /health probes.
+
+The schema is brought up to date by `python -m app.migrations upgrade`
+before the app starts; importing app.main runs no DDL. The lifespan only
+checks the schema version and refuses to start on an outdated database.
+
+A worker is *started* once that check passed: it accepts requests. It
+is *warm* once `warm_up` has opened the database connections and loaded
+what the first login and the first token check would otherwise import
+(passlib's bcrypt backend, jose). Load balancers should route on
+/health/ready; /health/live only says the process is up.
+"""
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from . import auth, migrations, passwords
+from .database import async_engine, async_read_engine
+
+# между неуспешни опити за затопляне (напр. базата е заключена)
+RETRY_SECONDS = 1.0
+
+started_at = None
+warm_at = None
+checks = {}  # step -> ms it took, or the error of the last attempt
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+async def check_schema() -> int:
+    async with async_read_engine.connect() as conn:
+        version = await conn.run_sync(migrations.current_version)
+    expected = len(migrations.MIGRATIONS)
+    if version < expected:
+        raise SchemaOutdated(
+            f"Database schema is at version {version}, this code needs "
+            f"{expected}: run `python -m app.migrations upgrade` first"
+        )
+    return version
+
+
+def mark_started():
+    global started_at, warm_at
+    started_at = time.time()
+    warm_at = None
+    checks.clear()
+
+
+async def _databases():
+    for engine in (async_engine, async_read_engine):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+STEPS = [
+    ("database", _databases),
+    ("passwords", lambda: asyncio.to_thread(passwords.load_backend)),
+    ("jwt", lambda: asyncio.to_thread(auth.load_jwt)),
+]
+
+
+async def warm_up():
+    """Runs STEPS in order, retrying a failed step until it succeeds."""
+    global warm_at
+    for name, step in STEPS:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                await step()
+            except Exception as exc:
+                checks[name] = f"failed: {exc}"
+                await asyncio.sleep(RETRY_SECONDS)
+                continue
+            checks[name] = round((time.perf_counter() - t0) * 1000, 1)
+            break
+    warm_at = time.time()
+
+
+def status() -> dict:
+    return {
+        "started": started_at is not None,
+        "warm": warm_at is not None,
+        "started_at": started_at,
+        "warm_at": warm_at,
+        "checks": dict(checks),
+    }
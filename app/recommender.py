@@ -0,0 +1,301 @@
+"""Item-item collaborative filtering index for /recommendations.
+
+The index is built offline from `reviews`: a sparse user x book matrix of
+mean-centred ratings, cosine similarity between book columns, and the
+top-K most similar books kept per book. Requests then only look at the
+neighbours of the books the user rated.
+
+Builds run in a separate `python -m app.recommender build` process
+started from a background thread. A build holds the GIL for long
+NumPy/SciPy calls, which in the server process would stall every
+request; the worker only reads the finished arrays from the child's
+stdout and swaps in the new index with a single reference assignment,
+so requests never wait on a build. RECOMMENDER_BUILD_PROCESS=0 builds on
+the thread instead. NumPy/SciPy are optional: without them there is no
+index and the router falls back to popularity-based candidates. They
+are imported by the first build (on the refresh thread), not when the
+app is imported.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from .cache import TTLCache
+from .friend_graph import friends_of
+
+NEIGHBOURS = 50
+REBUILD_INTERVAL_SECONDS = 600
+CHUNK_SIZE = 2048
+LOAD_CHUNK_SIZE = 65_536
+BUILD_IN_PROCESS = os.environ.get("RECOMMENDER_BUILD_PROCESS", "1") == "1"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# damps predictions that rest on a single weak neighbour
+SHRINKAGE = 1.0
+RESULT_CACHE_SIZE = 10_000
+RESULT_CACHE_TTL_SECONDS = 300
+
+
+class ItemIndex:
+    def __init__(self, book_ids, indptr, neighbours, similarities):
+        self.book_ids = book_ids
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.similarities = similarities
+        self.positions = {int(b): i for i, b in enumerate(book_ids)}
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def neighbours_of(self, book_id: int):
+        pos = self.positions.get(book_id)
+        if pos is None:
+            return []
+        start, end = self.indptr[pos], self.indptr[pos + 1]
+        return zip(
+            self.book_ids[self.neighbours[start:end]].tolist(),
+            self.similarities[start:end].tolist()
+        )
+
+    def score(self, rated: dict[int, int], limit: int) -> dict[int, float]:
+        """Predicts how much the user will like neighbouring books.
+
+        `rated` maps book id → rating. Each neighbour gets the
+        similarity-weighted mean of (rating - 3) over the rated books it
+        is similar to (shrunk towards 0 when support is thin), i.e. a
+        value in [-2, 2].
+        """
+        num = {}
+        den = {}
+        for book_id, rating in rated.items():
+            for other, sim in self.neighbours_of(book_id):
+                if other in rated:
+                    continue
+                num[other] = num.get(other, 0.0) + sim * (rating - 3)
+                den[other] = den.get(other, 0.0) + sim
+
+        scores = {b: num[b] / (den[b] + SHRINKAGE) for b in num}
+        best = sorted(scores, key=scores.get, reverse=True)[:limit]
+        return {b: scores[b] for b in best}
+
+
+def load_ratings(conn):
+    """(user ids, book ids, ratings) of all reviews as int64 arrays.
+
+    Reads the DBAPI cursor in chunks straight into NumPy, without a Row
+    object per review.
+    """
+    import numpy as np
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT user_id, book_id, rating FROM reviews "
+            "WHERE user_id IS NOT NULL AND book_id IS NOT NULL"
+        )
+        chunks = [np.empty((0, 3), dtype=np.int64)]
+        while rows := cursor.fetchmany(LOAD_CHUNK_SIZE):
+            chunks.append(np.array(rows, dtype=np.int64))
+    finally:
+        cursor.close()
+    columns = np.concatenate(chunks)
+    return columns[:, 0], columns[:, 1], columns[:, 2]
+
+
+def build_arrays(users, books, ratings, k: int = NEIGHBOURS):
+    """ItemIndex arrays from parallel review columns, or None if empty."""
+    import numpy as np
+    from scipy import sparse
+
+    if not len(ratings):
+        return None
+
+    book_ids, book_idx = np.unique(books, return_inverse=True)
+    _, user_idx = np.unique(users, return_inverse=True)
+    ratings = np.asarray(ratings, dtype=np.float32)
+
+    # adjusted cosine: centre every rating on the user's own mean
+    counts = np.bincount(user_idx)
+    means = np.bincount(user_idx, weights=ratings) / counts
+    centred = ratings - means[user_idx].astype(np.float32)
+
+    matrix = sparse.csr_matrix(
+        (centred, (user_idx, book_idx)),
+        shape=(counts.size, book_ids.size),
+        dtype=np.float32
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1
+    matrix = (matrix @ sparse.diags(1 / norms)).tocsc()
+    by_book = matrix.T.tocsr()
+
+    sizes = []
+    neighbours = []
+    similarities = []
+    for start in range(0, book_ids.size, CHUNK_SIZE):
+        block = (by_book[start:start + CHUNK_SIZE] @ matrix).tocoo()
+        rows, cols, sims = block.row, block.col, block.data
+        keep = (sims > 0) & (cols != rows + start)
+        rows, cols, sims = rows[keep], cols[keep], sims[keep]
+
+        # по ред, най-сходните първи; от всеки ред остават първите k
+        order = np.lexsort((-sims, rows))
+        rows, cols, sims = rows[order], cols[order], sims[order]
+        rank = np.arange(rows.size) - np.searchsorted(rows, rows)
+        top = rank < k
+
+        sizes.append(np.bincount(rows[top], minlength=block.shape[0]))
+        neighbours.append(cols[top])
+        similarities.append(sims[top])
+
+    indptr = np.zeros(book_ids.size + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(sizes), out=indptr[1:])
+    return (
+        book_ids,
+        indptr,
+        np.concatenate(neighbours).astype(np.int32),
+        np.concatenate(similarities).astype(np.float32)
+    )
+
+
+def build_from_database(k: int = NEIGHBOURS):
+    """Loads `reviews` and builds the index arrays (None without NumPy)."""
+    from .database import engine
+
+    try:
+        with engine.connect() as conn:
+            columns = load_ratings(conn)
+        return build_arrays(*columns, k)
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+
+
+class Recommender:
+    """Holds the current index and rebuilds it in the background."""
+
+    def __init__(self, k: int = NEIGHBOURS):
+        self.k = k
+        self.index: ItemIndex | None = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = None
+
+    def _build_in_process(self):
+        import io
+        import subprocess
+
+        import numpy as np
+
+        # нов интерпретатор, а не multiprocessing: не внася наново __main__
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [ROOT, env.get("PYTHONPATH")])
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.recommender", "build",
+             "--neighbours", str(self.k)],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env
+        )
+        self._process = process
+        try:
+            out, err = process.communicate()
+        finally:
+            self._process = None
+        if process.returncode != 0:
+            if self._stop.is_set():
+                return None  # спрян от stop()
+            raise RuntimeError(
+                "Recommender build failed: "
+                + err.decode(errors="replace").strip()[-2000:]
+            )
+        if not out:
+            return None  # няма ревюта или NumPy/SciPy
+        stream = io.BytesIO(out)
+        return tuple(np.load(stream) for _ in range(4))
+
+    def rebuild(self):
+        if not self._build_lock.acquire(blocking=False):
+            return False  # a build is already running
+        try:
+            if BUILD_IN_PROCESS:
+                arrays = self._build_in_process()
+            else:
+                arrays = build_from_database(self.k)
+            if arrays is not None:
+                self.index = ItemIndex(*arrays)  # atomic swap
+            return True
+        finally:
+            self._build_lock.release()
+
+    def rebuild_in_background(self):
+        threading.Thread(
+            target=self.rebuild, name="recommender-rebuild", daemon=True
+        ).start()
+
+    def start(self, interval: float = REBUILD_INTERVAL_SECONDS):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.rebuild()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(
+            target=loop, name="recommender-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        process = self._process
+        if process is not None:
+            process.terminate()  # недовършен build не трябва на никого
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+recommender = Recommender()
+
+# user id -> ranked recommendations (already serialized as BookOut)
+results = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+
+
+def invalidate_results(db, *user_ids: int, with_friends: bool = False):
+    """Drops cached recommendations for users whose inputs changed.
+
+    A user's list depends on their own reviews and Reading/Read shelves
+    and on the 4-5 star reviews of their friends, so review changes pass
+    `with_friends=True`. Global signals (average ratings, the item index)
+    are only refreshed by the TTL.
+    """
+    affected = set(user_ids)
+    if with_friends:
+        for user_id in user_ids:
+            affected.update(db.scalars(friends_of(user_id)))
+    results.invalidate(*affected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.recommender")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--neighbours", type=int, default=NEIGHBOURS)
+    args = parser.parse_args(argv)
+
+    arrays = build_from_database(args.neighbours)
+    if arrays is not None:
+        import numpy as np
+
+        # book_ids, indptr, neighbours, similarities в този ред
+        for values in arrays:
+            np.save(sys.stdout.buffer, values, allow_pickle=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
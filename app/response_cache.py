@@ -0,0 +1,368 @@
+"""Shared cache of rendered responses for the anonymous read routes.
+
+An entry is the final status, headers and JSON body of a 200 response,
+keyed by path + sorted query string and tagged with the entities it
+shows (`book:17`, `genre:3`, `genres`). Write handlers call
+`invalidate(*tags)` after committing. Entries also expire after
+RESPONSE_CACHE_TTL_SECONDS, which bounds staleness from writers outside
+this process (the importer, another worker with the in-memory backend).
+
+Backends (RESPONSE_CACHE):
+- "memory" (default): per-process LRU bounded by RESPONSE_CACHE_BYTES
+- "redis://...": shared between workers, needs the `redis` package
+- "fake-redis": in-process stand-in with the same commands, for tests
+- "off": no caching
+
+Concurrent misses on one key in a process are collapsed: the first
+request renders the response, the others wait for it (single flight).
+A hit that matches the client's If-None-Match / If-Modified-Since is
+answered with 304.
+"""
+import asyncio
+import fnmatch
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from . import versions
+from .metrics import registry
+
+BACKEND = os.environ.get("RESPONSE_CACHE", "memory")
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 300))
+KEY_PREFIX = "resp:"
+# заглавки, които се пазят заедно с тялото
+KEPT_HEADERS = ("content-type", "etag", "last-modified", "cache-control")
+
+registry.describe("response_cache_lookups_total", "counter",
+                  "Response cache lookups by result.")
+registry.describe("response_cache_invalidations_total", "counter",
+                  "Tags invalidated in the response cache.")
+
+
+def _encode(status: int, headers: dict, body: bytes) -> bytes:
+    # JSON заглавката няма нов ред, така че първият \n е разделителят
+    head = json.dumps({"status": status, "headers": headers}).encode()
+    return head + b"\n" + body
+
+
+def _decode(value: bytes):
+    head, body = value.split(b"\n", 1)
+    meta = json.loads(head)
+    return meta["status"], meta["headers"], body
+
+
+# ---------- backends ----------
+
+class MemoryBackend:
+    """LRU over encoded entries, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value: bytes, tags, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + ttl, value, tuple(tags))
+            self.size += len(value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+
+    def _drop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[1])
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+class RedisBackend:
+    """Entries as plain keys with a TTL, tags as sets of those keys.
+
+    Uses only GET, SET EX, SADD, EXPIRE, SMEMBERS, DEL and SCAN, so
+    FakeRedis can stand in for a server.
+    """
+
+    def __init__(self, client, prefix: str = KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value: bytes, tags, ttl: float):
+        seconds = max(int(ttl), 1)
+        self.client.set(self.prefix + key, value, ex=seconds)
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            self.client.sadd(tag_key, self.prefix + key)
+            # сетът живее поне колкото най-новия запис в него
+            self.client.expire(tag_key, seconds)
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+
+    def clear(self):
+        # само нашите ключове: сървърът може да е споделен
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class FakeRedis:
+    """The handful of Redis commands RedisBackend uses, in memory."""
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at | None, value)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            expires = time.monotonic() + ex if ex else None
+            self._data[key] = (expires, value)
+            return True
+
+    def sadd(self, key, *members):
+        with self._lock:
+            entry = self._live(key)
+            members_set = entry[1] if entry else set()
+            added = len(set(members) - members_set)
+            members_set.update(members)
+            self._data[key] = (entry[0] if entry else None, members_set)
+            return added
+
+    def smembers(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return set(entry[1]) if entry else set()
+
+    def expire(self, key, seconds):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._data[key] = (time.monotonic() + seconds, entry[1])
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            keys = [key for key in self._data if fnmatch.fnmatchcase(key, match)]
+        return iter(keys)
+
+
+def make_backend(spec: str):
+    if spec == "off":
+        return None
+    if spec == "memory":
+        return MemoryBackend(MAX_BYTES)
+    if spec == "fake-redis":
+        return RedisBackend(FakeRedis())
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # optional dependency, only for this backend
+
+        return RedisBackend(redis.Redis.from_url(spec))
+    raise ValueError(f"Unknown RESPONSE_CACHE backend {spec!r}")
+
+
+# ---------- cache ----------
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float = TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight = {}  # key -> Future of the encoded entry
+        # вдига се при всяка инвалидация: отговор, рендиран преди нея,
+        # не се записва
+        self._generation = 0
+
+    def invalidate(self, *tags):
+        self._generation += 1
+        self.backend.invalidate(tags)
+        registry.inc("response_cache_invalidations_total", (), len(tags))
+
+    def clear(self):
+        self._generation += 1
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+    async def fetch(self, key, render):
+        """Returns (encoded entry, None) from the cache or a fresh render.
+
+        `render()` returns (entry, tags, response); an entry of None means
+        the response must not be cached and (None, response) comes back.
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            registry.inc("response_cache_lookups_total", (("result", "hit"),))
+            return value, None
+
+        waiting = self._inflight.get(key)
+        if waiting is not None:
+            registry.inc("response_cache_lookups_total", (("result", "wait"),))
+            value = await asyncio.shield(waiting)
+            if value is not None:
+                return value, None
+            # водещата заявка не е кеширала: тази рендира сама
+
+        registry.inc("response_cache_lookups_total", (("result", "miss"),))
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        value = None
+        try:
+            value, tags, response = await render()
+            if value is not None and generation == self._generation:
+                self.backend.set(key, value, tags, self.ttl)
+            return value, response
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            future.set_result(value)
+
+
+cache = None if BACKEND == "off" else ResponseCache(make_backend(BACKEND))
+
+
+def invalidate(*tags):
+    if cache is not None:
+        cache.invalidate(*tags)
+
+
+def _key(request) -> str:
+    query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+    return f"{request.url.path}?{query}"
+
+
+def _response(status, headers, body, request) -> Response:
+    if versions.is_fresh(request, headers.get("etag"), headers.get("last-modified")):
+        kept = {k: v for k, v in headers.items() if k != "content-type"}
+        return Response(status_code=304, headers=kept)
+    return Response(body, status_code=status, headers=headers)
+
+
+def cached(response_model, tags):
+    """Caches a GET endpoint's 200 responses.
+
+    The endpoint must take `request: Request` and `response: Response`.
+    `tags(params, payload)` gets the endpoint's arguments and the
+    decoded JSON body and returns the tags to file the entry under.
+    """
+    adapter = TypeAdapter(response_model)
+
+    def decorate(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**params):
+            if cache is None:
+                return await endpoint(**params)
+            request = params["request"]
+
+            async def render():
+                result = await endpoint(**params)
+                if isinstance(result, Response):
+                    if result.status_code != 200:
+                        return None, (), result
+                    body = bytes(result.body)
+                    headers = dict(result.headers)
+                else:
+                    body = adapter.dump_json(
+                        adapter.validate_python(result, from_attributes=True)
+                    )
+                    headers = {"content-type": "application/json"}
+                headers.update(params["response"].headers)
+                headers = {
+                    k.lower(): v for k, v in headers.items()
+                    if k.lower() in KEPT_HEADERS
+                }
+                value = _encode(200, headers, body)
+                return value, tags(params, json.loads(body)), None
+
+            value, response = await cache.fetch(_key(request), render)
+            if value is None:
+                # 304 от versions.not_modified и т.н. не се кешират
+                return response or await endpoint(**params)
+            status, headers, body = _decode(value)
+            return _response(status, headers, body, request)
+
+        return wrapper
+
+    return decorate
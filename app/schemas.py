@@ -1,102 +1,171 @@
-from pydantic import BaseModel, field_validator
-from typing import List, Optional
-
-
-class UserCreate(BaseModel):
-    username: str
-    password: str
-    role: str = "user"
-
-    @field_validator("password")
-    @classmethod
-    def password_length(cls, v):
-        if len(v.encode("utf-8")) > 72:
-            raise ValueError("Password must be at most 72 bytes")
-        return v
-
-class UserOut(BaseModel):
-    id: int
-    username: str
-    role: str
-
-    class Config:
-        orm_mode = True
-
-class LoginRequest(BaseModel):
-    username: str
-    password: str
-
-class TokenOut(BaseModel):
-    access_token: str
-    token_type: str = "bearer"
-
-
-class GenreOut(BaseModel):
-    id: int
-    name: str
-
-    class Config:
-        orm_mode = True
-
-
-class BookCreate(BaseModel):
-    title: str
-    description: Optional[str] = None
-    genre_ids: List[int] = []
-
-
-class BookOut(BaseModel):
-    id: int
-    title: str
-    description: str | None
-    author_id: int
-    avg_rating: float | None
-    genres: List[GenreOut]
-
-    class Config:
-        from_attributes = True
-
-class ReviewCreate(BaseModel):
-    rating: int
-    comment: str | None = None
-
-class ReviewOut(BaseModel):
-    id: int
-    rating: int
-    comment: str | None
-    user_id: int
-
-    class Config:
-        from_attributes = True
-
-class CollectionCreate(BaseModel):
-    name: str
-
-class CollectionOut(BaseModel):
-    id: int
-    name: str
-    is_default: bool
-    books: list[BookOut] = []
-
-    class Config:
-        from_attributes = True
-
-class TagCreate(BaseModel):
-    name: str
-
-class TagOut(BaseModel):
-    id: int
-    name: str
-    book_id: int
-
-    class Config:
-        from_attributes = True
-
-class FriendRequestOut(BaseModel):
-    id: int
-    sender_id: int
-    receiver_id: int
-    status: str
-
-    class Config:
-        from_attributes = True
\ No newline at end of file
+from pydantic import BaseModel, Field, field_validator
+from typing import Generic, List, Literal, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+class UserCreate(BaseModel):
+    username: str
+    password: str
+    role: str = "user"
+
+    @field_validator("password")
+    @classmethod
+    def password_length(cls, v):
+        if len(v.encode("utf-8")) > 72:
+            raise ValueError("Password must be at most 72 bytes")
+        return v
+
+class UserOut(BaseModel):
+    id: int
+    username: str
+    role: str
+
+    class Config:
+        orm_mode = True
+
+class FriendOut(UserOut):
+    mutual_friends: int = 0
+
+class LoginRequest(BaseModel):
+    username: str
+    password: str
+
+class TokenOut(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+
+
+class GenreOut(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        orm_mode = True
+
+
+class BookCreate(BaseModel):
+    title: str
+    description: Optional[str] = None
+    genre_ids: List[int] = []
+
+
+class BookOut(BaseModel):
+    id: int
+    title: str
+    description: str | None
+    author_id: int
+    avg_rating: float | None
+    genres: List[GenreOut]
+
+    class Config:
+        from_attributes = True
+
+class BookSuggestion(BaseModel):
+    id: int
+    title: str
+    review_count: int
+
+class ReviewCreate(BaseModel):
+    rating: int
+    comment: str | None = None
+
+    @field_validator("rating")
+    @classmethod
+    def rating_range(cls, v):
+        if not 1 <= v <= 5:
+            raise ValueError("Rating must be between 1 and 5")
+        return v
+
+class ReviewOut(BaseModel):
+    id: int
+    rating: int
+    comment: str | None
+    user_id: int
+
+    class Config:
+        from_attributes = True
+
+class CollectionCreate(BaseModel):
+    name: str
+
+class CollectionOut(BaseModel):
+    id: int
+    name: str
+    is_default: bool
+    books: list[BookOut] = []
+
+    class Config:
+        from_attributes = True
+
+class TagCreate(BaseModel):
+    name: str
+
+class TagOut(BaseModel):
+    id: int
+    name: str
+    book_id: int
+
+    class Config:
+        from_attributes = True
+
+class TagCount(BaseModel):
+    name: str
+    count: int
+
+class FriendRequestOut(BaseModel):
+    id: int
+    sender_id: int
+    receiver_id: int
+    status: str
+
+    class Config:
+        from_attributes = True
+
+
+# batch endpoints: до толкова елемента в една заявка / транзакция
+MAX_BATCH_ITEMS = 1000
+
+
+class BookIdsBatch(BaseModel):
+    book_ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class TagBatchItem(TagCreate):
+    book_id: int
+
+class TagBatch(BaseModel):
+    items: List[TagBatchItem] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class ReviewBatchItem(ReviewCreate):
+    book_id: int
+
+class ReviewBatch(BaseModel):
+    items: List[ReviewBatchItem] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class BatchItemResult(BaseModel):
+    book_id: int
+    status: str
+    id: Optional[int] = None
+
+class BatchResult(BaseModel):
+    results: List[BatchItemResult]
+
+
+# on-demand профилиране (само за admin)
+MAX_PROFILE_SECONDS = 300
+
+
+class ProfileStart(BaseModel):
+    mode: Literal["sample", "cprofile"] = "sample"
+    # шаблон на маршрута, напр. "/books/"; None = всички
+    route: Optional[str] = None
+    seconds: float = Field(10, gt=0, le=MAX_PROFILE_SECONDS)
+    # спира след толкова заявки по маршрута (или след seconds)
+    requests: Optional[int] = Field(None, ge=1)
+    interval_ms: float = Field(5, ge=1, le=100)
+    allocations: bool = False
@@ -0,0 +1,131 @@
+"""Full-text book search over title and description (SQLite FTS5).
+
+`books_fts` is an external-content FTS5 table over `books`; triggers keep
+it in sync on insert/update/delete so the API never has to touch it.
+"""
+import re
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from .models import Book
+from .loading import BOOK_OUT
+
+# title matches weigh more than description matches
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, description,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au
+    AFTER UPDATE OF title, description ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO books_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def init_index(engine):
+    """Creates the FTS table and triggers; fills the index on first run."""
+    new_index = not inspect(engine).has_table("books_fts")
+    with engine.begin() as conn:
+        for stmt in _SCHEMA:
+            conn.exec_driver_sql(stmt)
+        if new_index:
+            conn.exec_driver_sql(
+                "INSERT INTO books_fts(books_fts) VALUES ('rebuild')"
+            )
+
+
+def match_expression(query: str) -> str | None:
+    """Turns free user input into an FTS5 prefix query.
+
+    Every word must match (implicit AND) and is treated as a prefix, so
+    "lord ri" finds "The Lord of the Rings". Quoting each token keeps FTS
+    operators in the input from being interpreted.
+    """
+    tokens = _TOKEN.findall(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def search_book_ids(
+    db: Session,
+    query: str,
+    limit: int,
+    after: tuple[float, int] | None = None
+):
+    """Returns up to `limit` (score, book_id) pairs, best match first.
+
+    Pages continue after the (score, id) of the previous page's last row
+    rather than using OFFSET.
+    """
+    expr = match_expression(query)
+    if expr is None:
+        return []
+
+    sql = (
+        "SELECT score, id FROM ("
+        "  SELECT bm25(books_fts, :tw, :dw) AS score, rowid AS id"
+        "  FROM books_fts WHERE books_fts MATCH :q"
+        ")"
+    )
+    params = {
+        "q": expr,
+        "tw": TITLE_WEIGHT,
+        "dw": DESCRIPTION_WEIGHT,
+        "limit": limit,
+    }
+    if after is not None:
+        sql += " WHERE (score, id) > (:after_score, :after_id)"
+        params["after_score"], params["after_id"] = after
+    sql += " ORDER BY score, id LIMIT :limit"
+
+    return [tuple(row) for row in db.execute(text(sql), params)]
+
+
+def search_books(
+    db: Session,
+    query: str,
+    limit: int,
+    after: tuple[float, int] | None = None
+):
+    """Returns (score, book) pairs ordered by BM25 rank."""
+    hits = search_book_ids(db, query, limit, after)
+    if not hits:
+        return []
+
+    ids = [book_id for _, book_id in hits]
+    books = {
+        b.id: b for b in db.query(Book).options(*BOOK_OUT)
+        .filter(Book.id.in_(ids)).all()
+    }
+    return [
+        (score, books[book_id]) for score, book_id in hits
+        if book_id in books
+    ]
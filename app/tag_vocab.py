@@ -0,0 +1,304 @@
+"""Tag vocabulary, usage counters and the autocomplete index.
+
+Tag names live once in `tag_names` (normalized: lower case, single
+spaces); `tags` rows point at them. Two counters are kept in the same
+transaction as the tag itself, like book_stats for ratings:
+`tag_names.uses` (all users) and `user_tag_counts` (per user). They feed
+the tag clouds. `rebuild` / `verify` recompute them from `tags`:
+
+    python -m app.tag_vocab rebuild
+    python -m app.tag_vocab verify
+
+Autocomplete is answered from `index`, a sorted in-memory list of names
+searched with bisect and ranked by global uses. It is rebuilt from the
+database in the background and patched in place after every write in
+this process; other workers' writes show up after the next rebuild.
+"""
+import argparse
+import heapq
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .models import Tag, TagName, user_tag_counts
+
+REBUILD_INTERVAL_SECONDS = 300
+# префикс с повече имена от това се отговаря от кеш на най-използваните
+SCAN_LIMIT = 2_000
+POPULAR_SIZE = 50
+POPULAR_TTL_SECONDS = 30
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+
+# ---------- vocabulary and counters ----------
+
+def resolve_ids(db: Session, names) -> dict:
+    """name → tag_names.id for normalized `names`, adding missing ones."""
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(db.execute(
+        select(TagName.name, TagName.id).where(TagName.name.in_(names))
+    ).all())
+    missing = names - ids.keys()
+    if missing:
+        # друг worker може да е добавил името междувременно
+        db.execute(
+            insert(TagName.__table__).on_conflict_do_nothing(),
+            [{"name": name, "uses": 0} for name in missing]
+        )
+        ids.update(db.execute(
+            select(TagName.name, TagName.id).where(TagName.name.in_(missing))
+        ).all())
+    return ids
+
+
+def add_uses(db: Session, user_id: int, deltas: dict):
+    """Adds tag id → delta to the global and the user's counters."""
+    deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    params = [
+        {"u": user_id, "t": tag_id, "delta": delta, "initial": max(delta, 0)}
+        for tag_id, delta in deltas.items()
+    ]
+    names = TagName.__table__
+    db.execute(
+        update(names).where(names.c.id == bindparam("t"))
+        .values(uses=names.c.uses + bindparam("delta")),
+        params
+    )
+    stmt = insert(user_tag_counts).values(
+        user_id=bindparam("u"), tag_id=bindparam("t"), uses=bindparam("initial")
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[user_tag_counts.c.user_id, user_tag_counts.c.tag_id],
+            set_={"uses": user_tag_counts.c.uses + bindparam("delta")}
+        ),
+        params
+    )
+
+
+def _computed(db) -> tuple[dict, dict]:
+    per_user = {
+        (user_id, tag_id): uses for user_id, tag_id, uses in db.execute(
+            select(Tag.user_id, Tag.tag_id, func.count(Tag.id))
+            .group_by(Tag.user_id, Tag.tag_id)
+        )
+    }
+    totals = {}
+    for (_, tag_id), uses in per_user.items():
+        totals[tag_id] = totals.get(tag_id, 0) + uses
+    return totals, per_user
+
+
+def recount(db):
+    """Rewrites both counters from `tags`; `db` is a Session or Connection."""
+    totals, per_user = _computed(db)
+    names = TagName.__table__
+    db.execute(update(names).values(uses=0))
+    if totals:
+        db.execute(
+            update(names).where(names.c.id == bindparam("t"))
+            .values(uses=bindparam("uses")),
+            [{"t": tag_id, "uses": uses} for tag_id, uses in totals.items()]
+        )
+    db.execute(delete(user_tag_counts))
+    if per_user:
+        db.execute(insert(user_tag_counts), [
+            {"user_id": user_id, "tag_id": tag_id, "uses": uses}
+            for (user_id, tag_id), uses in per_user.items()
+        ])
+    return len(totals)
+
+
+def rebuild(db: Session) -> int:
+    count = recount(db)
+    db.commit()
+    return count
+
+
+def verify(db: Session) -> list[int]:
+    """Returns the ids of tag names whose stored counters are wrong."""
+    totals, per_user = _computed(db)
+    stored = dict(db.execute(
+        select(TagName.id, TagName.uses).where(TagName.uses != 0)
+    ).all())
+    stored_per_user = {
+        (user_id, tag_id): uses for user_id, tag_id, uses in db.execute(
+            select(user_tag_counts).where(user_tag_counts.c.uses != 0)
+        )
+    }
+    wrong = {
+        tag_id for tag_id in totals.keys() | stored.keys()
+        if totals.get(tag_id) != stored.get(tag_id)
+    }
+    wrong.update(
+        key[1] for key in per_user.keys() | stored_per_user.keys()
+        if per_user.get(key) != stored_per_user.get(key)
+    )
+    return sorted(wrong)
+
+
+# ---------- autocomplete ----------
+
+def _apply(names: list, uses: dict, deltas: dict):
+    for name, delta in deltas.items():
+        if name not in uses:
+            # първо в uses: complete() чете без lock и прави uses[name]
+            uses[name] = 0
+            insort(names, name)
+        uses[name] += delta
+
+
+class TagIndex:
+    """Sorted tag names with their global uses, for prefix lookups."""
+
+    def __init__(self):
+        # (сортирани имена, name -> uses): сменят се заедно с едно присвояване
+        self._entries = ([], {})
+        self.built_at = None
+        self._popular = {}  # prefix -> (computed at, names)
+        self._pending = None  # update()-ите по време на rebuild
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def names(self):
+        return self._entries[0]
+
+    @property
+    def uses(self):
+        return self._entries[1]
+
+    def load(self, rows):
+        """Replaces the contents with (name, uses) rows.
+
+        Updates applied while a rebuild was reading the rows are applied
+        again on top of them, so none is lost; one that the rows already
+        include is counted twice until the next rebuild.
+        """
+        uses = dict(rows)
+        names = sorted(uses)
+        with self._lock:
+            for deltas in self._pending or ():
+                _apply(names, uses, deltas)
+            self._pending = None
+            self._entries = (names, uses)
+            self._popular = {}
+            self.built_at = time.time()
+
+    def rebuild(self):
+        from .database import SessionLocal
+
+        with self._lock:
+            self._pending = []
+        with SessionLocal() as db:
+            rows = db.execute(select(TagName.name, TagName.uses)).all()
+        self.load(rows)
+
+    def update(self, deltas: dict):
+        """Applies name → change in uses after a committed write."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(deltas)
+            _apply(*self._entries, deltas)
+            # кешираните префикси на променените имена се смятат наново
+            stale = [
+                prefix for prefix in self._popular
+                if any(name.startswith(prefix) for name in deltas)
+            ]
+            for prefix in stale:
+                del self._popular[prefix]
+
+    def complete(self, prefix: str, limit: int) -> list[tuple[str, int]]:
+        """Up to `limit` used names starting with `prefix`, most used first."""
+        prefix = normalize(prefix)
+        names, uses = self._entries
+        lo = bisect_left(names, prefix)
+        hi = bisect_left(names, prefix + "\U0010ffff", lo)
+        if hi - lo > SCAN_LIMIT:
+            best = self._most_used(prefix, names, uses, lo, hi)
+        else:
+            # nlargest е стабилна: при равни uses остава азбучният ред
+            best = heapq.nlargest(
+                limit, (n for n in names[lo:hi] if uses[n] > 0), key=uses.get
+            )
+        return [(name, uses[name]) for name in best[:limit]]
+
+    def _most_used(self, prefix, names, uses, lo, hi):
+        # широките префикси ("a", "s") се смятат веднъж на POPULAR_TTL_SECONDS
+        cached = self._popular.get(prefix)
+        if cached is not None and time.monotonic() - cached[0] < POPULAR_TTL_SECONDS:
+            return cached[1]
+        best = heapq.nlargest(
+            POPULAR_SIZE, (n for n in names[lo:hi] if uses[n] > 0), key=uses.get
+        )
+        self._popular[prefix] = (time.monotonic(), best)
+        return best
+
+    def start(self, interval: float = REBUILD_INTERVAL_SECONDS):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.rebuild()
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(
+            target=loop, name="tag-index-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+index = TagIndex()
+
+
+def main(argv=None):
+    from .database import SessionLocal
+    from .db_init import init_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.tag_vocab")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt usage counters for {rebuild(db)} tag names")
+            return 0
+
+        mismatched = verify(db)
+        if mismatched:
+            print(f"{len(mismatched)} tag names out of sync: {mismatched[:20]}")
+            return 1
+        print("Tag counters OK")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
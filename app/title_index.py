@@ -0,0 +1,372 @@
+"""In-memory title prefix index for /books/autocomplete.
+
+Titles are kept sorted by their normalized form (lower case, single
+spaces) in one UTF-8 blob with an offsets array, next to arrays of book
+ids and review counts, so 2M titles cost two Python objects per array
+instead of one per title. A prefix is two bisects over that order; the
+most reviewed titles in the range come from a max segment tree over the
+review counts (ties in title order), so a one-letter prefix costs about
+as much as a full title.
+
+The arrays are built from `books` + `book_stats` on a background thread
+and written to a snapshot file (`<database>.titles`, or
+TITLE_INDEX_SNAPSHOT; empty disables it). A starting worker loads the
+snapshot and only reads the books added after it instead of the whole
+table; the full rebuild (which refreshes review counts) follows at
+REBUILD_INTERVAL_SECONDS after the snapshot was taken. Books created in
+this process are added right away (with 0 reviews) to a small sorted
+list that is searched next to the arrays; other workers' books show up
+after their next rebuild.
+
+    python -m app.title_index rebuild    # writes the snapshot
+"""
+import argparse
+import heapq
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from itertools import accumulate
+
+from sqlalchemy import select
+
+from .models import Book, BookStats
+
+REBUILD_INTERVAL_SECONDS = 3600
+MAX_LIMIT = 20
+
+_MAGIC = b"GRTITLE1"
+_HEADER = struct.Struct("<qqqd")  # n, tree size, max book id, built at
+
+
+def display(title: str) -> str:
+    return " ".join((title or "").split())
+
+
+def normalize(title: str) -> str:
+    return display(title).casefold()
+
+
+def normalize_prefix(prefix: str) -> str:
+    # "the " не трябва да намира "theatre"
+    key = normalize(prefix)
+    if key and prefix[-1:].isspace():
+        key += " "
+    return key
+
+
+def snapshot_path() -> str | None:
+    path = os.environ.get("TITLE_INDEX_SNAPSHOT")
+    if path is not None:
+        return path or None
+    from sqlalchemy.engine import make_url
+    from .database import DATABASE_URL
+
+    database = make_url(DATABASE_URL).database
+    if not database or database == ":memory:":
+        return None
+    return database + ".titles"
+
+
+class TitleArray:
+    """Immutable sorted titles with ids, review counts and the max tree."""
+
+    def __init__(self, blob, offsets, ids, counts, tree, max_id, built_at):
+        self.blob = blob
+        self.offsets = offsets
+        self.ids = ids
+        self.counts = counts
+        self.tree = tree  # tree[size + i] = i, вътрешните възли: индекс на max
+        self.size = len(tree) // 2
+        self.max_id = max_id
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, rows) -> "TitleArray":
+        """From (book_id, title, review_count) rows."""
+        entries = sorted(
+            ((display(title), book_id, count or 0)
+             for book_id, title, count in rows),
+            key=lambda entry: (entry[0].casefold(), entry[1])
+        )
+        encoded = [title.encode() for title, _, _ in entries]
+        n = len(entries)
+        counts = array("i", (count for _, _, count in entries))
+        size = 1 << max(n - 1, 0).bit_length()
+        tree = array("i", [-1]) * (2 * size)
+        tree[size:size + n] = array("i", range(n))
+        for node in range(size - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            # лявото поддърво е по-рано по азбука: то печели при равенство
+            if right >= 0 and counts[right] > counts[left]:
+                left = right
+            tree[node] = left
+        ids = array("q", (book_id for _, book_id, _ in entries))
+        return cls(
+            b"".join(encoded),
+            array("q", accumulate(map(len, encoded), initial=0)),
+            ids, counts, tree, max(ids, default=0), time.time()
+        )
+
+    def title(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def _key(self, i: int) -> str:
+        return self.title(i).casefold()
+
+    def range(self, key: str) -> tuple[int, int]:
+        positions = range(len(self))
+        lo = bisect_left(positions, key, key=self._key)
+        hi = bisect_left(positions, key + "\U0010ffff", lo, key=self._key)
+        return lo, hi
+
+    def contains(self, key: str, book_id: int) -> bool:
+        """Whether the book is in the arrays under the normalized title `key`."""
+        positions = range(len(self))
+        i = bisect_left(positions, key, key=self._key)
+        # равните заглавия са подредени по id
+        while i < len(self) and self._key(i) == key:
+            if self.ids[i] == book_id:
+                return True
+            i += 1
+        return False
+
+    def _best(self, lo: int, hi: int) -> int:
+        """Position of the most reviewed title in [lo, hi)."""
+        tree, counts = self.tree, self.counts
+        best = -1
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                i = tree[lo]
+                if best < 0 or counts[i] > counts[best] or (
+                    counts[i] == counts[best] and i < best
+                ):
+                    best = i
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                i = tree[hi]
+                if best < 0 or counts[i] > counts[best] or (
+                    counts[i] == counts[best] and i < best
+                ):
+                    best = i
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def top(self, lo: int, hi: int, limit: int) -> list[int]:
+        """Up to `limit` positions in [lo, hi), most reviewed first."""
+        found = []
+        heap = []
+        if lo < hi:
+            best = self._best(lo, hi)
+            heap.append((-self.counts[best], best, lo, hi))
+        while heap and len(found) < limit:
+            _, best, lo, hi = heapq.heappop(heap)
+            found.append(best)
+            for part_lo, part_hi in ((lo, best), (best + 1, hi)):
+                if part_lo < part_hi:
+                    i = self._best(part_lo, part_hi)
+                    heapq.heappush(heap, (-self.counts[i], i, part_lo, part_hi))
+        return found
+
+    def save(self, path: str):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(len(self), self.size, self.max_id, self.built_at))
+            for values in (self.offsets, self.ids, self.counts, self.tree):
+                values.tofile(f)
+            f.write(self.blob)
+        # другите worker-и виждат или старата, или новата снимка
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TitleArray":
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a title index snapshot")
+            n, size, max_id, built_at = _HEADER.unpack(f.read(_HEADER.size))
+            arrays = []
+            for typecode, count in (("q", n + 1), ("q", n), ("i", n), ("i", 2 * size)):
+                values = array(typecode)
+                values.fromfile(f, count)
+                arrays.append(values)
+            blob = f.read()
+        offsets, ids, counts, tree = arrays
+        if len(blob) != offsets[-1]:
+            raise ValueError(f"{path} is truncated")
+        return cls(blob, offsets, ids, counts, tree, max_id, built_at)
+
+
+class TitleIndex:
+    """The current TitleArray plus the books added since it was built."""
+
+    def __init__(self):
+        # (TitleArray | None, сортирани (key, book_id, title)): complete()
+        # чете без lock, затова двете се сменят с едно присвояване
+        self._state = (None, [])
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def array(self) -> TitleArray | None:
+        return self._state[0]
+
+    @property
+    def added(self) -> list:
+        return self._state[1]
+
+    @property
+    def ready(self) -> bool:
+        return self.array is not None
+
+    def add(self, book_id: int, title: str):
+        """Adds a just created book, before the next rebuild picks it up."""
+        entry = (normalize(title), book_id, display(title))
+        with self._lock:
+            # rebuild може вече да я е прочел от базата
+            if not self._has(self.array, self.added, entry):
+                insort(self.added, entry)
+
+    @staticmethod
+    def _has(titles, added, entry) -> bool:
+        i = bisect_left(added, entry[:2])
+        if i < len(added) and added[i][:2] == entry[:2]:
+            return True
+        return (
+            titles is not None and entry[1] <= titles.max_id
+            and titles.contains(entry[0], entry[1])
+        )
+
+    def _swap(self, new: TitleArray, added=()):
+        with self._lock:
+            # остават книгите, които новите масиви не съдържат; книга,
+            # записана след SELECT-а на rebuild, може да е с id <= max_id
+            entries = self.added + [
+                (normalize(title), book_id, display(title))
+                for book_id, title in added
+            ]
+            kept = []
+            for entry in sorted(entries):
+                if not self._has(new, kept, entry):
+                    kept.append(entry)
+            self._state = (new, kept)
+
+    def complete(self, prefix: str, limit: int) -> list[tuple[int, str, int]] | None:
+        """(book_id, title, review count) for titles starting with `prefix`."""
+        titles, added = self._state
+        if titles is None:
+            return None
+        key = normalize_prefix(prefix)
+        lo, hi = titles.range(key)
+        hits = []
+        for i in titles.top(lo, hi, limit):
+            title = titles.title(i)
+            hits.append((-titles.counts[i], title.casefold(), titles.ids[i], title))
+        # новите книги са без ревюта: от тях стигат първите `limit` по азбука
+        start = bisect_left(added, (key,))
+        for entry_key, book_id, title in added[start:start + limit]:
+            if not entry_key.startswith(key):
+                break
+            hits.append((0, entry_key, book_id, title))
+        hits.sort()
+        return [(book_id, title, -count) for count, _, book_id, title in hits[:limit]]
+
+    def rebuild(self, save: bool = True) -> bool:
+        from .database import SessionLocal
+
+        if not self._build_lock.acquire(blocking=False):
+            return False  # a build is already running
+        try:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(Book.id, Book.title, BookStats.review_count)
+                    .outerjoin(BookStats, BookStats.book_id == Book.id)
+                ).all()
+            new = TitleArray.build(rows)
+            self._swap(new)
+            path = snapshot_path()
+            if save and path:
+                try:
+                    new.save(path)
+                except OSError:
+                    pass  # снимката само ускорява старта
+            return True
+        finally:
+            self._build_lock.release()
+
+    def load_snapshot(self) -> bool:
+        """Loads the snapshot and the books added after it was taken."""
+        from .database import SessionLocal
+
+        path = snapshot_path()
+        if not path:
+            return False
+        try:
+            new = TitleArray.load(path)
+        except (OSError, ValueError, EOFError):
+            return False
+        with SessionLocal() as db:
+            added = db.execute(
+                select(Book.id, Book.title).where(Book.id > new.max_id)
+            ).all()
+        self._swap(new, added)
+        return True
+
+    def start(self, interval: float = REBUILD_INTERVAL_SECONDS):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            wait = 0
+            if self.load_snapshot():
+                wait = max(self.array.built_at + interval - time.time(), 0)
+            while not self._stop.wait(wait):
+                self.rebuild()
+                wait = interval
+
+        self._thread = threading.Thread(
+            target=loop, name="title-index-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+index = TitleIndex()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.title_index")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    path = snapshot_path()
+    if not path:
+        print("No snapshot path (in-memory database or TITLE_INDEX_SNAPSHOT='')")
+        return 1
+    t0 = time.perf_counter()
+    index.rebuild()
+    print(f"Wrote {len(index.array)} titles to {path} "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
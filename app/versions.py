@@ -0,0 +1,134 @@
+"""Version counters behind ETag / Last-Modified on the public reads.
+
+Every write that changes what a read returns bumps the entity's row in
+`entity_versions` in the same transaction. A read looks that row up
+first (one primary-key lookup) and, when the client's `If-None-Match`
+or `If-Modified-Since` still matches, answers 304 without loading the
+entity at all.
+
+- BOOK: the book itself, its rating aggregates and its reviews
+  (`GET /books/{id}`, `GET /reviews/books/{id}`)
+- GENRE: one genre (`GET /genres/{id}`)
+- GENRES, id 0: the genre list (`GET /genres/`)
+
+Every existing book and genre has a row (`stamp_existing` backfills
+them), so a missing row means the entity does not exist: the read then
+gets no validators and no 304, and answers its own 404.
+"""
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import literal, select, true
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import Book, Genre, entity_versions
+
+BOOK = "book"
+GENRE = "genre"
+GENRES = "genres"
+
+# shared caches (CDN) може да пазят отговора, но трябва да питат с ETag
+CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+
+def bump(db, entity: str, ids):
+    """+1 to the version of every id; `db` is a Session or Connection."""
+    now = int(time.time())
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    stmt = insert(entity_versions)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[entity_versions.c.entity, entity_versions.c.entity_id],
+            set_={
+                "version": entity_versions.c.version + 1,
+                "updated_at": stmt.excluded.updated_at,
+            }
+        ),
+        [
+            {"entity": entity, "entity_id": entity_id, "version": 1,
+             "updated_at": now}
+            for entity_id in ids
+        ]
+    )
+
+
+def stamp_existing(conn):
+    """Version 1 for every book and genre (and the list) without a row."""
+    now = int(time.time())
+    for entity, table in ((BOOK, Book.__table__), (GENRE, Genre.__table__)):
+        conn.execute(
+            insert(entity_versions).from_select(
+                ["entity", "entity_id", "version", "updated_at"],
+                # WHERE е нужно на SQLite, за да не чете ON като JOIN ... ON
+                select(literal(entity), table.c.id, literal(1), literal(now))
+                .where(true())
+            ).on_conflict_do_nothing()
+        )
+    conn.execute(
+        insert(entity_versions).values(
+            entity=GENRES, entity_id=0, version=1, updated_at=now
+        ).on_conflict_do_nothing()
+    )
+
+
+def _etag(entity: str, entity_id: int, version: int, request: Request) -> str:
+    tag = f"{entity}-{entity_id}-{version}"
+    # страниците на един списък (cursor, limit) са различни представяния
+    if request.url.query:
+        tag += "-" + hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    return f'"{tag}"'
+
+
+def _http_time(value: str) -> float | None:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def is_fresh(request: Request, etag: str | None,
+             last_modified: str | None) -> bool:
+    """True when the client's conditional headers match these validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match има предимство; weak сравнение според RFC 9110
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return etag is not None and ("*" in tags or etag in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    since = _http_time(if_modified_since)
+    modified = _http_time(last_modified)
+    return since is not None and modified is not None and modified <= since
+
+
+async def not_modified(db, request: Request, response: Response,
+                       entity: str, entity_id: int = 0):
+    """Sets the validators on `response`; returns a 304 Response when the
+    client's copy is current, else None. Without a version row (no such
+    entity) nothing is set and the endpoint goes on to its 404."""
+    row = (await db.execute(
+        select(entity_versions.c.version, entity_versions.c.updated_at).where(
+            entity_versions.c.entity == entity,
+            entity_versions.c.entity_id == entity_id
+        )
+    )).first()
+    if row is None:
+        return None
+    version, updated_at = row
+
+    headers = {
+        "ETag": _etag(entity, entity_id, version, request),
+        "Cache-Control": CACHE_CONTROL,
+        "Last-Modified": formatdate(updated_at, usegmt=True),
+    }
+
+    if is_fresh(request, headers["ETag"], headers["Last-Modified"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,160 @@
+"""Group commit for small, frequent writes (opt-in: GROUP_COMMIT=1).
+
+Without it every review, tag, shelved book and accepted friend request
+is its own write transaction: one WAL append (and one fsync with
+DB_SYNCHRONOUS=FULL) per user action, with the requests taking turns on
+SQLite's single writer lock.
+
+With it those endpoints hand their mutation to one writer thread per
+process. The writer takes what is queued (waiting GROUP_COMMIT_WINDOW_MS
+for more, at most GROUP_COMMIT_MAX_BATCH items), runs every item in its
+own SAVEPOINT inside one BEGIN IMMEDIATE transaction and commits once. A
+request is answered when the commit of its batch is done. An item that
+raises (404, 400, IntegrityError, ...) is rolled back to its savepoint
+and only its request gets the error; if the commit fails, every request
+in the batch does.
+
+Mutations are plain `op(db)` functions on a sync Session that check and
+write but never commit, like ratings.apply_rating or versions.bump. The
+writer runs them on the sync engine, so a batch costs no event loop
+round trips per statement. `run(db, op)` queues them, or with the queue
+off runs them on the request's session (`run_sync`) and commits.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+from .metrics import LATENCY_BUCKETS, registry
+
+ENABLED = os.environ.get("GROUP_COMMIT", "0") == "1"
+WINDOW_MS = float(os.environ.get("GROUP_COMMIT_WINDOW_MS", 2))
+MAX_BATCH = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", 256))
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+registry.describe("group_commit_batch_size", "histogram",
+                  "Mutations per group commit.")
+registry.describe("group_commit_seconds", "histogram",
+                  "Time to run and commit one batch.")
+registry.describe("group_commit_items_total", "counter",
+                  "Queued mutations by result.")
+
+
+def _resolve(future, result=None, exc=None):
+    if future.done():
+        return  # заявката е прекъсната междувременно
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
+
+
+class Writer:
+    def __init__(self, window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="group-commit", daemon=True
+            )
+            self._thread.start()
+
+    async def stop(self):
+        """Commits what is already queued, then stops the writer."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        await asyncio.to_thread(thread.join)
+
+    async def submit(self, op):
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((op, future, loop))
+        return await future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        from .database import SessionLocal
+
+        t0 = time.perf_counter()
+        outcomes = []  # (future, loop, result, exc)
+        try:
+            # expire_on_commit=False: резултатите се четат от event loop-а
+            with SessionLocal(expire_on_commit=False) as db:
+                # заключването за писане се взима веднага, не при първия INSERT
+                db.execute(text("BEGIN IMMEDIATE"))
+                for op, future, loop in batch:
+                    if future.done():
+                        continue  # заявката е прекъсната, преди да дойде ред
+                    try:
+                        with db.begin_nested():
+                            result = op(db)
+                    except Exception as exc:
+                        outcomes.append((future, loop, None, exc))
+                    else:
+                        outcomes.append((future, loop, result, None))
+                db.commit()
+        except Exception as exc:
+            # нищо от партидата не е записано
+            outcomes = [(future, loop, None, exc) for _, future, loop in batch]
+
+        failed = 0
+        for future, loop, result, exc in outcomes:
+            failed += exc is not None
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, exc)
+            except RuntimeError:
+                pass  # event loop-ът вече е затворен
+        registry.inc("group_commit_items_total", (("result", "ok"),),
+                     len(outcomes) - failed)
+        registry.inc("group_commit_items_total", (("result", "error"),), failed)
+        registry.observe("group_commit_batch_size", (), len(batch), BATCH_BUCKETS)
+        registry.observe("group_commit_seconds", (), time.perf_counter() - t0,
+                         LATENCY_BUCKETS)
+
+
+writer = Writer()
+
+
+async def run(db, op):
+    """Runs `op(session)` in a committed transaction and returns its result."""
+    if ENABLED:
+        return await writer.submit(op)
+    result = await db.run_sync(op)
+    await db.commit()
+    return result
@@ -0,0 +1,135 @@
+"""Async sessions vs the old threadpool model at high concurrency.
+
+Mounts two copies of the same read on a bench app:
+
+    /sync/books/{id}   `def` route, SessionLocal, runs on the threadpool
+    /async/books/{id}  `async def` route, AsyncSessionLocal (aiosqlite)
+
+and drives each with the same number of concurrent in-process clients
+(ASGI transport, no sockets), reporting throughput and latency.
+
+    python -m bench.async_vs_threadpool --seconds 10 --clients 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def build_app():
+    from fastapi import FastAPI, HTTPException
+
+    from app.database import AsyncSessionLocal, SessionLocal
+    from app.loading import BOOK_OUT
+    from app.models import Book
+    from app.schemas import BookOut
+
+    bench_app = FastAPI()
+
+    @bench_app.get("/sync/books/{book_id}", response_model=BookOut)
+    def sync_book(book_id: int):
+        with SessionLocal() as db:
+            book = db.get(Book, book_id, options=BOOK_OUT)
+            if not book:
+                raise HTTPException(404, "Book not found")
+            return BookOut.model_validate(book, from_attributes=True)
+
+    @bench_app.get("/async/books/{book_id}", response_model=BookOut)
+    async def async_book(book_id: int):
+        async with AsyncSessionLocal() as db:
+            book = await db.get(Book, book_id, options=BOOK_OUT)
+            if not book:
+                raise HTTPException(404, "Book not found")
+            return BookOut.model_validate(book, from_attributes=True)
+
+    return bench_app
+
+
+async def worker(client, prefix, books, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        url = f"{prefix}/books/{random.randint(1, books)}"
+        t0 = time.perf_counter()
+        response = await client.get(url)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def drive(bench_app, prefix, args):
+    import httpx
+
+    latencies, statuses = [], {}
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(*[
+            worker(client, prefix, args.books, deadline, latencies, statuses)
+            for _ in range(args.clients)
+        ])
+    return latencies, statuses
+
+
+async def run(args):
+    from app.database import async_engine
+
+    bench_app = build_app()
+    print(f"{args.clients} clients, {args.books} books, {args.seconds}s each")
+    for prefix in ("/sync", "/async"):
+        latencies, statuses = await drive(bench_app, prefix, args)
+        ok = statuses.get(200, 0)
+        print(
+            f"{prefix[1:]:<6} {ok / args.seconds:>8.1f} req/s  "
+            f"statuses {dict(sorted(statuses.items()))}  "
+            f"p50 {percentile(latencies, 50):.1f}ms  "
+            f"p95 {percentile(latencies, 95):.1f}ms  "
+            f"p99 {percentile(latencies, 99):.1f}ms  "
+            f"mean {statistics.fmean(latencies) if latencies else 0:.1f}ms"
+        )
+    await async_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.async_vs_threadpool")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--books", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    os.chdir(tempfile.mkdtemp())
+
+    from app import models
+    from app.database import SessionLocal
+    from app.db_init import init_db
+
+    init_db()
+    with SessionLocal() as db:
+        author = models.User(username="bench", password_hash="-")
+        genre = models.Genre(name="bench")
+        db.add_all([author, genre])
+        db.flush()
+        db.add_all([
+            models.Book(
+                title=f"Bench book {i}", description="seeded",
+                author_id=author.id, genres=[genre]
+            )
+            for i in range(args.books)
+        ])
+        db.commit()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Batch mutation endpoints vs one request per book.
+
+Shelves, tags and reviews N books for one user through the single-item
+endpoints and for another user through the /batch endpoints, reporting
+wall time and SQL statements for each.
+
+    python -m bench.batch_vs_single --books 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def seed(books: int):
+    from app import models
+    from app.database import SessionLocal
+    from app.db_init import init_db
+
+    init_db()
+    with SessionLocal() as db:
+        users = [
+            models.User(username=name, password_hash="-")
+            for name in ("single", "batch")
+        ]
+        db.add_all(users)
+        db.flush()
+        db.add_all([
+            models.Book(title=f"Bench book {i}", author_id=users[0].id)
+            for i in range(books)
+        ])
+        shelves = [
+            models.Collection(name="shelf", user_id=user.id) for user in users
+        ]
+        db.add_all(shelves)
+        db.commit()
+        return [u.id for u in users], [s.id for s in shelves]
+
+
+async def timed(engines, coro):
+    from sqlalchemy import event
+
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        t0 = time.perf_counter()
+        await coro
+        return time.perf_counter() - t0, len(statements)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+
+
+async def run(args, user_ids, shelf_ids):
+    import httpx
+
+    from app.auth import create_access_token
+    from app.database import async_engine, async_read_engine
+    from app.main import app
+
+    engines = [async_engine.sync_engine, async_read_engine.sync_engine]
+    headers = [
+        {"Authorization": f"Bearer {create_access_token({'sub': str(u)})}"}
+        for u in user_ids
+    ]
+    book_ids = list(range(1, args.books + 1))
+
+    def check(response):
+        if response.status_code != 200:
+            raise SystemExit(f"{response.request.url} -> {response.status_code}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        async def single(kind):
+            for book_id in book_ids:
+                if kind == "shelve":
+                    url = f"/collections/{shelf_ids[0]}/books/{book_id}"
+                    check(await client.post(url, headers=headers[0]))
+                elif kind == "tag":
+                    check(await client.post(
+                        f"/tags/books/{book_id}", json={"name": "bench"},
+                        headers=headers[0]
+                    ))
+                else:
+                    check(await client.post(
+                        f"/reviews/books/{book_id}", json={"rating": 4},
+                        headers=headers[0]
+                    ))
+
+        async def batch(kind):
+            if kind == "shelve":
+                url = f"/collections/{shelf_ids[1]}/books/batch"
+                body = {"book_ids": book_ids}
+            elif kind == "tag":
+                url = "/tags/batch"
+                body = {"items": [
+                    {"book_id": b, "name": "bench"} for b in book_ids
+                ]}
+            else:
+                url = "/reviews/batch"
+                body = {"items": [
+                    {"book_id": b, "rating": 4} for b in book_ids
+                ]}
+            check(await client.post(url, json=body, headers=headers[1]))
+
+        print(f"{args.books} books")
+        print(f"{'':<8}{'single s':>10}{'stmts':>8}{'batch s':>10}{'stmts':>8}"
+              f"{'speedup':>9}")
+        for kind in ("shelve", "tag", "review"):
+            single_s, single_n = await timed(engines, single(kind))
+            batch_s, batch_n = await timed(engines, batch(kind))
+            print(f"{kind:<8}{single_s:>10.2f}{single_n:>8}"
+                  f"{batch_s:>10.3f}{batch_n:>8}{single_s / batch_s:>8.0f}x")
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
+def main(argv=None):
+    from app.schemas import MAX_BATCH_ITEMS
+
+    parser = argparse.ArgumentParser(prog="python -m bench.batch_vs_single")
+    parser.add_argument("--books", type=int, default=500)
+    args = parser.parse_args(argv)
+    if not 0 < args.books <= MAX_BATCH_ITEMS:
+        parser.error(f"--books must be between 1 and {MAX_BATCH_ITEMS}")
+
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    os.chdir(tempfile.mkdtemp())
+    user_ids, shelf_ids = seed(args.books)
+    asyncio.run(run(args, user_ids, shelf_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Deterministic synthetic dataset at production scale.
+
+    python -m bench.dataset --out /tmp/big.db
+    python -m bench.dataset --out /tmp/huge.db --users 100000 \\
+        --books 2000000 --reviews 50000000 --workers 8
+
+Builds a fresh SQLite database in the app's schema:
+
+- Book popularity and user activity follow power laws. Genres and tag
+  names are Zipf-skewed, and ratings cluster around a per-book quality.
+- Every user gets the three default shelves `create_user` creates.
+  Reviewed books go on "Read", and a few unreviewed popular ones go on
+  "To Read" and "Reading".
+- The friend graph has a heavy-tailed degree distribution (hubs),
+  stored in `friendships` plus accepted requests, with some pending
+  requests.
+- Every user has the password "password".
+
+Work is split into fixed chunks of users/books. Each chunk gets its own
+RNG seeded from (--seed, kind, chunk), so the output does not depend on
+--workers. Worker processes write their chunks to shard files in
+parallel. The main process merges the shards in chunk order with
+ATTACH + INSERT ... SELECT, then builds the indexes, book_stats and the
+FTS index once at the end.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+CHUNK_USERS = 2000
+CHUNK_BOOKS = 20000
+# every AUTHOR_EVERY-th user (1, 51, 101, ...) is an author
+AUTHOR_EVERY = 50
+DEFAULT_SHELVES = ["To Read", "Reading", "Read"]
+
+GENRES = [
+    "Fiction", "Fantasy", "Romance", "Mystery", "Thriller", "Science Fiction",
+    "Historical Fiction", "Young Adult", "Nonfiction", "Classics", "Horror",
+    "Biography", "History", "Poetry", "Contemporary", "Graphic Novels",
+    "Self Help", "Philosophy", "Humor", "Crime", "Memoir", "Science",
+    "Adventure", "Children's", "Psychology", "Travel", "Art", "Religion",
+    "Business", "Cookbooks",
+]
+TAGS = [
+    "favorites", "owned", "to-buy", "kindle", "audiobook", "re-read",
+    "book-club", "dnf", "library", "summer", "series", "standalone",
+    "slow-burn", "tearjerker", "comfort-read", "borrowed", "signed",
+    "wishlist", "classic-lit", "short", "long", "gift", "school", "spicy",
+]
+WORDS = (
+    "shadow night river silent crown glass winter garden iron house "
+    "light storm city secret daughter empire fire lost last road sea "
+    "star stone blood wolf queen king song dream letter island forest "
+    "girl boy ghost heart mirror north moon summer bone ash thorn gold "
+    "salt smoke paper clock bridge tower dark little wild broken hidden"
+).split()
+
+SHARD_TABLES = {
+    "users": "id, username, password_hash, role",
+    "books": "id, title, description, author_id",
+    "book_genres": "book_id, genre_id",
+    "collections": "id, name, is_default, user_id",
+    "collection_books": "collection_id, book_id",
+    "reviews": "rating, comment, user_id, book_id",
+    "tags": "tag_id, user_id, book_id",
+    "friendships": "user_id, friend_id",
+    "pending": "sender_id, receiver_id",
+}
+
+_cache = {}
+
+
+def zipf_cdf(n: int, alpha: float):
+    weights = 1.0 / np.arange(1, n + 1) ** alpha
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample(rng, cdf, size, ids=None):
+    """Draws ranks from a CDF; `ids` maps rank -> id (default rank + 1)."""
+    ranks = np.minimum(np.searchsorted(cdf, rng.random(size)), len(cdf) - 1)
+    return ids[ranks] if ids is not None else ranks + 1
+
+
+def lognormal_counts(rng, mean: float, sigma: float, size: int, cap: int):
+    if mean <= 0:
+        return np.zeros(size, dtype=np.int64)
+    mu = math.log(mean) - sigma ** 2 / 2
+    return np.minimum(np.rint(rng.lognormal(mu, sigma, size)), cap).astype(np.int64)
+
+
+def model(spec):
+    """Per-process shared distributions, derived only from the spec."""
+    key = (spec["seed"], spec["users"], spec["books"], spec["genres"])
+    if _cache.get("key") != key:
+        rng = np.random.default_rng([spec["seed"], 0])
+        _cache.clear()
+        _cache.update(
+            key=key,
+            # popularity rank -> book id
+            book_ids=rng.permutation(spec["books"]) + 1,
+            book_cdf=zipf_cdf(spec["books"], spec["book_skew"]),
+            quality=rng.normal(3.8, 0.6, spec["books"] + 1),
+            user_ids=rng.permutation(spec["users"]) + 1,
+            user_cdf=zipf_cdf(spec["users"], 0.7),
+            genre_cdf=zipf_cdf(spec["genres"], 1.0),
+            tag_cdf=zipf_cdf(len(TAGS), 1.0),
+        )
+    return _cache
+
+
+def books_chunk(spec, chunk: int, rng):
+    m = model(spec)
+    lo = chunk * CHUNK_BOOKS + 1
+    hi = min(lo + CHUNK_BOOKS, spec["books"] + 1)
+    n = hi - lo
+    ids = np.arange(lo, hi)
+
+    words = rng.integers(0, len(WORDS), (n, 10))
+    authors = rng.integers(0, math.ceil(spec["users"] / AUTHOR_EVERY), n)
+    books = [
+        (int(book_id),
+         f"The {WORDS[w[0]].title()} {WORDS[w[1]].title()} {book_id}",
+         " ".join(WORDS[i] for i in w[2:]),
+         int(a) * AUTHOR_EVERY + 1)
+        for book_id, w, a in zip(ids, words, authors)
+    ]
+
+    per_book = 1 + rng.binomial(2, 0.4, n)
+    genre_books = np.repeat(ids, per_book)
+    genre_ids = sample(rng, m["genre_cdf"], genre_books.size)
+    pairs = np.unique(np.stack([genre_books, genre_ids], axis=1), axis=0)
+    return {"books": books, "book_genres": pairs.tolist()}
+
+
+def _unique_pairs(users, books, n_books):
+    keys = np.unique(users.astype(np.int64) * (n_books + 1) + books)
+    return keys // (n_books + 1), keys % (n_books + 1), keys
+
+
+def users_chunk(spec, chunk: int, rng):
+    m = model(spec)
+    n_books = spec["books"]
+    lo = chunk * CHUNK_USERS + 1
+    hi = min(lo + CHUNK_USERS, spec["users"] + 1)
+    ids = np.arange(lo, hi)
+    n = ids.size
+
+    users = [
+        (int(u), f"user{u}", spec["password_hash"],
+         "author" if u % AUTHOR_EVERY == 1 else "user")
+        for u in ids
+    ]
+    collections = [
+        (int(3 * (u - 1) + i + 1), name, 1, int(u))
+        for u in ids for i, name in enumerate(DEFAULT_SHELVES)
+    ]
+
+    # reviews: heavy-tailed activity per user, books by popularity
+    counts = lognormal_counts(
+        rng, spec["reviews"] / spec["users"], 1.1, n, n_books // 2
+    )
+    # popular books repeat within a user: oversample, then trim to `counts`
+    drawn = np.rint(counts * 1.5).astype(np.int64) + 2
+    r_users, r_books, r_keys = _unique_pairs(
+        np.repeat(ids, drawn),
+        sample(rng, m["book_cdf"], int(drawn.sum()), m["book_ids"]),
+        n_books
+    )
+    order = np.lexsort((rng.random(r_keys.size), r_users))
+    starts = np.searchsorted(r_users[order], r_users[order], side="left")
+    rank = np.arange(order.size) - starts
+    keep = np.sort(order[rank < counts[r_users[order] - lo]])
+    r_users, r_books, r_keys = r_users[keep], r_books[keep], r_keys[keep]
+    ratings = np.clip(
+        np.rint(m["quality"][r_books] + rng.normal(0, 0.9, r_books.size)),
+        1, 5
+    ).astype(np.int64)
+    commented = rng.random(r_books.size) < 0.15
+    reviews = [
+        (int(rating), "Loved it" if rating >= 4 else "Not for me", int(u), int(b))
+        if c else (int(rating), None, int(u), int(b))
+        for rating, c, u, b in zip(ratings, commented, r_users, r_books)
+    ]
+
+    # shelves: reviewed → Read, a few unreviewed popular books → To Read/Reading
+    shelved = [3 * (r_users - 1) + 3, r_books]
+    taken = r_keys
+    for offset, mean in ((1, spec["to_read"]), (2, 0.5)):
+        k = rng.poisson(mean, n)
+        s_users, s_books, s_keys = _unique_pairs(
+            np.repeat(ids, k),
+            sample(rng, m["book_cdf"], int(k.sum()), m["book_ids"]),
+            n_books
+        )
+        fresh = ~np.isin(s_keys, taken)
+        shelved[0] = np.concatenate([shelved[0], 3 * (s_users[fresh] - 1) + offset])
+        shelved[1] = np.concatenate([shelved[1], s_books[fresh]])
+        taken = np.concatenate([taken, s_keys[fresh]])
+    collection_books = np.stack(shelved, axis=1).tolist()
+
+    # tags on a share of the reviewed books
+    p_tag = min(1.0, spec["tags"] / max(spec["reviews"] / spec["users"], 1e-9))
+    tagged = rng.random(r_books.size) < p_tag
+    names = sample(rng, m["tag_cdf"], int(tagged.sum())) - 1
+    tags = [
+        (int(t) + 1, int(u), int(b))
+        for t, u, b in zip(names, r_users[tagged], r_books[tagged])
+    ]
+
+    # friends: half the degree is chosen here, partners biased towards hubs
+    degree = lognormal_counts(rng, spec["friends"] / 2, 1.2, n, spec["users"] - 1)
+    f_users = np.repeat(ids, degree)
+    f_partners = sample(rng, m["user_cdf"], f_users.size, m["user_ids"])
+    keep = f_users != f_partners
+    edges = np.concatenate([
+        np.stack([f_users[keep], f_partners[keep]], axis=1),
+        np.stack([f_partners[keep], f_users[keep]], axis=1),
+    ])
+    friendships = np.unique(edges, axis=0).tolist() if edges.size else []
+
+    k = rng.poisson(0.3, n)
+    pending = np.stack([
+        np.repeat(ids, k), rng.integers(1, spec["users"] + 1, int(k.sum()))
+    ], axis=1).tolist()
+
+    return {
+        "users": users, "collections": collections, "reviews": reviews,
+        "collection_books": collection_books, "tags": tags,
+        "friendships": friendships, "pending": pending,
+    }
+
+
+def run_task(task):
+    """Generates one chunk into its own shard file; returns the path."""
+    spec, kind, chunk = task
+    rng = np.random.default_rng([spec["seed"], 1 if kind == "books" else 2, chunk])
+    rows = (books_chunk if kind == "books" else users_chunk)(spec, chunk, rng)
+
+    path = os.path.join(spec["workdir"], f"{kind}-{chunk:06d}.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    with conn:
+        for table, data in rows.items():
+            columns = SHARD_TABLES[table]
+            conn.execute(f"CREATE TABLE {table} ({columns})")
+            marks = ", ".join("?" * len(columns.split(",")))
+            conn.executemany(f"INSERT INTO {table} VALUES ({marks})", data)
+    conn.close()
+    return path
+
+
+def merge(conn, path: str):
+    conn.execute("ATTACH DATABASE ? AS shard", (path,))
+    tables = [
+        row[0] for row in conn.execute(
+            "SELECT name FROM shard.sqlite_master WHERE type = 'table'"
+        )
+    ]
+    with conn:
+        for table in tables:
+            columns = SHARD_TABLES[table]
+            target = "temp.pending" if table == "pending" else table
+            verb = "INSERT OR IGNORE" if table == "friendships" else "INSERT"
+            conn.execute(
+                f"{verb} INTO {target} ({columns}) "
+                f"SELECT {columns} FROM shard.{table} ORDER BY rowid"
+            )
+    conn.execute("DETACH DATABASE shard")
+    os.remove(path)
+
+
+def build(spec, workers: int, log):
+    os.environ["DATABASE_URL"] = f"sqlite:///{spec['out']}"
+    # app.database reads DATABASE_URL at import time
+    from sqlalchemy.schema import CreateTable
+    from sqlalchemy.orm import Session
+
+    from app import migrations, models, ratings, search, tag_vocab, versions
+    from app.database import engine
+
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            conn.execute(CreateTable(table))
+    engine.dispose()
+
+    conn = sqlite3.connect(spec["out"], isolation_level=None)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
+    conn.execute("CREATE TEMP TABLE pending (sender_id, receiver_id)")
+    names = GENRES + [f"Genre {i}" for i in range(len(GENRES), spec["genres"])]
+    with conn:
+        conn.executemany(
+            "INSERT INTO genres (id, name) VALUES (?, ?)",
+            enumerate(names[:spec["genres"]], 1)
+        )
+        # tag_names.id = позицията в TAGS + 1; броячите идват от tag_vocab.rebuild
+        conn.executemany(
+            "INSERT INTO tag_names (id, name, uses) VALUES (?, ?, 0)",
+            [(i, tag_vocab.normalize(name)) for i, name in enumerate(TAGS, 1)]
+        )
+
+    tasks = [
+        (spec, "books", c) for c in range(math.ceil(spec["books"] / CHUNK_BOOKS))
+    ] + [
+        (spec, "users", c) for c in range(math.ceil(spec["users"] / CHUNK_USERS))
+    ]
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers) as pool:
+        # imap keeps chunk order, so ids come out the same for any --workers
+        for done, path in enumerate(pool.imap(run_task, tasks), 1):
+            merge(conn, path)
+            log(f"merged {done}/{len(tasks)} chunks")
+
+    with conn:
+        conn.execute(
+            "INSERT INTO friend_requests (sender_id, receiver_id, status) "
+            "SELECT user_id, friend_id, 'accepted' FROM friendships "
+            "WHERE user_id < friend_id ORDER BY user_id, friend_id"
+        )
+        conn.execute(
+            "INSERT INTO friend_requests (sender_id, receiver_id, status) "
+            "SELECT DISTINCT p.sender_id, p.receiver_id, 'pending' "
+            "FROM temp.pending p WHERE p.sender_id != p.receiver_id "
+            "AND NOT EXISTS (SELECT 1 FROM friendships f "
+            "WHERE f.user_id = p.sender_id AND f.friend_id = p.receiver_id) "
+            "ORDER BY p.sender_id, p.receiver_id"
+        )
+    conn.close()
+
+    log("building indexes, book_stats and the search index")
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn)
+        # без ред книгата няма ETag (versions.not_modified)
+        versions.stamp_existing(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {len(migrations.MIGRATIONS)}")
+    with Session(engine) as db:
+        ratings.rebuild(db)
+        tag_vocab.rebuild(db)
+    search.init_index(engine)
+    with engine.connect() as conn:
+        counts = {
+            table: conn.exec_driver_sql(f"SELECT count(*) FROM {table}").scalar()
+            for table in ["users", "books", "reviews", "collection_books",
+                          "tags", "friendships", "friend_requests"]
+        }
+    engine.dispose()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.dataset")
+    parser.add_argument("--out", required=True, help="new SQLite file")
+    parser.add_argument("--force", action="store_true",
+                        help="overwrite --out if it exists")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--reviews", type=int, default=5_000_000,
+                        help="approximate; duplicates per user are dropped")
+    parser.add_argument("--genres", type=int, default=len(GENRES))
+    parser.add_argument("--friends", type=float, default=20,
+                        help="mean friend count")
+    parser.add_argument("--tags", type=float, default=5,
+                        help="mean tags per user")
+    parser.add_argument("--to-read", type=float, default=5,
+                        help="mean To Read shelf size")
+    parser.add_argument("--book-skew", type=float, default=1.0,
+                        help="Zipf exponent of book popularity")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    out = os.path.abspath(args.out)
+    if os.path.exists(out):
+        if not args.force:
+            parser.error(f"{out} exists (use --force to overwrite)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(out + suffix):
+                os.remove(out + suffix)
+
+    from app.passwords import BCRYPT_ROUNDS, pwd_context
+
+    started = time.perf_counter()
+
+    def log(message):
+        print(f"[{time.perf_counter() - started:7.1f}s] {message}",
+              file=sys.stderr)
+
+    spec = {
+        "out": out,
+        "workdir": tempfile.mkdtemp(prefix="dataset-"),
+        "users": args.users,
+        "books": args.books,
+        "reviews": args.reviews,
+        "genres": args.genres,
+        "friends": args.friends,
+        "tags": args.tags,
+        "to_read": args.to_read,
+        "book_skew": args.book_skew,
+        "seed": args.seed,
+        # fixed salt: same hash on every run, still verifies as "password"
+        "password_hash": pwd_context.handler().using(
+            salt="syntheticdatasetseed.e", rounds=BCRYPT_ROUNDS
+        ).hash("password"),
+    }
+    counts = build(spec, args.workers, log)
+    os.rmdir(spec["workdir"])
+
+    rows = sum(counts.values())
+    log(f"{rows:,} rows: " + ", ".join(f"{k}={v:,}" for k, v in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
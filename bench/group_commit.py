@@ -0,0 +1,184 @@
+"""Writes/s of the small write endpoints with and without group commit.
+
+Runs the app in-process (ASGI transport) with `--clients` users writing
+concurrently, each cycling through POST /reviews/books/{id},
+POST /tags/books/{id}, POST /collections/{id}/books/{id} and
+POST /friends/requests/{id}/accept. The same workload runs once with
+app.write_queue off (a commit per request) and once on (one commit per
+batch), on separate seeded users so every write succeeds.
+
+With WAL and synchronous=NORMAL a commit does not fsync, so the gain
+there is fewer write transactions and lock handoffs; run with
+`--synchronous FULL` to include the per-commit fsync.
+
+    python -m bench.group_commit
+    python -m bench.group_commit --clients 64 --ops 100 --synchronous FULL
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+KINDS = ("review", "tag", "shelve", "accept")
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def seed(clients: int, ops: int):
+    """Two groups of `clients` writers; returns [group][client] dicts."""
+    from app import models
+    from app.database import SessionLocal
+    from app.db_init import init_db
+
+    init_db()
+    accepts = len(range(KINDS.index("accept"), ops, len(KINDS)))
+    with SessionLocal() as db:
+        senders = [
+            models.User(username=f"sender{i}", password_hash="-")
+            for i in range(accepts)
+        ]
+        author = models.User(username="author", password_hash="-")
+        db.add_all([author, *senders])
+        db.flush()
+        db.add_all([
+            models.Book(title=f"Bench book {i}", author_id=author.id)
+            for i in range(ops)
+        ])
+
+        groups = []
+        for group in range(2):
+            writers = []
+            for n in range(clients):
+                user = models.User(username=f"w{group}-{n}", password_hash="-")
+                db.add(user)
+                db.flush()
+                shelf = models.Collection(name="shelf", user_id=user.id)
+                requests = [
+                    models.FriendRequest(sender_id=s.id, receiver_id=user.id)
+                    for s in senders
+                ]
+                db.add_all([shelf, *requests])
+                db.flush()
+                writers.append({
+                    "user_id": user.id,
+                    "shelf_id": shelf.id,
+                    "request_ids": [r.id for r in requests],
+                })
+            groups.append(writers)
+        db.commit()
+    return groups
+
+
+async def drive(client, writers, ops, headers):
+    latencies = []
+    statuses = {}
+
+    async def one(writer):
+        auth = headers[writer["user_id"]]
+        accepted = iter(writer["request_ids"])
+        for k in range(ops):
+            kind = KINDS[k % len(KINDS)]
+            book_id = k + 1
+            if kind == "review":
+                call = client.post(f"/reviews/books/{book_id}",
+                                   json={"rating": 4}, headers=auth)
+            elif kind == "tag":
+                call = client.post(f"/tags/books/{book_id}",
+                                   json={"name": "bench"}, headers=auth)
+            elif kind == "shelve":
+                call = client.post(
+                    f"/collections/{writer['shelf_id']}/books/{book_id}",
+                    headers=auth
+                )
+            else:
+                call = client.post(
+                    f"/friends/requests/{next(accepted)}/accept", headers=auth
+                )
+            t0 = time.perf_counter()
+            response = await call
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(writer) for writer in writers))
+    return time.perf_counter() - t0, latencies, statuses
+
+
+async def run(args, groups):
+    import httpx
+
+    from app import write_queue
+    from app.auth import create_access_token
+    from app.database import async_engine, async_read_engine
+    from app.main import app
+    from app.metrics import registry
+
+    headers = {
+        writer["user_id"]: {
+            "Authorization": f"Bearer {create_access_token({'sub': str(writer['user_id'])})}"
+        }
+        for writers in groups for writer in writers
+    }
+    write_queue.writer = write_queue.Writer(args.window_ms, args.max_batch)
+
+    print(f"{args.clients} clients x {args.ops} writes, "
+          f"synchronous={args.synchronous}, window {args.window_ms}ms")
+    print(f"{'':<14}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'batch':>8}  statuses")
+    rates = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            for name, enabled, writers in (
+                ("per request", False, groups[0]),
+                ("group commit", True, groups[1]),
+            ):
+                write_queue.ENABLED = enabled
+                registry.histograms.pop(("group_commit_batch_size", ()), None)
+                elapsed, latencies, statuses = await drive(
+                    client, writers, args.ops, headers
+                )
+                ok = statuses.get(200, 0)
+                rates.append(ok / elapsed)
+                batches = registry.histograms.get(("group_commit_batch_size", ()))
+                batch = (f"{batches.sum / sum(batches.counts):.1f}"
+                         if batches else "-")
+                print(f"{name:<14}{ok / elapsed:>10.0f}"
+                      f"{percentile(latencies, 50):>9.1f}"
+                      f"{percentile(latencies, 99):>9.1f}{batch:>8}  "
+                      f"{dict(sorted(statuses.items()))}")
+    print(f"speedup {rates[1] / rates[0]:.1f}x")
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.group_commit")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=40)
+    parser.add_argument("--synchronous", default="NORMAL",
+                        choices=["OFF", "NORMAL", "FULL"])
+    parser.add_argument("--window-ms", type=float, default=2)
+    parser.add_argument("--max-batch", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    # app.database чете профила при import
+    os.environ["DB_SYNCHRONOUS"] = args.synchronous
+    os.environ.setdefault("RESPONSE_CACHE", "off")
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    os.chdir(tempfile.mkdtemp())
+    groups = seed(args.clients, args.ops)
+    asyncio.run(run(args, groups))
+
+
+if __name__ == "__main__":
+    main()
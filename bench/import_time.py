@@ -0,0 +1,105 @@
+"""Import-time budget for app.main.
+
+Imports app.main in fresh interpreters (`python -X importtime`) against a
+database path in an empty scratch dir and fails if
+
+- the median cumulative import time of app.main is over `--budget-ms`,
+- any of the DEFERRED modules got imported (they load on first use or
+  in readiness.warm_up, not at import), or
+- the import touched the database (the schema is created by
+  `python -m app.migrations upgrade`, never on import).
+
+    python -m bench.import_time
+    python -m bench.import_time --budget-ms 500 --runs 7 --top 15
+
+tests/test_import_time.py enforces the same budget under pytest; this
+script also lists the slowest modules.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BUDGET_MS = 650
+
+# тежки зависимости, които app.main не бива да внася
+DEFERRED = ["numpy", "scipy", "jose", "passlib", "bcrypt", "cryptography", "redis"]
+
+PROBE = (
+    "import sys, app.main; "
+    "print(','.join(m for m in {deferred!r} if m in sys.modules))"
+)
+
+
+def import_once(workdir: str, database: str):
+    """Returns ({module: cumulative us}, [deferred modules imported])."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}",
+               PYTHONPATH=ROOT, PYTHONWARNINGS="ignore")
+    done = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         PROBE.format(deferred=DEFERRED)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    # "import time:  self [us] | cumulative | imported package"
+    for line in done.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    loaded = [m for m in done.stdout.strip().split(",") if m]
+    return times, loaded
+
+
+def measure(runs: int):
+    """(median ms, [ms per run], last run's times, deferred modules loaded,
+    database path if the import created it)."""
+    workdir = tempfile.mkdtemp()
+    database = os.path.join(workdir, "goodreads.db")
+
+    totals = []
+    loaded = set()
+    for _ in range(runs):
+        times, deferred = import_once(workdir, database)
+        totals.append(times["app.main"] / 1000)
+        loaded.update(deferred)
+    touched = database if os.path.exists(database) else None
+    return statistics.median(totals), totals, times, sorted(loaded), touched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.import_time")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    median, totals, times, loaded, touched = measure(args.runs)
+    print(f"app.main: {median:.0f} ms median of {args.runs} "
+          f"(min {min(totals):.0f}, budget {args.budget_ms:.0f})")
+    print("\nslowest modules (cumulative, last run):")
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+    for name, us in slowest[:args.top]:
+        print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"\nover budget by {median - args.budget_ms:.0f} ms")
+        failed = True
+    if loaded:
+        print(f"\nimported at startup but should be deferred: "
+              f"{', '.join(loaded)}")
+        failed = True
+    if touched:
+        print(f"\nimporting app.main touched the database ({touched})")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
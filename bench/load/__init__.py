@@ -0,0 +1,19 @@
+"""HTTP load and latency benchmark for the API.
+
+Simulated users run a scripted journey: log in once, search, open a
+book, review it, put it on a shelf and fetch recommendations. The app
+runs in-process (httpx ASGI transport) or behind a local uvicorn.
+
+    python -m bench.load run --target inprocess --mode closed --clients 32
+    python -m bench.load run --target uvicorn --mode open --rate 50 \\
+        --database /tmp/big.db --output results/after.json
+    python -m bench.load compare results/before.json results/after.json
+
+closed: N clients, each sends its next request only after the previous
+        reply (throughput is what the server sustains).
+open:   journeys start at a fixed rate whatever the server does, so
+        queueing shows up in the latencies. Journey latencies are
+        measured from the scheduled start (no coordinated omission).
+
+Without --database a small dataset is generated with bench.dataset.
+"""
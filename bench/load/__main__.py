@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+
+from . import report
+from .runner import ROOT, run
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def small_dataset() -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix="load-"), "goodreads.db")
+    subprocess.run(
+        [sys.executable, "-m", "bench.dataset", "--out", path,
+         "--users", "2000", "--books", "10000", "--reviews", "100000"],
+        cwd=ROOT, check=True
+    )
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = commands.add_parser("run", help="run a load test")
+    run_cmd.add_argument("--target", choices=["inprocess", "uvicorn"],
+                         default="inprocess")
+    run_cmd.add_argument("--mode", choices=["closed", "open"], default="closed")
+    run_cmd.add_argument("--clients", type=int, default=32,
+                         help="closed loop: concurrent clients")
+    run_cmd.add_argument("--rate", type=float, default=20,
+                         help="open loop: journeys started per second")
+    run_cmd.add_argument("--seconds", type=float, default=30)
+    run_cmd.add_argument("--warmup", type=float, default=5)
+    run_cmd.add_argument("--users", type=int, default=200,
+                         help="distinct simulated users (each logs in once)")
+    run_cmd.add_argument("--database",
+                         help="SQLite file from bench.dataset (default: "
+                              "generate a small one)")
+    run_cmd.add_argument("--server-workers", type=int, default=1,
+                         help="uvicorn --workers")
+    run_cmd.add_argument("--seed", type=int, default=1)
+    run_cmd.add_argument("--output", help="write the JSON result here")
+
+    compare_cmd = commands.add_parser("compare", help="diff two JSON results")
+    compare_cmd.add_argument("before")
+    compare_cmd.add_argument("after")
+    compare_cmd.add_argument("--threshold", type=float, default=10,
+                             help="allowed p95 increase in percent")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return report.compare(args.before, args.after, args.threshold)
+
+    args.database = os.path.abspath(args.database or small_dataset())
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.database}"
+
+    result = asyncio.run(run(args))
+    result["meta"].update(
+        commit=git_commit(),
+        started_at=datetime.datetime.now().isoformat(timespec="seconds"),
+        python=sys.version.split()[0],
+    )
+    report.print_summary(result)
+    if args.output:
+        report.save(result, args.output)
+        print(f"saved {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""The scripted user journey, one request per step."""
+import asyncio
+import random
+import time
+
+from bench.dataset import WORDS
+
+
+class Session:
+    """A simulated user: credentials, cached token and shelf ids."""
+
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        self.headers = None
+        self.to_read = None
+        # journeys of one session overlap in open loop: the one-off steps
+        # (login, finding the shelf) run once, the others wait for them
+        self.setup_lock = asyncio.Lock()
+
+
+async def request(client, recorder, route, method, url, **kwargs):
+    t0 = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    recorder.add(route, response.status_code, (time.perf_counter() - t0) * 1000)
+    return response
+
+
+async def journey(client, recorder, session: Session, rnd: random.Random,
+                  max_book_id: int):
+    """Runs one journey; returns False if it had to stop early."""
+    if session.headers is None:
+        async with session.setup_lock:
+            if session.headers is None:
+                response = await request(
+                    client, recorder, "POST /login", "POST", "/login",
+                    data={"username": session.username,
+                          "password": session.password}
+                )
+                if response.status_code != 200:
+                    return False
+                token = response.json()["access_token"]
+                session.headers = {"Authorization": f"Bearer {token}"}
+
+    response = await request(
+        client, recorder, "GET /books/?title=", "GET", "/books/",
+        params={"title": rnd.choice(WORDS), "limit": 20}
+    )
+    books = response.json()["items"] if response.status_code == 200 else []
+    book_id = (
+        rnd.choice(books)["id"] if books else rnd.randint(1, max_book_id)
+    )
+
+    await request(
+        client, recorder, "GET /books/{id}", "GET", f"/books/{book_id}"
+    )
+
+    # 400 when this user already reviewed the book; still a real request
+    await request(
+        client, recorder, "POST /reviews/books/{id}", "POST",
+        f"/reviews/books/{book_id}", headers=session.headers,
+        json={"rating": rnd.randint(1, 5), "comment": "load test"}
+    )
+
+    if session.to_read is None:
+        async with session.setup_lock:
+            if session.to_read is None:
+                response = await request(
+                    client, recorder, "GET /collections/", "GET",
+                    "/collections/", headers=session.headers
+                )
+                if response.status_code != 200:
+                    return False
+                shelves = [
+                    c for c in response.json()["items"] if c["is_default"]
+                ]
+                if not shelves:
+                    return False
+                session.to_read = shelves[0]["id"]
+
+    await request(
+        client, recorder, "POST /collections/{id}/books/{id}", "POST",
+        f"/collections/{session.to_read}/books/{book_id}",
+        headers=session.headers
+    )
+
+    await request(
+        client, recorder, "GET /recommendations/", "GET", "/recommendations/",
+        headers=session.headers
+    )
+    return True
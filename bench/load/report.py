@@ -0,0 +1,99 @@
+"""Latency bookkeeping, JSON results and run-to-run comparison."""
+import json
+import statistics
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class Recorder:
+    """Per-route latencies (ms) and status counts."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+
+    def add(self, route: str, status: int, ms: float):
+        self.latencies.setdefault(route, []).append(ms)
+        counts = self.statuses.setdefault(route, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def summary(self, seconds: float) -> dict:
+        routes = {}
+        for route in sorted(self.latencies):
+            latencies = self.latencies[route]
+            statuses = self.statuses[route]
+            ok = sum(n for status, n in statuses.items() if status < 400)
+            routes[route] = {
+                "requests": len(latencies),
+                "ok_per_second": ok / seconds,
+                "errors": len(latencies) - ok,
+                "statuses": {str(k): v for k, v in sorted(statuses.items())},
+                **{f"p{p}_ms": percentile(latencies, p) for p in PERCENTILES},
+                "mean_ms": statistics.fmean(latencies),
+            }
+        return routes
+
+
+class Discard:
+    """Recorder for warm-up traffic."""
+
+    def add(self, route: str, status: int, ms: float):
+        pass
+
+
+def print_summary(result: dict):
+    meta = result["meta"]
+    print(f"{meta['target']} {meta['mode']} "
+          + (f"{meta['clients']} clients" if meta["mode"] == "closed"
+             else f"{meta['rate']} journeys/s")
+          + f", {meta['seconds']}s"
+          + (f" + {meta['drain_seconds']}s drain" if meta.get("drain_seconds")
+             else ""))
+    print(f"{'route':<38}{'req':>7}{'ok/s':>8}{'err':>6}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}")
+    for route, s in result["routes"].items():
+        print(f"{route:<38}{s['requests']:>7}{s['ok_per_second']:>8.1f}"
+              f"{s['errors']:>6}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+              f"{s['p99_ms']:>9.1f}")
+
+
+def save(result: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+def compare(before_path: str, after_path: str, threshold: float) -> int:
+    """Prints p50/p95/throughput deltas; 1 if any route's p95 regressed
+    by more than `threshold` percent."""
+    with open(before_path) as f:
+        before = json.load(f)["routes"]
+    with open(after_path) as f:
+        after = json.load(f)["routes"]
+
+    regressed = False
+    print(f"{'route':<38}{'p50':>16}{'p95':>16}{'ok/s':>16}")
+    for route in sorted(before.keys() & after.keys()):
+        old, new = before[route], after[route]
+        cells = []
+        for key in ("p50_ms", "p95_ms", "ok_per_second"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{new[key]:>8.1f} {change:+6.1f}%")
+        p95_change = (
+            (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            if old["p95_ms"] else 0.0
+        )
+        marker = ""
+        if p95_change > threshold:
+            regressed = True
+            marker = "  <-- p95 regression"
+        print(f"{route:<38}{''.join(cells)}{marker}")
+    for route in sorted(before.keys() ^ after.keys()):
+        print(f"{route:<38}only in {'before' if route in before else 'after'}")
+    return 1 if regressed else 0
@@ -0,0 +1,171 @@
+"""Targets (in-process / uvicorn) and the open- and closed-loop drivers."""
+import asyncio
+import contextlib
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+from .journeys import Session, journey
+from .report import Discard, Recorder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PASSWORD = "password"
+
+
+def dataset_info(database: str, users: int):
+    conn = sqlite3.connect(database)
+    try:
+        usernames = [
+            row[0] for row in conn.execute(
+                "SELECT username FROM users ORDER BY id LIMIT ?", (users,)
+            )
+        ]
+        max_book_id = conn.execute("SELECT max(id) FROM books").fetchone()[0]
+    finally:
+        conn.close()
+    if not usernames or not max_book_id:
+        raise SystemExit(f"{database} has no users or books")
+    return usernames, max_book_id
+
+
+@contextlib.asynccontextmanager
+async def inprocess_client():
+    import httpx
+
+    # DATABASE_URL is already set, app.database picks it up on import
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            yield client
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def uvicorn_client(workers: int):
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(
+            base_url=base_url, timeout=None, limits=limits
+        ) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit("uvicorn exited during startup")
+                try:
+                    ready = await client.get("/health/ready")
+                    if ready.status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise SystemExit("uvicorn did not get ready in 60s")
+                await asyncio.sleep(0.2)
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+async def closed_loop(client, recorder, sessions, max_book_id, args):
+    deadline = time.perf_counter() + args.warmup + args.seconds
+    measure_from = time.perf_counter() + args.warmup
+
+    async def run_client(n):
+        rnd = random.Random(args.seed * 100_003 + n)
+        session = sessions[n % len(sessions)]
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            rec = recorder if t0 >= measure_from else Discard()
+            ok = await journey(client, rec, session, rnd, max_book_id)
+            rec.add("journey", 200 if ok else 599,
+                    (time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*[run_client(n) for n in range(args.clients)])
+
+
+async def open_loop(client, recorder, sessions, max_book_id, args):
+    """Returns (measured arrival window, drain) in seconds; the drain is
+    the wait after the last scheduled arrival for journeys to finish."""
+    interval = 1 / args.rate
+    start = time.perf_counter()
+    total = int((args.warmup + args.seconds) * args.rate)
+    warmup = int(args.warmup * args.rate)
+    tasks = []
+
+    async def run_journey(n, scheduled):
+        rnd = random.Random(args.seed * 100_003 + n)
+        session = sessions[n % len(sessions)]
+        rec = recorder if n >= warmup else Discard()
+        ok = await journey(client, rec, session, rnd, max_book_id)
+        # from the scheduled start, so a backed-up client still counts
+        rec.add("journey", 200 if ok else 599,
+                (time.perf_counter() - scheduled) * 1000)
+
+    for n in range(total):
+        scheduled = start + n * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run_journey(n, scheduled)))
+    await asyncio.gather(*tasks)
+    drain = max(time.perf_counter() - (start + total * interval), 0)
+    return (total - warmup) * interval, drain
+
+
+async def run(args) -> dict:
+    usernames, max_book_id = dataset_info(args.database, args.users)
+    sessions = [Session(name, PASSWORD) for name in usernames]
+    recorder = Recorder()
+
+    client_cm = (
+        inprocess_client() if args.target == "inprocess"
+        else uvicorn_client(args.server_workers)
+    )
+    async with client_cm as client:
+        driver = closed_loop if args.mode == "closed" else open_loop
+        started = time.perf_counter()
+        window = await driver(client, recorder, sessions, max_book_id, args)
+        elapsed = time.perf_counter() - started - args.warmup
+    drain = None
+    if window is not None:
+        # ok/s над планираните пристигания, без доизчакването накрая
+        elapsed, drain = window
+
+    return {
+        "meta": {
+            "target": args.target,
+            "mode": args.mode,
+            "clients": args.clients,
+            "rate": args.rate,
+            "seconds": round(elapsed, 3),
+            "drain_seconds": None if drain is None else round(drain, 3),
+            "warmup": args.warmup,
+            "users": len(sessions),
+            "database": args.database,
+            "seed": args.seed,
+        },
+        "routes": recorder.summary(elapsed),
+    }
@@ -0,0 +1,110 @@
+"""Login throughput next to a concurrent read workload.
+
+Runs the app in-process (ASGI transport, no sockets) with some clients
+hammering POST /login and others reading books/genres, then reports
+logins/s, how many logins were shed with 503 and the read latencies.
+
+    python -m bench.login_throughput --seconds 10 --logins 64 --readers 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+async def worker(client, deadline, request, latencies, statuses):
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        response = await request(client)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def run(args):
+    import httpx
+
+    from app.main import app
+
+    login_latencies, read_latencies = [], []
+    login_statuses, read_statuses = {}, {}
+
+    async def login(client):
+        return await client.post(
+            "/login", data={"username": "bench", "password": "password"}
+        )
+
+    async def read(client):
+        return await client.get("/books/1")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *[worker(client, deadline, login, login_latencies, login_statuses)
+              for _ in range(args.logins)],
+            *[worker(client, deadline, read, read_latencies, read_statuses)
+              for _ in range(args.readers)],
+        )
+
+    print(f"bcrypt rounds {args.rounds}, {args.logins} login clients, "
+          f"{args.readers} read clients, {args.seconds}s")
+    for name, latencies, statuses in (
+        ("login", login_latencies, login_statuses),
+        ("read", read_latencies, read_statuses),
+    ):
+        ok = statuses.get(200, 0)
+        print(
+            f"{name:<6} {ok / args.seconds:>8.1f} ok/s  "
+            f"statuses {dict(sorted(statuses.items()))}  "
+            f"p50 {percentile(latencies, 50):.1f}ms  "
+            f"p95 {percentile(latencies, 95):.1f}ms  "
+            f"p99 {percentile(latencies, 99):.1f}ms  "
+            f"mean {statistics.fmean(latencies) if latencies else 0:.1f}ms"
+        )
+
+
+def main(argv=None):
+    from app import passwords
+
+    parser = argparse.ArgumentParser(prog="python -m bench.login_throughput")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=passwords.BCRYPT_ROUNDS)
+    args = parser.parse_args(argv)
+
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    os.chdir(tempfile.mkdtemp())
+    passwords.pwd_context.update(bcrypt__rounds=args.rounds)
+
+    from app import models
+    from app.database import SessionLocal
+    from app.db_init import init_db
+
+    init_db()
+    with SessionLocal() as db:
+        user = models.User(
+            username="bench",
+            password_hash=passwords.pwd_context.hash("password")
+        )
+        db.add(user)
+        db.flush()
+        db.add(models.Book(title="Bench book", author_id=user.id))
+        db.commit()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
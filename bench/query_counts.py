@@ -0,0 +1,192 @@
+"""Checks that read endpoints issue a fixed number of SQL statements.
+
+Seeds a temporary database, calls every read endpoint, grows the data
+tenfold and calls them again. Any endpoint whose statement count changed
+has an N+1 somewhere (usually a missing plan in app/loading.py).
+
+    python -m bench.query_counts
+
+tests/test_query_counts.py asserts the same under pytest; this script
+prints the whole table. The seeding here is shared with those tests,
+bench.query_plans and bench.serialization.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+SMALL, LARGE = 5, 50
+
+
+def seed(db, models, start: int, stop: int, password_hash: str):
+    """Adds rows [start, stop) around the `reader` user and genre 1."""
+    from app import friend_graph, tag_vocab, title_index
+
+    reader = db.query(models.User).filter_by(username="reader").one()
+    fav = tag_vocab.resolve_ids(db, ["fav"])["fav"]
+    genre = db.get(models.Genre, 1)
+    defaults = db.query(models.Collection).filter_by(
+        user_id=reader.id, is_default=True
+    ).all()
+
+    for i in range(start, stop):
+        friend = models.User(
+            username=f"friend{i}", password_hash=password_hash
+        )
+        stranger = models.User(
+            username=f"stranger{i}", password_hash=password_hash
+        )
+        extra_genre = models.Genre(name=f"genre{i}")
+        book = models.Book(
+            title=f"common title {i}",
+            description="seeded",
+            author_id=reader.id,
+            genres=[genre, extra_genre],
+        )
+        db.add_all([friend, stranger, extra_genre, book])
+        db.flush()
+
+        db.add_all([
+            models.FriendRequest(
+                sender_id=reader.id, receiver_id=friend.id,
+                status=models.FriendStatus.accepted,
+            ),
+            models.FriendRequest(
+                sender_id=stranger.id, receiver_id=reader.id,
+            ),
+            models.Review(rating=5, user_id=friend.id, book_id=book.id),
+            models.Review(rating=4, user_id=reader.id, book_id=book.id),
+            models.Tag(tag_id=fav, user_id=reader.id, book_id=book.id),
+            models.Collection(name=f"shelf{i}", user_id=reader.id),
+        ])
+        friend_graph.add_friendship(db, reader.id, friend.id)
+        if i:
+            friend_graph.add_friendship(db, friend.id, friend.id - 2)
+        if i % 2:
+            defaults[0].books.append(book)
+
+    db.commit()
+
+    from app import ratings
+    from app.deps import user_cache
+    from app.recommender import recommender, results
+    ratings.rebuild(db)
+    tag_vocab.rebuild(db)
+    tag_vocab.index.rebuild()
+    title_index.index.rebuild(save=False)
+    recommender.rebuild()
+    # seeded directly, so nothing invalidated the caches
+    results.clear()
+    user_cache.clear()
+
+
+def endpoints():
+    return [
+        "/users/me",
+        "/books/1",
+        "/books/?title=common&limit=100",
+        "/books/autocomplete?prefix=b",
+        "/books/by-genre/1?limit=100",
+        "/genres/?limit=100",
+        "/genres/1",
+        "/reviews/books/1?limit=100",
+        "/collections/?limit=100",
+        "/friends/?limit=100",
+        "/friends/requests?limit=100",
+        "/friends/suggestions?limit=100",
+        "/tags/fav/books?limit=100",
+        "/tags/books/1",
+        "/tags/cloud?limit=100",
+        "/tags/cloud?scope=all&limit=100",
+        "/tags/autocomplete?prefix=f",
+        "/recommendations/",
+    ]
+
+
+def measure(client, engines, headers):
+    from sqlalchemy import event
+
+    counts = {}
+    current = []
+
+    def count(*args):
+        current.append(1)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        for url in endpoints():
+            current.clear()
+            response = client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise SystemExit(f"{url} -> {response.status_code}")
+            counts[url] = len(current)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+    return counts
+
+
+def prepare():
+    """Seeds SMALL rows in a scratch dir; returns (client, headers, hash)."""
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    # seed() пише направо в базата, без да инвалидира кеша на отговорите
+    os.environ.setdefault("RESPONSE_CACHE", "off")
+
+    from fastapi.testclient import TestClient
+
+    from app import models, passwords
+    from app.database import SessionLocal
+    from app.db_init import init_db
+    from app.main import app
+
+    init_db()
+    with SessionLocal() as db:
+        password_hash = passwords.pwd_context.hash("password")
+        reader = models.User(username="reader", password_hash=password_hash)
+        db.add_all([reader, models.Genre(name="seed")])
+        db.flush()
+        for name in ["To Read", "Reading", "Read"]:
+            db.add(models.Collection(
+                name=name, is_default=True, user_id=reader.id
+            ))
+        db.commit()
+        seed(db, models, 0, SMALL, password_hash)
+
+    client = TestClient(app)
+    token = client.post(
+        "/login", data={"username": "reader", "password": "password"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    return client, headers, password_hash
+
+
+def main(argv=None):
+    argparse.ArgumentParser(prog="python -m bench.query_counts").parse_args(argv)
+
+    client, headers, password_hash = prepare()
+
+    from app import models
+    from app.database import SessionLocal, async_engine, async_read_engine
+
+    # the API runs on the async engines; events live on their sync cores
+    engines = [async_engine.sync_engine, async_read_engine.sync_engine]
+    small = measure(client, engines, headers)
+    with SessionLocal() as db:
+        seed(db, models, SMALL, LARGE, password_hash)
+    large = measure(client, engines, headers)
+
+    failed = False
+    print(f"{'endpoint':<36}{SMALL:>8}{LARGE:>8}")
+    for url in endpoints():
+        marker = "" if small[url] == large[url] else "  <-- grows with data"
+        failed |= bool(marker)
+        print(f"{url:<36}{small[url]:>8}{large[url]:>8}{marker}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Prints the query plans of the endpoints' SQL and flags full table scans.
+
+Seeds the same database as bench.query_counts, calls every read endpoint
+plus the main writes, captures each SQL statement with its parameters
+and runs EXPLAIN QUERY PLAN on it. A `SCAN <table>` step (with or
+without a covering index) is a failure unless it is in ALLOWED_SCANS or
+the statement has a LIMIT and needs no temp B-tree for its ORDER BY,
+i.e. the scan walks an index in order and stops early.
+
+    python -m bench.query_plans
+    python -m bench.query_plans --verbose   # print every plan
+
+tests/test_query_plans.py runs the same check under pytest.
+"""
+import argparse
+import re
+import sys
+
+from bench.query_counts import LARGE, SMALL, endpoints, prepare, seed
+
+# (endpoint, table) -> why scanning it is fine
+ALLOWED_SCANS = {}
+
+SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def writes(ids):
+    """Mutating calls as (method, url, json) against the seeded data."""
+    book = ids["book"]
+    return [
+        ("POST", f"/reviews/books/{book}", {"rating": 3}),
+        ("POST", f"/tags/books/{book}", {"name": "plan"}),
+        ("POST", "/tags/batch", {"items": [{"book_id": book, "name": "b"}]}),
+        ("POST", f"/collections/{ids['shelf']}/books/{book}", None),
+        ("POST", f"/collections/{ids['shelf']}/books/batch",
+         {"book_ids": [book]}),
+        ("DELETE", f"/collections/{ids['shelf']}/books/{book}", None),
+        ("POST", f"/friends/{ids['stranger']}", None),
+    ]
+
+
+def capture(client, engines, calls, headers):
+    from sqlalchemy import event
+
+    statements = {}
+    current = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        current.append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        for method, url, body in calls:
+            current.clear()
+            response = client.request(method, url, json=body, headers=headers)
+            if response.status_code != 200:
+                raise SystemExit(f"{method} {url} -> {response.status_code}")
+            statements[f"{method} {url}" if method != "GET" else url] = list(current)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def full_scans(conn, statement, parameters, tables):
+    if not statement.lstrip().upper().startswith(
+        ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+    ):
+        return [], []
+    plan = conn.exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, tuple(parameters)
+    ).all()
+    details = [row[-1] for row in plan]
+    ordered = not any("TEMP B-TREE" in d for d in details)
+    if ordered and re.search(r"\bLIMIT\b", statement, re.IGNORECASE):
+        return [], details
+    scans = []
+    for detail in details:
+        match = SCAN.match(detail)
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans, details
+
+
+def add_plan_fixtures(db, models, password_hash) -> dict:
+    """Rows the write calls need; run once on the LARGE data."""
+    reader = db.query(models.User).filter_by(username="reader").one()
+    # a book nobody has reviewed, tagged or shelved yet
+    book = models.Book(title="plan", author_id=reader.id)
+    # and a user with no requests either way
+    stranger = models.User(username="plan", password_hash=password_hash)
+    db.add_all([book, stranger])
+    db.commit()
+    return {
+        "book": book.id,
+        "shelf": db.query(models.Collection.id).filter_by(
+            user_id=reader.id, is_default=False
+        ).limit(1).scalar(),
+        "stranger": stranger.id,
+    }
+
+
+def check_plans(client, headers, ids):
+    """[(endpoint, statement, plan, tables scanned without permission)]."""
+    from app import models
+    from app.database import async_engine, async_read_engine
+    from app.database import engine as sync_engine
+
+    engines = [async_engine.sync_engine, async_read_engine.sync_engine]
+    calls = [("GET", url, None) for url in endpoints()] + writes(ids)
+    captured = capture(client, engines, calls, headers)
+
+    tables = set(models.Base.metadata.tables)
+    checked = []
+    with sync_engine.connect() as conn:
+        for endpoint, statements in captured.items():
+            for statement, parameters in statements:
+                scans, plan = full_scans(conn, statement, parameters, tables)
+                bad = [
+                    table for table in scans
+                    if (endpoint, table) not in ALLOWED_SCANS
+                ]
+                checked.append((endpoint, statement, plan, bad))
+    return checked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.query_plans")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    client, headers, password_hash = prepare()
+
+    from app import models
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        seed(db, models, SMALL, LARGE, password_hash)
+        ids = add_plan_fixtures(db, models, password_hash)
+
+    checked = check_plans(client, headers, ids)
+    failures = 0
+    for endpoint, statement, plan, bad in checked:
+        if args.verbose or bad:
+            print(f"{endpoint}\n  {' '.join(statement.split())}")
+            for step in plan:
+                print(f"    {step}")
+        if bad:
+            failures += 1
+            print(f"  <-- full scan of {', '.join(bad)}\n")
+
+    endpoints_seen = len({endpoint for endpoint, *_ in checked})
+    print(f"{len(checked)} statements from {endpoints_seen} endpoints, "
+          f"{failures} with full table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
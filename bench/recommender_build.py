@@ -0,0 +1,93 @@
+"""How much a recommender index build stalls the serving threads.
+
+Seeds a scratch database with `--reviews` synthetic reviews (Zipf-skewed
+books), then rebuilds app.recommender's index once on a background
+thread and once in the build process (RECOMMENDER_BUILD_PROCESS). While
+it runs the main thread ticks every millisecond, standing in for the
+event loop; the longest gap between ticks is how long a request could
+have been stuck behind the build.
+
+    python -m bench.recommender_build
+    python -m bench.recommender_build --reviews 5000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+def seed(path: str, n_reviews: int, seed_value: int = 1):
+    from sqlalchemy import create_engine
+
+    from app.database import Base
+    from app import models  # noqa: F401  (registers the tables)
+
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    rng = np.random.default_rng(seed_value)
+    users = rng.integers(1, max(n_reviews // 10, 2), n_reviews)
+    books = rng.zipf(1.3, n_reviews) % max(n_reviews // 20, 2) + 1
+    # едно ревю на (потребител, книга)
+    _, first = np.unique(users * (books.max() + 1) + books, return_index=True)
+    ratings = rng.integers(1, 6, first.size)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO reviews (user_id, book_id, rating) VALUES (?, ?, ?)",
+            zip(users[first].tolist(), books[first].tolist(), ratings.tolist())
+        )
+    conn.close()
+    return first.size
+
+
+def measure(recommender, in_process: bool):
+    from app import recommender as module
+
+    module.BUILD_IN_PROCESS = in_process
+    recommender.index = None
+    gaps = []
+    done = threading.Event()
+
+    def build():
+        t0 = time.perf_counter()
+        recommender.rebuild()
+        build.seconds = time.perf_counter() - t0
+        done.set()
+
+    threading.Thread(target=build).start()
+    last = time.perf_counter()
+    while not done.is_set():
+        time.sleep(0.001)
+        now = time.perf_counter()
+        gaps.append((now - last) * 1000)
+        last = now
+    gaps.sort()
+    return build.seconds, gaps[int(len(gaps) * 0.99)], gaps[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.recommender_build")
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    os.chdir(tempfile.mkdtemp())
+    t0 = time.perf_counter()
+    n = seed("goodreads.db", args.reviews)
+    print(f"seeded {n} reviews in {time.perf_counter() - t0:.1f}s")
+
+    from app.recommender import Recommender
+
+    recommender = Recommender()
+    print(f"{'build':<10}{'seconds':>9}{'p99 gap ms':>12}{'max gap ms':>12}")
+    for name, in_process in (("thread", False), ("process", True)):
+        seconds, p99, worst = measure(recommender, in_process)
+        print(f"{name:<10}{seconds:>9.2f}{p99:>12.1f}{worst:>12.1f}"
+              f"   {len(recommender.index)} books indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Compares the old `LIKE '%x%'` title search with the FTS5 index.
+
+    python -m bench.search_like_vs_fts --books 1000000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app import models  # noqa: F401  (registers the tables)
+from app import search
+
+SYLLABLES = "ka lo mi ra ne to su vi da re no ma li sha tor ven gal dor".split()
+
+
+def vocabulary(rnd: random.Random, size: int = 20_000):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+    words = sorted(words)
+    rnd.shuffle(words)
+    return words
+
+
+def seed(engine, n_books: int, seed_value: int = 1):
+    rnd = random.Random(seed_value)
+    words = vocabulary(rnd)
+    # Zipf-like weights: a few very common words, a long tail of rare ones
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) for rank in range(len(words))
+    ))
+    batch = 50_000
+
+    def pick(k):
+        return " ".join(rnd.choices(words, cum_weights=cum_weights, k=k))
+
+    with engine.begin() as conn:
+        for start in range(0, n_books, batch):
+            rows = [
+                {
+                    "title": pick(rnd.randint(2, 5)),
+                    "description": pick(30),
+                }
+                for _ in range(start, min(start + batch, n_books))
+            ]
+            conn.execute(
+                text("INSERT INTO books (title, description) "
+                     "VALUES (:title, :description)"),
+                rows
+            )
+    return words
+
+
+def queries(words):
+    return [
+        ("common word", words[0]),
+        ("mid word", words[200]),
+        ("rare word", words[15_000]),
+        ("prefix", words[200][:4]),
+        ("two words", f"{words[3]} {words[40]}"),
+        ("no match", "qqqq"),
+    ]
+
+
+def timed(fn, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.search_like_vs_fts")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+
+        t0 = time.perf_counter()
+        words = seed(engine, args.books)
+        print(f"seeded {args.books} books in {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        search.init_index(engine)
+        print(f"built FTS index in {time.perf_counter() - t0:.1f}s")
+
+        print(f"{'case':<14}{'query':<22}"
+              f"{'LIKE ms':>10}{'rows':>9}{'FTS ms':>10}{'rows':>6}")
+        with Session(engine) as db:
+            for case, q in queries(words):
+                like_ms, like_rows = timed(lambda: db.execute(
+                    text("SELECT id FROM books WHERE title LIKE :p"),
+                    {"p": f"%{q}%"}
+                ).all(), args.repeat)
+                fts_ms, fts_rows = timed(
+                    lambda: search.search_book_ids(db, q, args.limit),
+                    args.repeat
+                )
+                print(f"{case:<14}{q:<22}{like_ms:>10.2f}{len(like_rows):>9}"
+                      f"{fts_ms:>10.2f}{len(fts_rows):>6}")
+
+
+if __name__ == "__main__":
+    main()
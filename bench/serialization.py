@@ -0,0 +1,101 @@
+"""ORM + response_model vs the app.fastjson path on the hot list routes.
+
+Seeds the bench.query_counts data at `--rows` books, then calls each
+route `--repeat` times with the fast path off and on. Reports the mean
+time per request and the SQL statements per request, and fails if the
+two paths return different payloads (genre and shelf order aside,
+which the ORM path leaves to SQLite).
+
+    python -m bench.serialization
+    python -m bench.serialization --rows 500 --repeat 100
+"""
+import argparse
+import sys
+import time
+
+from bench.query_counts import SMALL, prepare, seed
+
+ROUTES = [
+    "/books/?title=common&limit=100",
+    "/books/by-genre/1?limit=100",
+    "/collections/?limit=100",
+    "/reviews/books/1?limit=100",
+]
+
+
+def normalize(payload):
+    """Sorts the lists whose order the ORM path does not fix."""
+    if isinstance(payload, dict):
+        out = {k: normalize(v) for k, v in payload.items()}
+        for key in ("genres", "books"):
+            if isinstance(out.get(key), list):
+                out[key] = sorted(out[key], key=lambda item: item["id"])
+        return out
+    if isinstance(payload, list):
+        return [normalize(item) for item in payload]
+    return payload
+
+
+def measure(client, headers, url, repeat, engines):
+    from sqlalchemy import event
+
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    response = client.get(url, headers=headers)
+    if response.status_code != 200:
+        raise SystemExit(f"{url} -> {response.status_code}")
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            client.get(url, headers=headers)
+        elapsed = time.perf_counter() - t0
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+    return response.json(), elapsed / repeat * 1000, len(statements) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    client, headers, password_hash = prepare()
+
+    from app import fastjson, models
+    from app.database import SessionLocal, async_engine, async_read_engine
+
+    with SessionLocal() as db:
+        seed(db, models, SMALL, args.rows, password_hash)
+    engines = [async_engine.sync_engine, async_read_engine.sync_engine]
+
+    failed = False
+    print(f"{'route':<34}{'orm ms':>9}{'fast ms':>9}{'speedup':>9}"
+          f"{'sql':>9}")
+    for url in ROUTES:
+        fastjson.ENABLED = False
+        slow, slow_ms, slow_sql = measure(
+            client, headers, url, args.repeat, engines
+        )
+        fastjson.ENABLED = True
+        fast, fast_ms, fast_sql = measure(
+            client, headers, url, args.repeat, engines
+        )
+        same = normalize(slow) == normalize(fast)
+        failed |= not same
+        print(f"{url:<34}{slow_ms:>9.2f}{fast_ms:>9.2f}"
+              f"{slow_ms / fast_ms:>8.1f}x{slow_sql:>5.0f}/{fast_sql:<3.0f}"
+              + ("" if same else "  <-- payloads differ"))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Read latency while reviews and tags are being written.
+
+Runs each SQLite profile in its own process (the engines are configured
+at import time from the environment):
+
+    legacy      rollback journal, synchronous=FULL (the old defaults)
+    production  the app defaults: WAL, synchronous=NORMAL, cache/mmap
+
+Each run measures GET /books/{id} and GET /reviews/books/{id} first with
+no writers ("idle") and then while writer processes commit reviews and
+tags in a tight loop ("burst"). With WAL the burst read latencies should stay
+close to the idle ones and no request should fail with a locked database.
+
+    python -m bench.sqlite_concurrency --seconds 5 --readers 32 --writers 2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    "legacy": {"DB_JOURNAL_MODE": "DELETE", "DB_SYNCHRONOUS": "FULL"},
+    "production": {},
+}
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def summary(latencies, statuses, seconds):
+    return {
+        "ok_per_second": statuses.get(200, 0) / seconds,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies, default=0.0),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+def seed(books: int, writers: int):
+    from app import models
+    from app.database import SessionLocal
+    from app.db_init import init_db
+
+    init_db()
+    with SessionLocal() as db:
+        author = models.User(username="author", password_hash="-")
+        db.add(author)
+        db.flush()
+        db.add_all([
+            models.Book(title=f"Bench book {i}", author_id=author.id)
+            for i in range(books)
+        ])
+        users = [
+            models.User(username=f"writer{i}", password_hash="-")
+            for i in range(writers)
+        ]
+        db.add_all(users)
+        db.commit()
+        return [user.id for user in users]
+
+
+async def reader(client, books, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        book_id = random.randint(1, books)
+        url = random.choice(
+            (f"/books/{book_id}", f"/reviews/books/{book_id}")
+        )
+        t0 = time.perf_counter()
+        response = await client.get(url)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+def write_burst(user_id: int, books: int, seconds: float, queue):
+    """Posts reviews and tags as `user_id` through the sync engine.
+
+    Runs in its own process so the writes contend on the database file
+    and not on the readers' event loop.
+    """
+    from app import models, tag_vocab
+    from app.database import SessionLocal
+    from app.ratings import apply_rating
+
+    latencies, statuses = [], {}
+    order = random.sample(range(1, books + 1), books)
+    deadline = time.perf_counter() + seconds
+    with SessionLocal() as db:
+        tag_id = tag_vocab.resolve_ids(db, ["bench"])["bench"]
+        db.commit()
+        for book_id in order:
+            if time.perf_counter() >= deadline:
+                break
+            rating = random.randint(1, 5)
+            t0 = time.perf_counter()
+            try:
+                db.add_all([
+                    models.Review(rating=rating, comment="bench",
+                                  user_id=user_id, book_id=book_id),
+                    models.Tag(tag_id=tag_id, user_id=user_id, book_id=book_id),
+                ])
+                apply_rating(db, book_id, None, rating)
+                tag_vocab.add_uses(db, user_id, {tag_id: 1})
+                db.commit()
+                status = 200
+            except Exception:
+                db.rollback()
+                status = 500
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    queue.put((latencies, statuses))
+
+
+async def run(args, user_ids):
+    import httpx
+
+    from app.database import async_engine, async_read_engine
+    from app.main import app
+
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    results = {}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        # warm-up: imports, pool connections, SQLite page cache
+        await asyncio.gather(*[
+            reader(client, args.books, time.perf_counter() + 1, [], {})
+            for _ in range(args.readers)
+        ])
+        for phase in ("idle", "burst"):
+            read_latencies, read_statuses = [], {}
+            write_latencies, write_statuses = [], {}
+            deadline = time.perf_counter() + args.seconds
+            jobs = [
+                reader(client, args.books, deadline,
+                       read_latencies, read_statuses)
+                for _ in range(args.readers)
+            ]
+            processes = [
+                context.Process(
+                    target=write_burst,
+                    args=(user_id, args.books, args.seconds, queue)
+                )
+                for user_id in user_ids
+            ]
+            if phase == "burst":
+                for process in processes:
+                    process.start()
+            await asyncio.gather(*jobs)
+            results[phase] = {
+                "read": summary(read_latencies, read_statuses, args.seconds)
+            }
+            if phase == "burst":
+                for _ in processes:
+                    latencies, statuses = queue.get()
+                    write_latencies += latencies
+                    for status, n in statuses.items():
+                        write_statuses[status] = write_statuses.get(status, 0) + n
+                for process in processes:
+                    process.join()
+                results[phase]["write"] = summary(
+                    write_latencies, write_statuses, args.seconds
+                )
+
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+    return results
+
+
+def run_profile(args):
+    # app.database points at ./goodreads.db, so run inside a scratch dir
+    os.chdir(tempfile.mkdtemp())
+    user_ids = seed(args.books, args.writers)
+    print(json.dumps(asyncio.run(run(args, user_ids))))
+
+
+def print_report(profile, results):
+    print(profile)
+    for phase, kinds in results.items():
+        for kind, s in kinds.items():
+            print(
+                f"  {phase:<6}{kind:<6}{s['ok_per_second']:>8.1f} ok/s  "
+                f"p50 {s['p50_ms']:.1f}ms  p99 {s['p99_ms']:.1f}ms  "
+                f"max {s['max_ms']:.1f}ms  statuses {s['statuses']}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.sqlite_concurrency")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--profile", choices=sorted(PROFILES))
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    forwarded = list(sys.argv[1:] if argv is None else argv)
+    for profile, env in PROFILES.items():
+        output = subprocess.run(
+            [sys.executable, "-m", "bench.sqlite_concurrency",
+             *forwarded, "--profile", profile],
+            env={**os.environ, **env},
+            capture_output=True, text=True, check=True,
+        ).stdout
+        print_report(profile, json.loads(output.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Latency of /books/autocomplete on a large synthetic catalogue.
+
+Builds app.title_index over `--titles` generated titles (Zipf-distributed
+words and review counts), times the build and a snapshot save / load,
+then replays prefixes as typed by a user (1 to 12 characters of random
+titles) against the index directly and through the ASGI app. Fails if
+the p99 of the index lookup is over `--target-ms`.
+
+    python -m bench.title_autocomplete
+    python -m bench.title_autocomplete --titles 200000 --queries 5000
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench.search_like_vs_fts import vocabulary
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def catalogue(n: int, seed_value: int = 1):
+    rnd = random.Random(seed_value)
+    words = vocabulary(rnd)
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) for rank in range(len(words))
+    ))
+    rows = []
+    for book_id in range(1, n + 1):
+        title = " ".join(
+            rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(1, 5))
+        ).capitalize()
+        # малко книги с много ревюта, дълга опашка без нито едно
+        rows.append((book_id, title, int(rnd.paretovariate(1.1)) - 1))
+    return rows
+
+
+def prefixes(rows, n: int, seed_value: int = 2):
+    rnd = random.Random(seed_value)
+    typed = []
+    for _ in range(n):
+        title = rnd.choice(rows)[1]
+        typed.append(title[:rnd.randint(1, 12)])
+    return typed
+
+
+def report(name, samples_ms):
+    print(f"{name:<22}{percentile(samples_ms, 50) * 1000:>9.0f}"
+          f"{percentile(samples_ms, 99) * 1000:>9.0f}"
+          f"{max(samples_ms) * 1000:>9.0f}")
+
+
+async def through_app(typed, limit):
+    import httpx
+
+    from app.main import app
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for prefix in typed:
+            t0 = time.perf_counter()
+            response = await client.get(
+                "/books/autocomplete", params={"prefix": prefix, "limit": limit}
+            )
+            latencies.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.text
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.title_autocomplete")
+    parser.add_argument("--titles", type=int, default=2_000_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--http-queries", type=int, default=2_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    # app.database points at ./goodreads.db; the lookups never touch it
+    os.chdir(tempfile.mkdtemp())
+    from app import title_index
+
+    t0 = time.perf_counter()
+    rows = catalogue(args.titles)
+    print(f"generated {len(rows)} titles in {time.perf_counter() - t0:.1f}s")
+
+    t0 = time.perf_counter()
+    titles = title_index.TitleArray.build(rows)
+    build_s = time.perf_counter() - t0
+    size = len(titles.blob) + sum(
+        values.itemsize * len(values)
+        for values in (titles.offsets, titles.ids, titles.counts, titles.tree)
+    )
+    print(f"built index in {build_s:.1f}s, {size / 2**20:.0f} MiB")
+
+    path = os.path.abspath("titles.snapshot")
+    t0 = time.perf_counter()
+    titles.save(path)
+    save_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    titles = title_index.TitleArray.load(path)
+    print(f"snapshot: saved in {save_s * 1000:.0f} ms, "
+          f"loaded in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    index = title_index.TitleIndex()
+    index._swap(titles)
+    typed = prefixes(rows, args.queries)
+    del rows
+
+    print(f"\n{'':<22}{'p50 us':>9}{'p99 us':>9}{'max us':>9}")
+    lookups = []
+    for prefix in typed:
+        t0 = time.perf_counter()
+        index.complete(prefix, args.limit)
+        lookups.append((time.perf_counter() - t0) * 1000)
+    report("index lookup", lookups)
+
+    # за сравнение: класиране с обхождане на целия диапазон
+    scans = []
+    for prefix in typed[:200]:
+        t0 = time.perf_counter()
+        lo, hi = titles.range(title_index.normalize_prefix(prefix))
+        heapq.nlargest(args.limit, range(lo, hi), key=titles.counts.__getitem__)
+        scans.append((time.perf_counter() - t0) * 1000)
+    report("range scan (200)", scans)
+
+    title_index.index = index
+    report("GET /books/autocomplete",
+           asyncio.run(through_app(typed[:args.http_queries], args.limit)))
+
+    p99 = percentile(lookups, 99)
+    if p99 > args.target_ms:
+        print(f"\nindex p99 {p99:.2f} ms is over the {args.target_ms} ms target")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""One seeded scratch database shared by the SQL tests of a session.
+
+app.database binds to ./goodreads.db when it is first imported, so the
+app is imported inside a scratch directory (bench.query_counts.prepare)
+and every test that talks to it shares that directory and its data.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def api():
+    """TestClient over the SMALL dataset, logged in as `reader`."""
+    from bench.query_counts import prepare
+
+    cwd = os.getcwd()
+    client, headers, password_hash = prepare()
+    try:
+        yield SimpleNamespace(
+            client=client, headers=headers, password_hash=password_hash
+        )
+    finally:
+        client.close()
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def engines(api):
+    from app.database import async_engine, async_read_engine
+
+    # the API runs on the async engines; events live on their sync cores
+    return [async_engine.sync_engine, async_read_engine.sync_engine]
+
+
+@pytest.fixture(scope="session")
+def small_counts(api, engines):
+    """Statements per endpoint before the data grows."""
+    from bench.query_counts import measure
+
+    return measure(api.client, engines, api.headers)
+
+
+@pytest.fixture(scope="session")
+def grown(api, small_counts):
+    """The same database grown to LARGE rows (after small_counts ran)."""
+    from app import models
+    from app.database import SessionLocal
+    from bench.query_counts import LARGE, SMALL, seed
+
+    with SessionLocal() as db:
+        seed(db, models, SMALL, LARGE, api.password_hash)
+    return api
@@ -0,0 +1,37 @@
+"""Importing app.main stays fast and leaves heavy work for later.
+
+Each import runs in a fresh interpreter (bench.import_time) against a
+database path in an empty scratch dir. IMPORT_BUDGET_MS overrides the
+budget on slow machines.
+"""
+import os
+
+import pytest
+
+from bench.import_time import BUDGET_MS, measure
+
+RUNS = 5
+
+
+@pytest.fixture(scope="module")
+def imports():
+    return measure(RUNS)
+
+
+def test_import_is_within_budget(imports):
+    budget = float(os.environ.get("IMPORT_BUDGET_MS", BUDGET_MS))
+    median, totals, *_ = imports
+    assert median <= budget, (
+        f"app.main imports in {median:.0f} ms (median of {RUNS}), "
+        f"budget {budget:.0f} ms; run python -m bench.import_time"
+    )
+
+
+def test_heavy_dependencies_are_deferred(imports):
+    *_, loaded, _ = imports
+    assert not loaded, f"imported at startup: {', '.join(loaded)}"
+
+
+def test_import_does_not_touch_the_database(imports):
+    *_, touched = imports
+    assert touched is None, f"importing app.main created {touched}"
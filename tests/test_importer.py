@@ -0,0 +1,70 @@
+"""app.importer: replayed rows and shelves end up the same at any batch size."""
+import csv
+
+import pytest
+from sqlalchemy import create_engine, select
+
+ROWS = [
+    # Book Id, Title, My Rating, Exclusive Shelf, Bookshelves
+    ("1", "Dune", "2", "to-read", ""),
+    ("2", "Emma", "3", "read", "favourites"),
+    ("1", "Dune", "4", "read", ""),
+    ("3", "Ubik", "1", "currently-reading", ""),
+    ("1", "Dune", "5", "read", ""),
+    ("2", "Emma", "1", "read", ""),
+]
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = tmp_path / "library.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Book Id", "Title", "Author", "My Rating",
+                         "Exclusive Shelf", "Bookshelves"])
+        for book_id, title, rating, shelf, shelves in ROWS:
+            writer.writerow([book_id, title, "Anon", rating, shelf, shelves])
+    return str(path)
+
+
+def run(tmp_path, library, batch_size):
+    from app import importer
+    from app.database import Base
+    from app.models import Book, Collection, Review, User, collection_books
+
+    engine = create_engine(f"sqlite:///{tmp_path / f'import{batch_size}.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        owner = conn.execute(
+            User.__table__.insert().values(username="owner", password_hash="x")
+        ).inserted_primary_key[0]
+        # без рафтовете по подразбиране, но със свой "Read"
+        conn.execute(Collection.__table__.insert().values(
+            name="Read", is_default=False, user_id=owner
+        ))
+
+    importer.run_import(engine, library, "owner", batch_size=batch_size)
+    with engine.connect() as conn:
+        ratings = dict(conn.execute(
+            select(Book.title, Review.rating).join(Review, Review.book_id == Book.id)
+        ).all())
+        shelved = set(conn.execute(
+            select(Collection.name, Collection.is_default, Book.title)
+            .join(collection_books, collection_books.c.collection_id == Collection.id)
+            .join(Book, Book.id == collection_books.c.book_id)
+        ).all())
+    engine.dispose()
+    return ratings, shelved
+
+
+@pytest.mark.parametrize("batch_size", [1, 4, 5, 100])
+def test_last_row_wins_at_any_batch_size(api, tmp_path, library, batch_size):
+    ratings, shelved = run(tmp_path, library, batch_size)
+    assert ratings == {"Dune": 5, "Emma": 1, "Ubik": 1}
+    # "read" е рафтът по подразбиране, не едноименният потребителски
+    assert shelved == {
+        ("Read", True, "Dune"),
+        ("Read", True, "Emma"),
+        ("Reading", True, "Ubik"),
+        ("favourites", False, "Emma"),
+    }
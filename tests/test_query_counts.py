@@ -0,0 +1,21 @@
+"""Read endpoints issue the same number of SQL statements at any size.
+
+An endpoint whose count grows with the data has an N+1 somewhere
+(usually a missing plan in app/loading.py).
+"""
+import pytest
+
+from bench.query_counts import LARGE, SMALL, endpoints, measure
+
+
+@pytest.fixture(scope="module")
+def large_counts(grown, engines):
+    return measure(grown.client, engines, grown.headers)
+
+
+@pytest.mark.parametrize("url", endpoints())
+def test_statement_count_does_not_grow(url, small_counts, large_counts):
+    assert large_counts[url] == small_counts[url], (
+        f"{url}: {small_counts[url]} statements with {SMALL} rows, "
+        f"{large_counts[url]} with {LARGE}"
+    )
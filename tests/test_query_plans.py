@@ -0,0 +1,28 @@
+"""No endpoint's SQL needs a full table scan (see bench.query_plans)."""
+import pytest
+
+from bench.query_plans import add_plan_fixtures, check_plans
+
+
+@pytest.fixture(scope="module")
+def plans(grown):
+    from app import models
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        ids = add_plan_fixtures(db, models, grown.password_hash)
+    return check_plans(grown.client, grown.headers, ids)
+
+
+def test_no_full_table_scans(plans):
+    failures = [
+        f"{endpoint}: full scan of {', '.join(bad)}\n"
+        f"  {' '.join(statement.split())}\n"
+        + "".join(f"    {step}\n" for step in plan)
+        for endpoint, statement, plan, bad in plans if bad
+    ]
+    assert not failures, "\n".join(failures)
+
+
+def test_every_endpoint_was_checked(plans):
+    assert len({endpoint for endpoint, *_ in plans}) > 20
@@ -0,0 +1,91 @@
+"""app.response_cache: writes invalidate by tag, concurrent misses render once."""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+
+@pytest.fixture
+def cache(api, monkeypatch):
+    # сесията на тестовете върви с RESPONSE_CACHE=off (виж prepare())
+    from app import response_cache
+
+    cache = response_cache.ResponseCache(response_cache.MemoryBackend(1 << 20))
+    monkeypatch.setattr(response_cache, "cache", cache)
+    return cache
+
+
+def test_review_invalidates_book_and_lists(api, cache):
+    from app.database import SessionLocal
+    from app.models import Book, Genre
+
+    with SessionLocal() as db:
+        book_id = db.scalar(select(Book.id).where(Book.title == "common title 1"))
+        genre_id = db.scalar(select(Genre.id).where(Genre.name == "genre1"))
+    urls = {
+        "book": f"/books/{book_id}",
+        "reviews": f"/reviews/books/{book_id}?limit=100",
+        "genre": f"/books/by-genre/{genre_id}?limit=100",
+    }
+    client = api.client
+    before = {name: client.get(url).json() for name, url in urls.items()}
+    for url in urls.values():
+        assert cache.backend.get(url if "?" in url else url + "?") is not None
+
+    token = client.post(
+        "/login", data={"username": "stranger1", "password": "password"}
+    ).json()["access_token"]
+    review = client.post(
+        f"/reviews/books/{book_id}", json={"rating": 1, "comment": "fresh"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert review.status_code == 200, review.text
+    assert cache.stats()["entries"] == 0
+
+    after = {name: client.get(url).json() for name, url in urls.items()}
+    assert after["book"]["avg_rating"] != before["book"]["avg_rating"]
+    assert review.json()["id"] in {r["id"] for r in after["reviews"]["items"]}
+    assert before["reviews"]["items"] != after["reviews"]["items"]
+    [listed] = [b for b in after["genre"]["items"] if b["id"] == book_id]
+    assert listed["avg_rating"] == after["book"]["avg_rating"]
+
+
+def test_concurrent_misses_render_once(api):
+    from app.response_cache import MemoryBackend, ResponseCache
+
+    cache = ResponseCache(MemoryBackend(1 << 20))
+    renders = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def render():
+            renders.append(1)
+            await release.wait()
+            return b"entry", ["book:1"], None
+
+        fetches = [asyncio.create_task(cache.fetch("/books/1?", render))
+                   for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*fetches)
+
+    results = asyncio.run(main())
+    assert len(renders) == 1
+    assert [value for value, _ in results] == [b"entry"] * 5
+    assert cache.backend.get("/books/1?") == b"entry"
+
+
+def test_render_overtaken_by_a_write_is_not_stored(api):
+    from app.response_cache import MemoryBackend, ResponseCache
+
+    cache = ResponseCache(MemoryBackend(1 << 20))
+
+    async def render():
+        # записът завършва, докато отговорът още се рендира
+        cache.invalidate("book:1")
+        return b"stale", ["book:1"], None
+
+    value, _ = asyncio.run(cache.fetch("/books/1?", render))
+    assert value == b"stale"
+    assert cache.backend.get("/books/1?") is None
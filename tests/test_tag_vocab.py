@@ -0,0 +1,112 @@
+"""tag_names / user_tag_counts: the migration and the counters kept on writes."""
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+
+def test_migration_moves_names_to_the_vocabulary(api, tmp_path):
+    from app import migrations, tag_vocab
+    from app.database import Base
+    from app.models import Tag, TagName, user_tag_counts
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # схемата преди миграция 3: името е в самия таг
+        for table in ("tags", "user_tag_counts", "tag_names"):
+            conn.execute(text(f"DROP TABLE {table}"))
+        conn.execute(text(
+            "CREATE TABLE tags (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL,"
+            " user_id INTEGER, book_id INTEGER)"
+        ))
+        conn.execute(text("INSERT INTO tags VALUES (:id, :name, :u, :b)"), [
+            {"id": 1, "name": "Sci  Fi", "u": 1, "b": 1},
+            {"id": 2, "name": "sci fi", "u": 1, "b": 1},
+            {"id": 3, "name": "Fav", "u": 1, "b": 2},
+            {"id": 4, "name": "fav", "u": 2, "b": 2},
+            {"id": 5, "name": "  ", "u": 2, "b": 3},
+        ])
+        conn.execute(text("PRAGMA user_version = 2"))
+
+    assert migrations.upgrade(engine) == [3]
+
+    with Session(engine) as db:
+        ids = dict(db.execute(select(TagName.name, TagName.id)).all())
+        assert dict(db.execute(select(TagName.name, TagName.uses)).all()) == {
+            "sci fi": 1, "fav": 2,
+        }
+        assert set(db.execute(
+            select(Tag.id, Tag.tag_id, Tag.user_id, Tag.book_id)
+        ).all()) == {
+            (1, ids["sci fi"], 1, 1),
+            (3, ids["fav"], 1, 2),
+            (4, ids["fav"], 2, 2),
+        }
+        assert set(db.execute(select(user_tag_counts)).all()) == {
+            (1, ids["sci fi"], 1), (1, ids["fav"], 1), (2, ids["fav"], 1),
+        }
+        assert tag_vocab.verify(db) == []
+
+
+def test_counters_follow_tag_writes(api):
+    from app import tag_vocab
+    from app.database import SessionLocal
+    from app.models import TagName, User, user_tag_counts
+
+    client, headers = api.client, api.headers
+    single = client.post(
+        "/tags/books/1", json={"name": "Counter  Test"}, headers=headers
+    )
+    assert single.status_code == 200, single.text
+    batch = client.post("/tags/batch", json={"items": [
+        {"book_id": 2, "name": "counter test"},
+        {"book_id": 2, "name": "COUNTER TEST"},
+        {"book_id": 3, "name": "other counter"},
+    ]}, headers=headers)
+    assert [r["status"] for r in batch.json()["results"]] == [
+        "created", "duplicate", "created",
+    ]
+    deleted = client.delete(f"/tags/{single.json()['id']}", headers=headers)
+    assert deleted.status_code == 200, deleted.text
+
+    with SessionLocal() as db:
+        assert tag_vocab.verify(db) == []
+        reader = db.scalar(select(User.id).where(User.username == "reader"))
+        uses = dict(db.execute(
+            select(TagName.name, user_tag_counts.c.uses)
+            .join(user_tag_counts, user_tag_counts.c.tag_id == TagName.id)
+            .where(user_tag_counts.c.user_id == reader,
+                   TagName.name.in_(["counter test", "other counter"]))
+        ).all())
+    assert uses == {"counter test": 1, "other counter": 1}
+    assert tag_vocab.index.complete("counter", 5) == [("counter test", 1)]
+    assert tag_vocab.index.complete("other c", 5) == [("other counter", 1)]
+
+
+def test_rebuild_keeps_updates_made_while_reading(api, monkeypatch):
+    from app import database
+    from app.tag_vocab import TagIndex
+
+    index = TagIndex()
+    index.load([("fantasy", 3)])
+
+    class Reading:
+        """A session whose read races with a tag write in this process."""
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, statement):
+            index.update({"fantasy": 1, "fable": 1})
+            return self
+
+        def all(self):
+            # прочетено преди записа
+            return [("fantasy", 3)]
+
+    monkeypatch.setattr(database, "SessionLocal", Reading)
+    index.rebuild()
+    assert index.complete("fa", 5) == [("fantasy", 4), ("fable", 1)]
+    assert len(index) == 2
@@ -0,0 +1,66 @@
+"""Conditional GET on /books/{id}: 304 while current, a new ETag after a write."""
+import pytest
+
+
+def login(client, username):
+    token = client.post(
+        "/login", data={"username": username, "password": "password"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def book_url(api):
+    # seed-ът пише направо в базата, без entity_versions: книга през API-то
+    client = api.client
+    created = client.post("/users/", json={
+        "username": "etag_author", "password": "password", "role": "author"
+    })
+    assert created.status_code == 200, created.text
+    book = client.post(
+        "/books/", json={"title": "Conditional Requests"},
+        headers=login(client, "etag_author")
+    )
+    assert book.status_code == 200, book.text
+    return f"/books/{book.json()['id']}"
+
+
+def test_repeated_request_is_not_modified(api, book_url):
+    client = api.client
+    first = client.get(book_url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get(book_url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+
+    since = client.get(
+        book_url, headers={"If-Modified-Since": first.headers["last-modified"]}
+    )
+    assert since.status_code == 304
+
+
+def test_review_changes_the_etag(api, book_url):
+    client = api.client
+    etag = client.get(book_url).headers["etag"]
+
+    review = client.post(
+        f"/reviews{book_url}", json={"rating": 1, "comment": "etag"},
+        headers=login(client, "stranger0")
+    )
+    assert review.status_code == 200, review.text
+
+    stale = client.get(book_url, headers={"If-None-Match": etag})
+    assert stale.status_code == 200
+    assert stale.headers["etag"] != etag
+    assert client.get(
+        book_url, headers={"If-None-Match": stale.headers["etag"]}
+    ).status_code == 304
+
+
+def test_missing_book_has_no_validators(api):
+    response = api.client.get("/books/999999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+    assert "etag" not in response.headers